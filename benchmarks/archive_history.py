@@ -0,0 +1,147 @@
+# Loan archive: generates a library with 3 years of loans (library.datagen),
+# archives the ones returned over a year ago, then grows the archive to each
+# history size (1M, 10M and 50M loans by default) and times what circulation
+# and the Reports page do: a borrow and return, the open-loan lookup, the
+# report queries and the inventory check, which reads every loan in the hot
+# table.  Exits non-zero if an archived loan is lost from the history view,
+# or a p50 grows more than --flatness times from the smallest history to
+# the largest (with 1 ms of slack for timer noise).
+#
+#   python -m benchmarks.archive_history [--sizes 1000000 10000000 50000000]
+import argparse
+import sys
+import time
+
+from benchmarks.common import percentile, temp_db_path
+from library import db
+from library.archive import ARCHIVE_TABLE, archive_loans, archive_table, archive_tables, create_history_view
+from library.circulation import borrow_book, return_book
+from library.datagen import generate
+from library.fines import overdue_report
+from library.inventory import check_inventory
+from library.reports import active_borrowers, fine_totals, loans_per_day, top_titles
+
+# Filler loans per archive year
+YEAR_ROWS = 5_000_000
+
+OPEN_LOAN = "SELECT id FROM transactions WHERE book_id = ? AND user_id = ? AND return_date IS NULL"
+
+# Filler loans of one year: 2% returned late, as datagen's history
+FILL_YEAR = """
+    INSERT INTO {table} (id, book_id, user_id, borrow_date, return_date, overdue_days, fine_amount)
+    WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :rows)
+    SELECT :first_id + i, abs(random()) % :books + 1, abs(random()) % :users + 1,
+           date(:year || '-01-01', '+' || (i % 340) || ' days'),
+           date(:year || '-01-01', '+' || (i % 340 + 14 + (i % 50 = 0) * (i % 10 + 1)) || ' days'),
+           (i % 50 = 0) * (i % 10 + 1), (i % 50 = 0) * (i % 10 + 1) * 1.0
+    FROM n
+"""
+
+
+# Add archived loans in years before the generated history until there are
+# `total` loans.  Their ids come after the newest loan (so new loans cannot
+# reuse them); only the order of ids differs from a real archive.
+def grow_history(conn, total, books, users):
+    history = conn.execute("SELECT COUNT(*) FROM transaction_history").fetchone()[0]
+    year = int(min(table[-4:] for table in archive_tables(conn))) - 1
+    while history < total:
+        rows = min(YEAR_ROWS, total - history)
+        table = archive_table(year)
+        while table in archive_tables(conn):
+            year -= 1
+            table = archive_table(year)
+        first_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()[0]
+        conn.execute(ARCHIVE_TABLE.format(name=table))
+        conn.execute(FILL_YEAR.format(table=table),
+                     {"rows": rows, "first_id": first_id, "books": books, "users": users, "year": str(year)})
+        # Their fines, as accrual left them before they were archived
+        conn.execute(f"""
+            INSERT INTO overdue_loans
+            SELECT id, book_id, user_id, borrow_date, date(borrow_date, '+14 days'), return_date,
+                   overdue_days, fine_amount
+            FROM {table} WHERE overdue_days > 0
+        """)
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'transactions'", (first_id + rows,))
+        create_history_view(conn)
+        conn.commit()
+        history += rows
+        year -= 1
+    return history
+
+
+def timed(fn, samples):
+    start = time.perf_counter()
+    fn()
+    samples.append((time.perf_counter() - start) * 1000)
+
+
+def measure(conn, rounds):
+    samples = {name: [] for name in ("borrow+return", "open loan lookup", "loans per day", "top titles",
+                                     "active borrowers", "fine totals", "overdue report", "inventory check")}
+    books = [row[0] for row in conn.execute(
+        "SELECT id FROM books WHERE quantity > 0 ORDER BY random() LIMIT ?", (rounds,))]
+    users = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY random() LIMIT ?", (rounds,))]
+    loans = conn.execute("""
+        SELECT book_id, user_id FROM transactions WHERE return_date IS NULL ORDER BY random() LIMIT ?
+    """, (rounds,)).fetchall()
+    for book_id, user_id in zip(books, users):
+        timed(lambda: (borrow_book(conn, book_id, user_id), return_book(conn, book_id, user_id)),
+              samples["borrow+return"])
+    for loan in loans:
+        timed(lambda: conn.execute(OPEN_LOAN, loan).fetchall(), samples["open loan lookup"])
+    for _ in range(20):
+        timed(lambda: loans_per_day.uncached(conn), samples["loans per day"])
+        timed(lambda: top_titles.uncached(conn), samples["top titles"])
+        timed(lambda: active_borrowers.uncached(conn), samples["active borrowers"])
+        timed(lambda: fine_totals.uncached(conn), samples["fine totals"])
+        timed(lambda: overdue_report.uncached(conn), samples["overdue report"])
+    for _ in range(3):
+        timed(lambda: check_inventory(conn), samples["inventory check"])
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Circulation and report latency as the loan history grows")
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--transactions", type=int, default=1_000_000, help="loans generated before archiving")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--flatness", type=float, default=2.0)
+    args = parser.parse_args()
+
+    path = temp_db_path()
+    generate(path, args.books, args.users, args.transactions)
+    failures = []
+    results = {}
+    with db.connection(path) as conn:
+        start = time.perf_counter()
+        archived = archive_loans(conn)
+        elapsed = time.perf_counter() - start
+        hot = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        print(f"archived {archived} of {args.transactions} loans in {elapsed:.1f} s "
+              f"({archived / elapsed:,.0f} loans/s); {hot} left in transactions")
+        if conn.execute("SELECT COUNT(*) FROM transaction_history").fetchone()[0] != args.transactions:
+            failures.append("the history view does not hold every loan after archiving")
+
+        for size in args.sizes:
+            start = time.perf_counter()
+            history = grow_history(conn, size, args.books, args.users)
+            print(f"\nhistory {history:,} loans ({len(archive_tables(conn))} archive tables, "
+                  f"grown in {time.perf_counter() - start:.0f} s)")
+            results[size] = measure(conn, args.rounds)
+            for name, samples in results[size].items():
+                print(f"  {name:18} p50 {percentile(samples, 50):8.2f} ms   p99 {percentile(samples, 99):8.2f} ms")
+
+    smallest, largest = results[args.sizes[0]], results[args.sizes[-1]]
+    for name in smallest:
+        before, after = percentile(smallest[name], 50), percentile(largest[name], 50)
+        if after > before * args.flatness + 1:
+            failures.append(f"{name} p50 grew from {before:.2f} ms to {after:.2f} ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
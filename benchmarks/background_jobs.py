@@ -0,0 +1,89 @@
+# Background jobs versus foreground work.  Times borrow/return and a View
+# Books page fetch on their own, then again while a thread runs every
+# library.jobs job back to back.  Exits non-zero if the foreground p99
+# with jobs running exceeds --budget ms or a job fails.
+#
+#   python -m benchmarks.background_jobs [--transactions 1000000]
+import argparse
+import random
+import sys
+import threading
+import time
+
+from benchmarks.common import percentile, seed, temp_db_path
+from benchmarks.online_migration import fill_transactions
+from library import db
+from library.catalogue import BOOK_COLUMNS
+from library.circulation import CirculationError, borrow_book, return_book
+from library.jobs import JOBS, run_job
+from library.listing import fetch_page
+from library.migrations import ensure_schema
+
+
+# Alternate borrow, page fetch and return for `seconds`; returns latencies
+def foreground(path, books, users, seconds):
+    rng = random.Random(11)
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    with db.connection(path) as conn:
+        while time.perf_counter() < deadline:
+            book_id, user_id = rng.randint(1, books), rng.randint(1, users)
+            for action in (lambda: borrow_book(conn, book_id, user_id),
+                           lambda: fetch_page.uncached(conn, "books", BOOK_COLUMNS, "title", None, 50),
+                           lambda: return_book(conn, book_id, user_id)):
+                start = time.perf_counter()
+                try:
+                    action()
+                except CirculationError:
+                    pass
+                latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.001)
+    return latencies
+
+
+def run_jobs(path, stop, runs):
+    with db.connection(path) as conn:
+        while not stop.is_set():
+            for name in JOBS:
+                start = time.perf_counter()
+                runs.append((name, run_job(conn, name), (time.perf_counter() - start) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Foreground latency while background jobs run")
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--budget", type=float, default=50.0, help="foreground p99 ms allowed with jobs running")
+    args = parser.parse_args()
+
+    books, users = 50_000, 5_000
+    path = seed(temp_db_path(), books=books, users=users)
+    fill_transactions(path, args.transactions, books, users)
+    ensure_schema(path)
+
+    idle = foreground(path, books, users, args.seconds)
+    stop, runs = threading.Event(), []
+    worker = threading.Thread(target=run_jobs, args=(path, stop, runs))
+    worker.start()
+    busy = foreground(path, books, users, args.seconds)
+    stop.set()
+    worker.join()
+
+    print(f"{'foreground op':18}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, samples in (("jobs idle", idle), ("jobs running", busy)):
+        print(f"  {label:16}{percentile(samples, 50):>10.2f}{percentile(samples, 99):>10.2f}{max(samples):>10.1f}")
+    print(f"{len(runs)} job runs:")
+    for name in JOBS:
+        times = [ms for job, _, ms in runs if job == name]
+        print(f"  {name:16}{len(times):>5} runs, mean {sum(times) / max(1, len(times)):9.1f} ms")
+
+    failures = [f"job {name} failed" for name, status, _ in runs if status != "ok"]
+    if percentile(busy, 99) > args.budget:
+        failures.append(f"foreground p99 {percentile(busy, 99):.1f} ms over {args.budget} ms")
+    for failure in sorted(set(failures)):
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Per-rerun cost of the page background: the old set_background() that
+# base64-encodes bg1.jpg on every rerun versus library.assets.background_css
+# (inline, and served as a static file).
+#
+#   python -m benchmarks.background_payload [--reruns 200]
+import argparse
+import base64
+import shutil
+import tempfile
+import time
+
+from library import assets
+
+IMAGE = "bg1.jpg"
+
+
+def old_css(image_path):
+    with open(image_path, "rb") as img_file:
+        encoded_string = base64.b64encode(img_file.read()).decode()
+    return assets.BACKGROUND_CSS.format(url=f"data:image/jpg;base64,{encoded_string}")
+
+
+def measure(fn, reruns):
+    start = time.process_time()
+    for _ in range(reruns):
+        css = fn()
+    return len(css.encode()), (time.process_time() - start) / reruns * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background payload per rerun")
+    parser.add_argument("--reruns", type=int, default=200)
+    args = parser.parse_args()
+
+    assets.STATIC_DIR = tempfile.mkdtemp(prefix="library-static-")
+    start = time.process_time()
+    assets.background_css(IMAGE)
+    assets.background_css(IMAGE, static=True)
+    warmup = (time.process_time() - start) * 1000
+
+    print(f"{'variant':<22} {'bytes/rerun':>12} {'CPU ms/rerun':>13}")
+    for name, fn in (("base64 every rerun", lambda: old_css(IMAGE)),
+                     ("cached inline", lambda: assets.background_css(IMAGE)),
+                     ("cached static file", lambda: assets.background_css(IMAGE, static=True))):
+        size, cpu = measure(fn, args.reruns)
+        print(f"{name:<22} {size:>12} {cpu:>13.3f}")
+    print(f"one-off optimisation at startup: {warmup:.0f} ms CPU")
+    shutil.rmtree(assets.STATIC_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Batch circulation: 1,000 borrows and then 1,000 returns applied one at a
+# time with borrow_book()/return_book() (one transaction each, as the
+# Borrow Book and Return Book pages do) versus one borrow_many() and one
+# return_many() call.
+#
+#   python -m benchmarks.batch_circulation [--items 1000]
+import argparse
+import random
+import time
+
+from benchmarks.common import seed, temp_db_path
+from library import db
+from library.circulation import borrow_book, borrow_many, return_book, return_many
+from library.migrations import ensure_schema
+
+
+def fresh_db(books, users):
+    path = seed(temp_db_path(), books=books, users=users)
+    ensure_schema(path)
+    return path
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_single(path, items):
+    with db.connection(path) as conn:
+        borrow = timed(lambda: [borrow_book(conn, book_id, user_id) for book_id, user_id in items])
+        give_back = timed(lambda: [return_book(conn, book_id, user_id) for book_id, user_id in items])
+    return borrow, give_back
+
+
+def run_batch(path, items):
+    with db.connection(path) as conn:
+        results = []
+        borrow = timed(lambda: results.extend(borrow_many(conn, items)))
+        give_back = timed(lambda: results.extend(return_many(conn, items)))
+    failed = [result for result in results if result["error"]]
+    if failed:
+        raise SystemExit(f"{len(failed)} batch items failed, e.g. {failed[0]}")
+    return borrow, give_back
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch versus single-item circulation")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    items = [(rng.randint(1, args.books), rng.randint(1, args.users)) for _ in range(args.items)]
+    single = run_single(fresh_db(args.books, args.users), items)
+    batch = run_batch(fresh_db(args.books, args.users), items)
+    db.close_pools()
+
+    print(f"{args.items} items        {'single ms':>10}{'batch ms':>10}{'speed-up':>10}")
+    for label, one, many in zip(("borrow", "return"), single, batch):
+        print(f"  {label:18}{one:>10.1f}{many:>10.1f}{one / many:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
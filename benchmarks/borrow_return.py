@@ -0,0 +1,87 @@
+# Borrow/return throughput: one sqlite3.connect() per action (the old
+# connect_db() pattern) versus the shared connection pool in library.db.
+#
+#   python -m benchmarks.borrow_return [--seconds 3]
+import argparse
+import itertools
+import sqlite3
+
+from benchmarks.common import ops_per_second, seed, temp_db_path
+from library import db
+
+
+def borrow(conn, book_id, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT quantity FROM books WHERE id = ?", (book_id,))
+    book = cursor.fetchone()
+    if book and book[0] > 0:
+        cursor.execute("INSERT INTO transactions (book_id, user_id, borrow_date) VALUES (?, ?, DATE('now'))",
+                       (book_id, user_id))
+        cursor.execute("UPDATE books SET quantity = quantity - 1 WHERE id = ?", (book_id,))
+        conn.commit()
+
+
+def give_back(conn, book_id, user_id):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id FROM transactions
+        WHERE book_id = ? AND user_id = ? AND return_date IS NULL
+    """, (book_id, user_id))
+    transaction = cursor.fetchone()
+    if transaction:
+        cursor.execute("UPDATE transactions SET return_date = DATE('now') WHERE id = ?", (transaction[0],))
+        cursor.execute("UPDATE books SET quantity = quantity + 1 WHERE id = ?", (book_id,))
+        conn.commit()
+
+
+def workload():
+    # Alternate borrow and return of the same (book, user) pair
+    pairs = itertools.cycle((book_id, book_id % 100 + 1) for book_id in range(1, 1001))
+    actions = itertools.cycle([borrow, give_back])
+    pair = next(pairs)
+    while True:
+        action = next(actions)
+        yield action, pair
+        if action is give_back:
+            pair = next(pairs)
+
+
+def run_per_action_connect(path, seconds):
+    steps = workload()
+
+    def step():
+        action, (book_id, user_id) = next(steps)
+        conn = sqlite3.connect(path)
+        action(conn, book_id, user_id)
+        conn.close()
+
+    return ops_per_second(step, seconds)
+
+
+def run_pooled(path, seconds):
+    steps = workload()
+
+    def step():
+        action, (book_id, user_id) = next(steps)
+        with db.connection(path) as conn:
+            action(conn, book_id, user_id)
+
+    return ops_per_second(step, seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Borrow/return throughput benchmark")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    before = run_per_action_connect(seed(temp_db_path("before.db")), args.seconds)
+    after = run_pooled(seed(temp_db_path("after.db")), args.seconds)
+    db.close_pools()
+
+    print(f"per-action connect : {before:10.0f} ops/s")
+    print(f"pooled connection  : {after:10.0f} ops/s")
+    print(f"speed-up           : {after / before:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
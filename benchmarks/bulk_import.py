@@ -0,0 +1,63 @@
+# Bulk import throughput: a generated CSV catalogue loaded with
+# library.importer, with indexes kept live or deferred to the end.
+#
+#   python -m benchmarks.bulk_import [--rows 300000]
+import argparse
+import csv
+import os
+import random
+import sqlite3
+import time
+
+from benchmarks.common import SCHEMA, temp_db_path, words
+from library import db
+from library.importer import import_books
+from library.schema import add_columns, create_indexes
+from library.search import create_search_index
+
+
+def write_csv(path, rows, duplicate_rate=0.02):
+    rng = random.Random(5)
+    vocabulary = words(2000)
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["title", "author", "isbn", "shelf_location", "quantity"])
+        for i in range(rows):
+            isbn = rng.randrange(i) if i and rng.random() < duplicate_rate else i
+            writer.writerow([" ".join(rng.choice(vocabulary) for _ in range(3)).capitalize(),
+                             f"{rng.choice(vocabulary).capitalize()} {rng.choice(vocabulary).capitalize()}",
+                             f"978-{isbn:010d}", f"S{i % 80}", rng.randint(1, 4)])
+
+
+def empty_library():
+    path = temp_db_path()
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    add_columns(conn)
+    create_indexes(conn)
+    create_search_index(conn)
+    conn.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import throughput")
+    parser.add_argument("--rows", type=int, default=300_000)
+    args = parser.parse_args()
+
+    source = os.path.join(os.path.dirname(temp_db_path()), "books.csv")
+    write_csv(source, args.rows)
+
+    for defer in (False, True):
+        path = empty_library()
+        start = time.perf_counter()
+        counters = import_books(source, defer_indexes=defer, db_path=path)
+        elapsed = time.perf_counter() - start
+        db.close_pools()
+        print(f"defer_indexes={defer!s:5}  {counters['inserted']} inserted, {counters['duplicates']} duplicates "
+              f"in {elapsed:.1f}s = {counters['records'] / elapsed:,.0f} rows/s (indexes and FTS included)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Concurrency stress test for borrow/return.  Many threads or processes
+# hammer a handful of scarce titles; afterwards every book must satisfy
+#   quantity >= 0  and  quantity + open loans == initial stock
+#
+#   python -m benchmarks.circulation_stress --mode threads --workers 16
+#   python -m benchmarks.circulation_stress --mode processes --workers 8
+#   python -m benchmarks.circulation_stress --naive   # old check-then-act code
+import argparse
+import multiprocessing
+import random
+import sqlite3
+import threading
+import time
+
+from benchmarks.common import seed, temp_db_path
+from library import db
+from library.circulation import CirculationError, borrow_book, return_book
+from library.migrations import ensure_schema
+
+BOOKS = 20
+USERS = 200
+STOCK = 2
+
+
+# The pre-engine borrow/return code of the old page scripts, kept for comparison
+def naive_borrow(conn, book_id, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT quantity FROM books WHERE id = ?", (book_id,))
+    book = cursor.fetchone()
+    if book and book[0] > 0:
+        time.sleep(0)  # yield, as a Streamlit script would between statements
+        cursor.execute("INSERT INTO transactions (book_id, user_id, borrow_date) VALUES (?, ?, DATE('now'))",
+                       (book_id, user_id))
+        cursor.execute("UPDATE books SET quantity = quantity - 1 WHERE id = ?", (book_id,))
+        conn.commit()
+    else:
+        raise CirculationError("Book not available.")
+
+
+def naive_return(conn, book_id, user_id):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id FROM transactions
+        WHERE book_id = ? AND user_id = ? AND return_date IS NULL
+    """, (book_id, user_id))
+    transaction = cursor.fetchone()
+    if transaction is None:
+        raise CirculationError("No active borrow record found for this user and book.")
+    cursor.execute("UPDATE transactions SET return_date = DATE('now') WHERE id = ?", (transaction[0],))
+    cursor.execute("UPDATE books SET quantity = quantity + 1 WHERE id = ?", (book_id,))
+    conn.commit()
+
+
+# One worker: random borrows and returns for `seconds`; returns counters
+def worker(path, seconds, worker_seed, naive):
+    rng = random.Random(worker_seed)
+    borrow, give_back = (naive_borrow, naive_return) if naive else (borrow_book, return_book)
+    counts = {"ok": 0, "rejected": 0, "locked": 0}
+    loans = []
+    deadline = time.perf_counter() + seconds
+    with db.connection(path) as conn:
+        while time.perf_counter() < deadline:
+            # Return one of this worker's own loans half of the time
+            if loans and rng.random() < 0.5:
+                action = give_back
+                book_id, user_id = loans.pop(rng.randrange(len(loans)))
+            else:
+                action = borrow
+                book_id, user_id = rng.randint(1, BOOKS), rng.randint(1, USERS)
+            try:
+                action(conn, book_id, user_id)
+                counts["ok"] += 1
+                if action is borrow:
+                    loans.append((book_id, user_id))
+            except CirculationError:
+                counts["rejected"] += 1
+            except sqlite3.OperationalError as error:
+                if not db.is_lock_error(error):
+                    raise
+                if conn.in_transaction:
+                    conn.rollback()
+                counts["locked"] += 1
+    return counts
+
+
+def _process_worker(args):
+    return worker(*args)
+
+
+def run(mode, workers, seconds, naive):
+    path = seed(temp_db_path(), books=BOOKS, users=USERS, quantity=STOCK)
+    ensure_schema(path)
+    jobs = [(path, seconds, i, naive) for i in range(workers)]
+
+    start = time.perf_counter()
+    if mode == "threads":
+        results = [None] * workers
+
+        def target(i):
+            results[i] = worker(*jobs[i])
+
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_process_worker, jobs)
+    elapsed = time.perf_counter() - start
+    db.close_pools()
+
+    totals = {key: sum(r[key] for r in results) for key in results[0]}
+    conn = sqlite3.connect(path)
+    rows = conn.execute("""
+        SELECT b.id, b.quantity,
+               (SELECT COUNT(*) FROM transactions t WHERE t.book_id = b.id AND t.return_date IS NULL)
+        FROM books b
+    """).fetchall()
+    conn.close()
+
+    negative = [book_id for book_id, quantity, _ in rows if quantity < 0]
+    drifted = [book_id for book_id, quantity, open_loans in rows if quantity + open_loans != STOCK]
+    operations = totals["ok"] + totals["rejected"]
+    print(f"mode={mode} workers={workers} engine={'naive' if naive else 'atomic'}")
+    print(f"  throughput        : {operations / elapsed:10.0f} ops/s")
+    print(f"  completed/refused : {totals['ok']} / {totals['rejected']}")
+    print(f"  lock errors       : {totals['locked']}")
+    print(f"  negative stock    : {len(negative)} books")
+    print(f"  inconsistent stock: {len(drifted)} books")
+    return not negative and not drifted and not totals["locked"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Borrow/return concurrency stress test")
+    parser.add_argument("--mode", choices=["threads", "processes"], default="threads")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--naive", action="store_true", help="run the old check-then-act code instead")
+    args = parser.parse_args()
+    ok = run(args.mode, args.workers, args.seconds, args.naive)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+# Schema used by the benchmarks (the app's tables as older versions created
+# them, including the books.image BLOB)
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS books (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        author TEXT NOT NULL,
+        isbn TEXT,
+        shelf_location TEXT,
+        quantity INTEGER DEFAULT 1,
+        image BLOB
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        user_type TEXT NOT NULL CHECK(user_type IN ('student', 'staff'))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id INTEGER,
+        user_id INTEGER,
+        borrow_date TEXT,
+        return_date TEXT,
+        overdue_days INTEGER DEFAULT 0,
+        fine_amount REAL DEFAULT 0.0,
+        FOREIGN KEY(book_id) REFERENCES books(id),
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """,
+]
+
+
+# Fresh database file in a temporary directory
+def temp_db_path(name="bench.db"):
+    return os.path.join(tempfile.mkdtemp(prefix="library-bench-"), name)
+
+
+# Deterministic pseudo-words for titles and author names
+SYLLABLES = ["ka", "ri", "mo", "an", "tel", "vor", "shi", "lu", "den", "pra", "gor", "ne", "sa", "thu", "bel", "im"]
+
+
+def words(count, seed_value=1):
+    rng = random.Random(seed_value)
+    vocabulary = set()
+    while len(vocabulary) < count:
+        vocabulary.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))))
+    return sorted(vocabulary)
+
+
+# Create the schema and fill it with deterministic sample data
+def seed(path, books=1000, users=100, quantity=5, seed_value=42):
+    rng = random.Random(seed_value)
+    vocabulary = words(2000)
+    surnames = words(500, seed_value=2)
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT INTO books (title, author, isbn, shelf_location, quantity) VALUES (?, ?, ?, ?, ?)",
+        ((" ".join(rng.choice(vocabulary) for _ in range(rng.randint(2, 5))).capitalize(),
+          f"{rng.choice(surnames).capitalize()} {rng.choice(surnames).capitalize()}",
+          f"978{i:010d}", f"S{i % 50}", quantity) for i in range(books)),
+    )
+    conn.executemany(
+        "INSERT INTO users (name, user_type) VALUES (?, ?)",
+        ((f"User {i}", "staff" if i % 10 == 0 else "student") for i in range(users)),
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+# Run fn repeatedly for `seconds` and return operations per second
+def ops_per_second(fn, seconds=2.0):
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+# Percentile of a list of samples (nearest-rank)
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
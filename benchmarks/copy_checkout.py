@@ -0,0 +1,86 @@
+# Copy inventory at 2M copies: how long the migration takes to give every
+# title its copies, then checkout and return by barcode, borrow by title
+# (a probe for a copy on the shelf) and return by patron and title.
+# Exits non-zero if one of these reads its table by a scan, or
+# books.quantity ends up different from the titles' copies on the shelf.
+#
+#   python -m benchmarks.copy_checkout [--books 400000 --copies 5]
+import argparse
+import random
+import sys
+import time
+
+from benchmarks.common import percentile, seed, temp_db_path
+from library import db
+from library.circulation import borrow_book, borrow_copy, return_book, return_copy
+from library.copies import AUTO_BARCODE_FORMAT
+from library.migrations import ensure_schema
+
+# Statements of the checkout and return paths, with their parameters
+PLANS = {
+    "copy by barcode": ("SELECT id, book_id, status FROM copies WHERE barcode = ?", ("C000000001",)),
+    "copy on the shelf": ("SELECT id FROM copies WHERE book_id = ? AND status = 'available' LIMIT 1", (1,)),
+    "open loan of a copy": ("SELECT id FROM transactions WHERE copy_id = ? AND return_date IS NULL", (1,)),
+}
+
+
+def timed(fn, samples):
+    start = time.perf_counter()
+    fn()
+    samples.append((time.perf_counter() - start) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkout by barcode at 2M copies")
+    parser.add_argument("--books", type=int, default=400_000)
+    parser.add_argument("--copies", type=int, default=5, help="copies per title")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--loans", type=int, default=2000)
+    args = parser.parse_args()
+
+    path = seed(temp_db_path(), books=args.books, users=args.users, quantity=args.copies)
+    start = time.perf_counter()
+    ensure_schema(path)
+    migrated = time.perf_counter() - start
+
+    rng = random.Random(5)
+    samples = {"borrow_copy": [], "return_copy": [], "borrow_book": [], "return_book": []}
+    failures = []
+    with db.connection(path) as conn:
+        copies = conn.execute("SELECT COUNT(*) FROM copies").fetchone()[0]
+        print(f"{copies} copies of {args.books} titles made by the migration in {migrated:.1f} s")
+
+        barcodes = [AUTO_BARCODE_FORMAT % rng.randint(1, copies) for _ in range(args.loans)]
+        for barcode in dict.fromkeys(barcodes):
+            timed(lambda: borrow_copy(conn, barcode, rng.randint(1, args.users)), samples["borrow_copy"])
+        for barcode in dict.fromkeys(barcodes):
+            timed(lambda: return_copy(conn, barcode), samples["return_copy"])
+        loans = [(rng.randint(1, args.books), rng.randint(1, args.users)) for _ in range(args.loans)]
+        for loan in loans:
+            timed(lambda: borrow_book(conn, *loan), samples["borrow_book"])
+        for loan in loans:
+            timed(lambda: return_book(conn, *loan), samples["return_book"])
+
+        for label, (sql, parameters) in PLANS.items():
+            plan = " ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters))
+            print(f"  {label:22}{plan}")
+            if "SCAN" in plan:
+                failures.append(f"{label} scans: {plan}")
+        drift = conn.execute("""
+            SELECT COUNT(*) FROM books b
+            WHERE quantity != (SELECT COUNT(*) FROM copies c WHERE c.book_id = b.id AND c.status = 'available')
+        """).fetchone()[0]
+        if drift:
+            failures.append(f"{drift} titles' quantity differs from their copies on the shelf")
+    db.close_pools()
+
+    print(f"{'operation':16}{'n':>7}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, values in samples.items():
+        print(f"  {name:14}{len(values):>7}{percentile(values, 50):>10.3f}{percentile(values, 99):>10.3f}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Cover ingest throughput for large photos (12 MP JPEGs by default): the
+# original Add Book path (full decode, save `{title}_cover.jpg` to the
+# working directory and read it back) on a sample, versus library.covers'
+# reduced-scale decode with thumbnails, in-process and in the worker pool.
+# Exits non-zero if a stored cover or thumbnail is missing or too large, or
+# an oversized upload is accepted.
+#
+#   python -m benchmarks.cover_ingest [--photos 10000 --baseline 500]
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+from benchmarks.common import temp_db_path
+
+_scene = {}
+
+
+# A distinct photo-like JPEG: a shared gradient scene with a numbered patch
+def make_photo(i, width=4000, height=3000):
+    if (width, height) not in _scene:
+        gradient = Image.linear_gradient("L")
+        _scene[(width, height)] = Image.merge("RGB", (
+            gradient.resize((width, height)),
+            gradient.rotate(90).resize((width, height)),
+            gradient.rotate(45).resize((width, height)),
+        ))
+    image = _scene[(width, height)].copy()
+    draw = ImageDraw.Draw(image)
+    x, y = (i * 37) % (width - 400), (i * 53) % (height - 200)
+    draw.rectangle((x, y, x + 400, y + 200), fill=(i % 256, (i * 7) % 256, (i * 13) % 256))
+    draw.text((x + 20, y + 20), f"photo {i}", fill=(255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def write_photo(args):
+    path, i, width, height = args
+    with open(path, "wb") as photo_file:
+        photo_file.write(make_photo(i, width, height))
+    return path
+
+
+def read(path):
+    with open(path, "rb") as photo_file:
+        return photo_file.read()
+
+
+# The original pages: decode in full, round-trip through a file in the
+# working directory, keep the bytes
+def original_ingest(data, title):
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    image.save(f"{title}_cover.jpg")
+    with open(f"{title}_cover.jpg", "rb") as img_file:
+        return img_file.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cover ingest throughput")
+    parser.add_argument("--photos", type=int, default=10_000)
+    parser.add_argument("--baseline", type=int, default=500, help="photos timed through the original path")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    args = parser.parse_args()
+
+    work = os.path.dirname(temp_db_path())
+    # Set before library.covers is imported so the worker processes see it too
+    os.environ["LIBRARY_COVERS"] = os.path.join(work, "covers")
+    from library import covers
+
+    photo_dir = os.path.join(work, "photos")
+    os.makedirs(photo_dir)
+    jobs = [(os.path.join(photo_dir, f"{i}.jpg"), i, args.width, args.height) for i in range(args.photos)]
+    with multiprocessing.Pool() as pool:
+        paths = pool.map(write_photo, jobs, chunksize=16)
+    megabytes = sum(os.path.getsize(path) for path in paths) / 1e6
+    print(f"{args.photos} photos of {args.width}x{args.height}, {megabytes / args.photos:.2f} MB each, "
+          f"{covers.COVER_WORKERS} workers")
+
+    results = {}
+    sample = paths[:args.baseline]
+    os.chdir(work)
+    start = time.perf_counter()
+    for i, path in enumerate(sample):
+        original_ingest(read(path), f"Title {i}")
+    results["original, temp file"] = (len(sample), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for path in sample:
+        covers.ingest_cover(read(path))
+    results["pipeline, in-process"] = (len(sample), time.perf_counter() - start)
+
+    # Start the workers outside the timing
+    covers.cover_pool().submit(int).result()
+    start = time.perf_counter()
+    keys = covers.ingest_covers(read(path) for path in paths)
+    results["pipeline, worker pool"] = (len(paths), time.perf_counter() - start)
+
+    print(f"{'path':24}{'photos':>8}{'seconds':>10}{'photos/s':>10}")
+    for label, (count, seconds) in results.items():
+        print(f"  {label:22}{count:>8}{seconds:>10.1f}{count / seconds:>10.1f}")
+
+    failures = []
+    if len(set(keys)) != len(paths):
+        failures.append(f"{len(paths) - len(set(keys))} photos stored under a shared key")
+    for key in keys[::max(1, len(keys) // 200)]:
+        with Image.open(covers.cover_path(key)) as image:
+            if max(image.size) > covers.MAX_COVER_EDGE:
+                failures.append(f"cover {key} is {image.size}")
+        for size in covers.THUMBNAIL_SIZES:
+            if not os.path.exists(covers.cover_path(key, size)):
+                failures.append(f"thumbnail {size} of {key} missing")
+    too_many = Image.new("L", (10_000, 6_000))
+    buffer = io.BytesIO()
+    too_many.save(buffer, "PNG")
+    for label, data in (("over MAX_PIXELS", buffer.getvalue()), ("over MAX_UPLOAD_BYTES", b"\0" * (covers.MAX_UPLOAD_BYTES + 1))):
+        try:
+            covers.submit_cover(data).result()
+            failures.append(f"upload {label} accepted")
+        except covers.CoverError:
+            pass
+
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
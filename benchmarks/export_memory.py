@@ -0,0 +1,90 @@
+# Checks that exports run in constant memory: exports a transactions table
+# at a tenth of the target size and at full size (5M rows by default) and
+# fails if the peak memory grows with the row count.
+#
+#   python -m benchmarks.export_memory [--rows 5000000] [--formats csv jsonl parquet]
+import argparse
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import seed, temp_db_path
+from library.exporter import FORMATS, write_export
+
+# Allowed growth of the peak between the small and the full export
+TOLERANCE = 1.5
+
+
+# Binary sink that only counts bytes
+class CountingWriter:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        pass
+
+    @property
+    def closed(self):
+        return False
+
+
+def fill_transactions(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM transactions")
+    conn.executemany("""
+        INSERT INTO transactions (book_id, user_id, borrow_date, return_date, overdue_days, fine_amount)
+        VALUES (?, ?, '2024-01-01', ?, ?, ?)
+    """, ((i % 1000 + 1, i % 100 + 1, None if i % 20 == 0 else "2024-01-20", i % 7, float(i % 7))
+          for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def peak_memory(path, file_format):
+    conn = sqlite3.connect(path)
+    sink = CountingWriter()
+    # Warm up first so one-off imports and lazy initialisation are not measured
+    write_export(conn, "users", file_format, CountingWriter())
+    tracemalloc.start()
+    start = time.perf_counter()
+    write_export(conn, "transactions", file_format, sink)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.close()
+    return peak, sink.size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Constant-memory export check")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    args = parser.parse_args()
+
+    path = seed(temp_db_path(), books=1000, users=100)
+    results = {}
+    for rows in (args.rows // 10, args.rows):
+        fill_transactions(path, rows)
+        for file_format in args.formats:
+            peak, size, elapsed = peak_memory(path, file_format)
+            results[rows, file_format] = peak
+            print(f"{file_format:>8} {rows:>9} rows  {size / 2**20:>8.1f} MiB written  "
+                  f"peak {peak / 2**20:>6.2f} MiB  {rows / elapsed:>9,.0f} rows/s")
+
+    failed = [file_format for file_format in args.formats
+              if results[args.rows, file_format] > TOLERANCE * results[args.rows // 10, file_format]]
+    if failed:
+        print("memory grows with table size for:", ", ".join(failed))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
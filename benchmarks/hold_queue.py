@@ -0,0 +1,158 @@
+# Hold queue: return, borrow, place-hold and queue position latency (of the
+# hold just placed, at the tail, and of the hold at the head) on a title
+# whose queue is 0, 1k, 10k and 100k holds deep.  Each round returns
+# a copy (it goes to the head of the queue), the head borrows it, and the
+# returner queues again, so the depth stays put.  Then checks the
+# allocation rules on a small title: staff before students, first come
+# first served, queue positions, copies passed on when a ready hold is
+# cancelled or expires, batch returns allocated like single ones.  Exits
+# non-zero if a rule is broken, the queue is read by a scan, or the return
+# or either position p50 grows more than --flatness times from the
+# shallowest to the deepest queue.
+#
+#   python -m benchmarks.hold_queue [--depths 0 1000 10000 100000]
+import argparse
+import itertools
+import sys
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import percentile, seed, temp_db_path
+from library import db
+from library.circulation import borrow_book, return_book, return_many
+from library.copies import add_copies
+from library.holds import HOLD_PICKUP_DAYS, HOLD_PRIORITY, cancel_hold, expire_holds, place_hold, queue_position
+from library.migrations import ensure_schema
+
+
+def timed(fn, samples):
+    start = time.perf_counter()
+    result = fn()
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+# Queue `depth` holds on book_id for users first_user.., in id order
+def fill_queue(conn, book_id, first_user, depth):
+    conn.execute("""
+        INSERT INTO holds (book_id, user_id, priority, placed_date, status)
+        SELECT ?, id, CASE user_type WHEN 'staff' THEN ? ELSE ? END, DATE('now'), 'waiting'
+        FROM users WHERE id >= ? ORDER BY id LIMIT ?
+    """, (book_id, HOLD_PRIORITY["staff"], HOLD_PRIORITY["student"], first_user, depth))
+    conn.commit()
+
+
+# Each title has one copy (seed(quantity=1)), lent to `borrower`
+def run_depth(conn, book_id, depth, borrower, rounds):
+    borrow_book(conn, book_id, borrower)
+    fill_queue(conn, book_id, borrower + 1, depth)
+    samples = {"return": [], "borrow": [], "place": [], "position": [], "head": []}
+    holder = borrower
+    for _ in range(rounds):
+        timed(lambda: return_book(conn, book_id, holder), samples["return"])
+        head = conn.execute("SELECT user_id FROM holds WHERE book_id = ? AND status = 'ready'", (book_id,)).fetchone()
+        previous, holder = holder, head[0] if head else holder
+        timed(lambda: borrow_book(conn, book_id, holder), samples["borrow"])
+        if depth:
+            hold_id = timed(lambda: place_hold(conn, book_id, previous), samples["place"])
+            timed(lambda: queue_position(conn, hold_id), samples["position"])
+            head_id = conn.execute("""
+                SELECT id FROM holds WHERE book_id = ? AND status = 'waiting' ORDER BY priority, id LIMIT 1
+            """, (book_id,)).fetchone()[0]
+            timed(lambda: queue_position(conn, head_id), samples["head"])
+    return samples
+
+
+def check_plans(conn):
+    failures = []
+    for sql in ("SELECT id FROM holds WHERE book_id = 1 AND status = 'waiting' ORDER BY priority, id LIMIT 1",
+                "SELECT id, status FROM holds WHERE book_id = 1 AND user_id = 1 AND status IN ('waiting', 'ready')",
+                "SELECT COUNT(*) FROM holds WHERE book_id = 1 AND priority = 1 AND status != 'waiting' "
+                "AND ticket > 1 AND ticket < 100"):
+        plan = " ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        if "SCAN" in plan or "TEMP B-TREE" in plan:
+            failures.append(f"{sql}: {plan}")
+    return failures
+
+
+# Allocation rules on a one-copy title; users of seed() are staff when
+# their index is a multiple of 10, i.e. ids 1, 11, 21, ...
+def check_rules(conn, book_id):
+    failures = []
+    status = lambda hold_id: conn.execute("SELECT status FROM holds WHERE id = ?", (hold_id,)).fetchone()[0]
+    quantity = lambda: conn.execute("SELECT quantity FROM books WHERE id = ?", (book_id,)).fetchone()[0]
+    borrow_book(conn, book_id, 2)
+    student_a, staff_b, student_c, staff_d = (place_hold(conn, book_id, user_id) for user_id in (3, 11, 4, 21))
+    if [queue_position(conn, hold_id) for hold_id in (staff_b, staff_d, student_a, student_c)] != [1, 2, 3, 4]:
+        failures.append("queue positions do not put staff first, then first come first served")
+
+    return_book(conn, book_id, 2)
+    if status(staff_b) != "ready" or quantity() != 0:
+        failures.append("returned copy did not go to the first staff hold")
+    borrow_book(conn, book_id, 11)
+    return_book(conn, book_id, 11)
+    if status(staff_d) != "ready":
+        failures.append("second staff hold not served before earlier students")
+    cancel_hold(conn, staff_d)
+    if status(student_a) != "ready":
+        failures.append("cancelled ready hold did not pass its copy to the next in the queue")
+    conn.execute("UPDATE holds SET ready_date = ? WHERE id = ?",
+                 ((date.today() - timedelta(days=HOLD_PICKUP_DAYS)).isoformat(), student_a))
+    conn.commit()
+    expire_holds(conn)
+    if status(student_a) != "expired" or status(student_c) != "ready":
+        failures.append("expired hold did not pass its copy on")
+    cancel_hold(conn, student_c)
+    if quantity() != 1:
+        failures.append("copy with no one waiting did not go back on the shelf")
+
+    # Two copies returned in one batch go to the two holds at the head
+    borrow_book(conn, book_id, 5)
+    add_copies(conn, book_id, 1)
+    borrow_book(conn, book_id, 6)
+    student_e, student_f, staff_g = (place_hold(conn, book_id, user_id) for user_id in (7, 8, 31))
+    results = return_many(conn, [(book_id, 5), (book_id, 6)])
+    if [status(h) for h in (student_e, student_f, staff_g)] != ["ready", "waiting", "ready"] or quantity() != 0:
+        failures.append("batch return did not allocate to the head of the queue")
+    if [result["hold_id"] for result in results] != [staff_g, student_e]:
+        failures.append("batch results do not name the holds served")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hold queue latency at queue depth")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10_000, 100_000])
+    parser.add_argument("--rounds", type=int, default=300)
+    parser.add_argument("--flatness", type=float, default=2.0, help="allowed return and position p50 growth with depth")
+    args = parser.parse_args()
+
+    users = sum(args.depths) + len(args.depths) + 100
+    path = seed(temp_db_path(), books=len(args.depths) + 1, users=users, quantity=1)
+    ensure_schema(path)
+    results = {}
+    with db.connection(path) as conn:
+        first_user = itertools.accumulate([1] + [depth + 1 for depth in args.depths])
+        for book_id, (depth, borrower) in enumerate(zip(args.depths, first_user), start=1):
+            results[depth] = run_depth(conn, book_id, depth, borrower, args.rounds)
+        failures = check_plans(conn) + check_rules(conn, len(args.depths) + 1)
+    db.close_pools()
+
+    print(f"{'depth':>8}  {'operation':10}{'p50 ms':>10}{'p99 ms':>10}")
+    for depth, samples in results.items():
+        for name, values in samples.items():
+            if values:
+                print(f"{depth:>8}  {name:10}{percentile(values, 50):>10.3f}{percentile(values, 99):>10.3f}")
+
+    queued = [depth for depth in args.depths if depth]
+    for name in ("return", "position", "head") if queued else ():
+        shallow = percentile(results[min(queued)][name], 50)
+        deep = percentile(results[max(queued)][name], 50)
+        if deep > args.flatness * shallow:
+            failures.append(f"{name} p50 {deep:.3f} ms at depth {max(queued)} vs {shallow:.3f} ms at {min(queued)}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
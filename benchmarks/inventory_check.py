@@ -0,0 +1,135 @@
+# Inventory checker at 1M books and 20M transactions: generates a library
+# (library.datagen), breaks it the ways the inventory drifted (quantities
+# edited by hand, books removed with copies on loan, loans that lost their
+# copy, copies with the wrong status) and times check_inventory() and
+# repair_inventory(), and how long each repair transaction holds the write
+# lock.  Exits non-zero if a problem is left after the repair, checking
+# plus repairing takes over --budget seconds, a repair transaction holds
+# the lock over --max-lock-ms, or a re-check reads a table by a scan.
+#
+#   python -m benchmarks.inventory_check [--books 1000000 --transactions 20000000]
+import argparse
+import sys
+import time
+
+from benchmarks.common import temp_db_path
+from library import db
+from library.datagen import generate
+from library.inventory import RECHECKS, check_inventory, print_report, repair_inventory
+
+# Statements that break the inventory, each on about `damage` rows
+DAMAGE = [
+    "UPDATE books SET quantity = quantity + 1 WHERE id IN (SELECT id FROM books ORDER BY random() LIMIT :damage)",
+    # What Remove Book used to do: a title goes with its copies, its loans stay
+    """DELETE FROM books WHERE id IN (
+           SELECT book_id FROM transactions WHERE return_date IS NULL ORDER BY random() LIMIT :damage)""",
+    """UPDATE transactions SET copy_id = NULL WHERE id IN (
+           SELECT id FROM transactions WHERE return_date IS NULL ORDER BY random() LIMIT :damage)""",
+    """UPDATE copies SET status = 'available' WHERE id IN (
+           SELECT copy_id FROM transactions WHERE return_date IS NULL ORDER BY random() LIMIT :damage)""",
+    """UPDATE copies SET status = 'on_loan' WHERE id IN (
+           SELECT id FROM copies WHERE status = 'available' ORDER BY random() LIMIT :damage)""",
+]
+
+
+# Re-checks run inside the write transaction: index probes only (ready
+# holds, read through their partial index, are the one set scanned)
+def check_plans(conn):
+    failures = []
+    for name, sql in RECHECKS.items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql.format(ids='(1, 2, 3)')}")]
+        scans = [step for step in plan if step.startswith("SCAN ") and "idx_holds_ready" not in step
+                 and not step.startswith(("SCAN r", "SCAN (subquery"))]
+        if scans:
+            failures.append(f"{name} re-check scans: {'; '.join(scans)}")
+    return failures
+
+
+# Milliseconds each write transaction of fn() held the lock, from BEGIN
+# IMMEDIATE succeeding to the commit
+def lock_times(fn):
+    held, run_in_transaction = [], db.run_in_transaction
+
+    def timed(conn, step):
+        started = []
+
+        def timed_step(conn):
+            started.append(time.perf_counter())
+            return step(conn)
+
+        result = run_in_transaction(conn, timed_step)
+        held.append((time.perf_counter() - started[-1]) * 1000)
+        return result
+
+    db.run_in_transaction = timed
+    try:
+        return fn(), held
+    finally:
+        db.run_in_transaction = run_in_transaction
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inventory check and repair at scale")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--transactions", type=int, default=20_000_000)
+    parser.add_argument("--damage", type=int, default=1000, help="rows each kind of damage touches")
+    parser.add_argument("--budget", type=float, default=60.0, help="seconds allowed to check and repair")
+    parser.add_argument("--max-lock-ms", type=float, default=100.0, help="longest a repair transaction may hold the lock")
+    args = parser.parse_args()
+
+    path = temp_db_path()
+    start = time.perf_counter()
+    generate(path, args.books, args.users, args.transactions)
+    print(f"generated {args.books} books, {args.transactions} transactions in {time.perf_counter() - start:.0f} s")
+
+    failures = []
+    with db.connection(path) as conn:
+        failures += check_plans(conn)
+        for statement in DAMAGE:
+            conn.execute(statement, {"damage": args.damage})
+        conn.commit()
+        # The automatic checkpoint after a commit runs once the write lock is
+        # released, so it is left out of the lock times
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA wal_autocheckpoint = 0")
+
+        start = time.perf_counter()
+        report = check_inventory(conn)
+        checked = time.perf_counter() - start
+        print_report(report)
+        print(f"checked in {checked:.1f} s")
+
+        start = time.perf_counter()
+        repaired, held = lock_times(lambda: repair_inventory(conn))
+        repairing = time.perf_counter() - start
+        print(f"repaired {sum(repaired.values())} rows in {repairing:.1f} s; "
+              f"{len(held)} write transactions, longest {max(held, default=0):.1f} ms")
+        if max(held, default=0) > args.max_lock_ms:
+            failures.append(f"a repair transaction held the write lock {max(held):.1f} ms")
+
+        # With nothing left to repair, the job only reads
+        _, idle = lock_times(lambda: repair_inventory(conn))
+        if idle:
+            failures.append(f"repairing a consistent inventory took {len(idle)} write transactions")
+
+        conn.execute("PRAGMA wal_autocheckpoint = 1000")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        start = time.perf_counter()
+        after = check_inventory(conn)
+        print_report(after)
+        print(f"checked again in {time.perf_counter() - start:.1f} s")
+
+    for name, (count, samples) in after.items():
+        if count and name != "orphaned_history":
+            failures.append(f"{count} {name} left after the repair, e.g. {samples}")
+    if checked + repairing > args.budget:
+        failures.append(f"check and repair took {checked + repairing:.1f} s")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# View Books page fetch time: keyset pagination versus LIMIT/OFFSET, for a
+# page near the start and one near the end of catalogues of growing size.
+#
+#   python -m benchmarks.listing_pages [--sizes 10000 200000]
+import argparse
+import sqlite3
+import time
+
+from benchmarks.common import seed, temp_db_path
+from library.catalogue import BOOK_COLUMNS
+from library.listing import fetch_page
+from library.schema import add_columns, create_indexes
+
+PAGE_SIZE = 50
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyset versus OFFSET pagination")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 200_000])
+    args = parser.parse_args()
+
+    columns = ", ".join(BOOK_COLUMNS)
+    print(f"{'books':>8} {'sort':>6} {'page':>6} {'keyset ms':>10} {'offset ms':>10}")
+    for size in args.sizes:
+        conn = sqlite3.connect(seed(temp_db_path(), books=size, users=1))
+        add_columns(conn)
+        create_indexes(conn)
+        for sort_key in ("id", "title"):
+            order = "id" if sort_key == "id" else f"{sort_key}, id"
+            for position in ("first", "last"):
+                offset = 0 if position == "first" else size - PAGE_SIZE
+                anchor = conn.execute(f"SELECT {sort_key}, id FROM books ORDER BY {order} LIMIT 1 OFFSET ?",
+                                      (max(0, offset - 1),)).fetchone()
+                after = None if position == "first" else anchor
+                keyset = timed(lambda: fetch_page.uncached(conn, "books", BOOK_COLUMNS, sort_key, after, PAGE_SIZE))
+                paged = timed(lambda: conn.execute(
+                    f"SELECT {columns} FROM books ORDER BY {order} LIMIT ? OFFSET ?", (PAGE_SIZE, offset)).fetchall())
+                print(f"{size:>8} {sort_key:>6} {position:>6} {keyset:>10.3f} {paged:>10.3f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
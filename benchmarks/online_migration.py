@@ -0,0 +1,150 @@
+# Online migration check.  Builds a library with `--rows` transactions,
+# then rebuilds the transactions table with migrations.rebuild_table()
+# while borrower threads keep borrowing and returning.  Exits non-zero if
+# the copy or the swap held the write lock longer than --max-lock-ms, if
+# any borrow or return failed, or if the rebuilt database lost a write
+# (book stock, row counts, report summaries, integrity check, indexes and
+# triggers).  The final index builds are reported apart: borrowers wait
+# for each one.
+#
+#   python -m benchmarks.online_migration [--rows 5000000] [--threads 4] [--max-lock-ms 50]
+import argparse
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from benchmarks.common import percentile, seed, temp_db_path
+from library import cache, db
+from library.circulation import CirculationError, borrow_book, return_book
+from library.migrations import TABLES, ensure_schema, rebuild_table
+from library.reports import REPORT_TABLES, rebuild_reports
+
+QUANTITY = 5
+
+
+def fill_transactions(path, rows, books, users, seed_value=5):
+    rng = random.Random(seed_value)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO transactions (book_id, user_id, borrow_date, return_date) VALUES (?, ?, '2024-01-01', '2024-01-20')",
+        ((rng.randint(1, books), rng.randint(1, users)) for _ in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+# Borrow and return until `stop` is set, `think` seconds apart; records
+# latencies and failures
+def borrower(path, books, users, seed_value, stop, think, latencies, failures, counts):
+    rng = random.Random(seed_value)
+    loans = []
+    with db.connection(path) as conn:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                if loans and (len(loans) > 3 or rng.random() < 0.5):
+                    return_book(conn, *loans.pop(rng.randrange(len(loans))))
+                    counts["returns"] += 1
+                else:
+                    book_id, user_id = rng.randint(1, books), rng.randint(1, users)
+                    borrow_book(conn, book_id, user_id)
+                    loans.append((book_id, user_id))
+                    counts["borrows"] += 1
+            except CirculationError:
+                pass  # no copy left; not a failure
+            except sqlite3.Error as error:
+                failures.append(repr(error))
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(think)
+
+
+# A report table's rows; the triggers leave zero rows behind (a borrower
+# with no open loans) that rebuild_reports() does not create
+def summary(conn, table):
+    return [row for row in conn.execute(f"SELECT * FROM {table} ORDER BY 1") if any(row[1:])]
+
+
+def schema_objects(conn):
+    return sorted(conn.execute(
+        "SELECT type, name FROM sqlite_master WHERE tbl_name = 'transactions' AND type != 'table'").fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online table rebuild under concurrent borrow traffic")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--think-ms", type=float, default=1.0, help="pause between one borrower's operations")
+    parser.add_argument("--max-lock-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    books, users = max(1, args.rows // 100), max(1, args.rows // 1000)
+    path = seed(temp_db_path(), books=books, users=users, quantity=QUANTITY)
+    fill_transactions(path, args.rows, books, users)
+    start = time.perf_counter()
+    ensure_schema(path)
+    print(f"{args.rows} transactions, schema migrated in {time.perf_counter() - start:.1f}s")
+    cache.clear()
+
+    with db.connection(path) as conn:
+        before = schema_objects(conn)
+        stop = threading.Event()
+        latencies, failures = [], []
+        counts = {"borrows": 0, "returns": 0}
+        threads = [threading.Thread(target=borrower, args=(path, books, users, seed_value, stop, args.think_ms / 1000,
+                                                           latencies, failures, counts))
+                   for seed_value in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        idle = len(latencies)
+
+        start = time.perf_counter()
+        stats = rebuild_table(conn, "transactions", TABLES["transactions"])
+        seconds = time.perf_counter() - start
+        time.sleep(0.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        print(f"rebuilt {stats['rows']} rows in {seconds:.1f}s, {stats['chunks']} chunks, "
+              f"longest write transaction {stats['max_lock_ms']:.1f} ms, swap {stats['swap_ms']:.1f} ms, "
+              f"longest index build {stats['index_ms']:.1f} ms")
+        print(f"traffic: {counts['borrows']} borrows, {counts['returns']} returns")
+        for label, samples in (("before rebuild", latencies[:idle]), ("during rebuild", latencies[idle:])):
+            print(f"  {label}: op latency p50 {percentile(samples, 50):.1f} ms, "
+                  f"p99 {percentile(samples, 99):.1f} ms, max {max(samples):.1f} ms")
+
+        problems = [f"failed write: {failure}" for failure in failures[:5]]
+        if stats["max_lock_ms"] > args.max_lock_ms:
+            problems.append(f"write lock held {stats['max_lock_ms']:.1f} ms")
+        total = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        if total != args.rows + counts["borrows"]:
+            problems.append(f"{total} transactions, expected {args.rows + counts['borrows']}")
+        # Every copy is either on the shelf or out on an open loan
+        drift = conn.execute("""
+            SELECT COUNT(*) FROM books b
+            WHERE b.quantity + (SELECT COUNT(*) FROM transactions t
+                                WHERE t.book_id = b.id AND t.return_date IS NULL) != ?
+        """, (QUANTITY,)).fetchone()[0]
+        if drift:
+            problems.append(f"{drift} books with drifted stock")
+        if schema_objects(conn) != before:
+            problems.append(f"indexes/triggers changed: {schema_objects(conn)}")
+        summaries = {table: summary(conn, table) for table in REPORT_TABLES}
+        rebuild_reports(conn)
+        conn.commit()
+        for table in REPORT_TABLES:
+            if summary(conn, table) != summaries[table]:
+                problems.append(f"{table} out of step with transactions")
+        if conn.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+            problems.append("integrity check failed")
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+    print("ok" if not problems else f"{len(problems)} problem(s)")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
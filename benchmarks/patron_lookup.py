@@ -0,0 +1,82 @@
+# Patron resolution at the circulation desk with 500k patrons: the old
+# unindexed `SELECT id FROM users WHERE name = ?` versus the registry's
+# indexed card and name lookups (library.patrons), uncached and cached,
+# plus typeahead.  Exits non-zero if an uncached lookup exceeds --budget
+# ms p99 or a new patron is not found right after registering.
+#
+#   python -m benchmarks.patron_lookup [--patrons 500000]
+import argparse
+import random
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import percentile, seed, temp_db_path
+from library import db
+from library.migrations import ensure_schema
+from library.patrons import PATRON_CACHE, find_patrons, register_patron, suggest_patrons
+
+
+def latencies_ms(fn, inputs):
+    samples = []
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Patron lookup latency")
+    parser.add_argument("--patrons", type=int, default=500_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--budget", type=float, default=1.0, help="p99 ms allowed for an uncached lookup")
+    args = parser.parse_args()
+
+    path = seed(temp_db_path(), books=100, users=args.patrons)
+    rng = random.Random(3)
+    ids = [rng.randint(1, args.patrons) for _ in range(args.lookups)]
+    names = [f"User {user_id - 1}" for user_id in ids]
+    cards = [f"P{user_id:07d}" for user_id in ids]
+
+    # Before: the pages' name lookup on the original, unindexed users table
+    legacy = sqlite3.connect(path)
+    before = latencies_ms(lambda name: legacy.execute("SELECT id FROM users WHERE name = ?", (name,)).fetchone(),
+                          names[:50])
+    legacy.close()
+
+    ensure_schema(path)
+    PATRON_CACHE.clear()
+    failures = []
+    with db.connection(path) as conn:
+        results = {
+            "name, unindexed (old)": before,
+            "card, uncached": latencies_ms(lambda card: find_patrons.uncached(conn, card), cards),
+            "name, uncached": latencies_ms(lambda name: find_patrons.uncached(conn, name.upper()), names),
+            "typeahead, uncached": latencies_ms(lambda name: suggest_patrons.uncached(conn, name[:7]), names),
+        }
+        for card in cards:
+            find_patrons(conn, card)
+        results["card, cached"] = latencies_ms(lambda card: find_patrons(conn, card), cards)
+
+        print(f"{args.patrons} patrons      {'p50 ms':>10}{'p99 ms':>10}")
+        for label, samples in results.items():
+            print(f"  {label:22}{percentile(samples, 50):>10.4f}{percentile(samples, 99):>10.4f}")
+            if "uncached" in label and percentile(samples, 99) > args.budget:
+                failures.append(f"{label} p99 over {args.budget} ms")
+
+        # Registering bumps users, so cached misses must not hide the new patron
+        find_patrons(conn, "Cache Check")
+        _, card = register_patron(conn, "Cache Check", "student")
+        if [row[3] for row in find_patrons(conn, " cache check ")] != [card]:
+            failures.append("new patron not found by name")
+        if not find_patrons(conn, card):
+            failures.append("new patron not found by card")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
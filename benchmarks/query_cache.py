@@ -0,0 +1,67 @@
+# Query cache check.  Times repeated View Books / Search Book reads with
+# and without library.cache, then verifies that every write path that
+# bumps a table makes the next read see the change.  Exits non-zero if a
+# read after a write returns stale rows.
+#
+#   python -m benchmarks.query_cache [--books 200000]
+import argparse
+import sys
+import time
+
+from benchmarks.common import seed, temp_db_path
+from library import cache, db
+from library.catalogue import BOOK_COLUMNS, add_book
+from library.circulation import borrow_book
+from library.listing import fetch_page
+from library.migrations import ensure_schema
+from library.search import search_books
+
+
+def per_call_ms(fn, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query cache speed-up and invalidation check")
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    path = seed(temp_db_path(), books=args.books, users=100)
+    ensure_schema(path)
+    cache.clear()
+    with db.connection(path) as conn:
+        reads = {
+            "view books (title)": (fetch_page, (conn, "books", BOOK_COLUMNS, "title", None, 100)),
+            "search book": (search_books, (conn, "ka", "")),
+        }
+        print(f"{'read':20} {'uncached ms':>12} {'cached ms':>10}")
+        for name, (fn, call_args) in reads.items():
+            uncached = per_call_ms(lambda: fn.uncached(*call_args), args.runs // 10)
+            fn(*call_args)
+            print(f"{name:20} {uncached:>12.3f} {per_call_ms(lambda: fn(*call_args), args.runs):>10.4f}")
+
+        stale = []
+        # A new title sorts first and must appear in the cached results
+        fetch_page(conn, "books", BOOK_COLUMNS, "title")
+        search_books(conn, "aaaa")
+        book_id = add_book(conn, "Aaaa cache check", "Tester", "", "S0", 1)
+        if fetch_page(conn, "books", BOOK_COLUMNS, "title")[0][0][0] != book_id:
+            stale.append("Add Book -> View Books")
+        if [row[0] for row in search_books(conn, "aaaa")[0]] != [book_id]:
+            stale.append("Add Book -> Search Book")
+        borrow_book(conn, book_id, 1)
+        if search_books(conn, "aaaa")[0][0][5] != 0:
+            stale.append("Borrow Book -> Search Book")
+
+    print(cache.CACHE.stats())
+    for message in stale:
+        print(f"STALE {message}")
+    sys.exit(1 if stale else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Query-plan regression check.  Builds a large generated library, creates
+# the indexes from library.schema and runs EXPLAIN QUERY PLAN on every hot
+# query.  Exits non-zero if any query falls back to a full table scan.
+# tests/test_query_plans.py runs the same check on a small library.
+#
+#   python -m benchmarks.query_plans [--rows 1000000]
+import argparse
+import random
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import seed, temp_db_path
+from library.archive import ARCHIVE_SCHEMA, NEXT_BATCH
+from library.fines import MATERIALIZE, NEW_DAY_WHERE, OVERDUE_REPORT, create_fine_tables
+from library.patrons import PATRON_BY_CARD, PATRON_BY_NAME, PATRON_PREFIX, create_patron_registry
+from library.schema import create_indexes
+
+# name -> (sql, sample parameters)
+HOT_QUERIES = {
+    "open loan lookup": ("""
+        SELECT id, borrow_date FROM transactions
+        WHERE book_id = ? AND user_id = ? AND return_date IS NULL
+    """, (1, 1)),
+    "patron by card": (PATRON_BY_CARD, ("P0000001",)),
+    "patron by name": (PATRON_BY_NAME, ("user 1", 10)),
+    "patron typeahead": (PATRON_PREFIX, ("user 1", 10)),
+    "book stock": ("SELECT quantity FROM books WHERE id = ?", (1,)),
+    "isbn search": ("SELECT id, title FROM books WHERE isbn = ?", ("9780000000001",)),
+    "overdue report": (OVERDUE_REPORT, (100,)),
+    "fine accrual (new day)": (MATERIALIZE.format(where=NEW_DAY_WHERE), {"today": "2024-03-01"}),
+    "archive batch": (NEXT_BATCH, {"horizon": "2024-01-15", "batch": 5000}),
+}
+
+
+# Fill the transactions table: ~5% open loans, ~2% returned late
+def generate_transactions(path, rows, books, users, seed_value=7):
+    rng = random.Random(seed_value)
+    conn = sqlite3.connect(path)
+
+    def rows_iter():
+        for _ in range(rows):
+            roll = rng.random()
+            overdue = rng.randint(1, 30) if roll < 0.02 else 0
+            return_date = None if 0.02 <= roll < 0.07 else "2024-02-01"
+            yield (rng.randint(1, books), rng.randint(1, users), "2024-01-01", return_date, overdue, overdue * 1.0)
+
+    conn.executemany("""
+        INSERT INTO transactions (book_id, user_id, borrow_date, return_date, overdue_days, fine_amount)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows_iter())
+    conn.commit()
+    conn.close()
+
+
+# Configuration tables with a handful of rows; scanning them is cheaper than a lookup
+SMALL_TABLES = {"loan_policies"}
+
+
+# Partial indexes only hold the rows the query asks for, so scanning one is fine
+def partial_indexes(conn):
+    return {name for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index'")
+            if sql and " WHERE " in sql.upper()}
+
+
+# Plan lines that read a whole table or a whole non-partial index
+def scans(conn, sql, params):
+    partial = partial_indexes(conn)
+    bad = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        detail = row[-1]
+        if not detail.startswith("SCAN"):
+            continue
+        if " INDEX " in detail and detail.split()[-1] in partial:
+            continue
+        if detail.split()[1] in SMALL_TABLES:
+            continue
+        # The rows of a subquery, which its own plan lines already cover
+        if detail.split()[1].startswith("(subquery-"):
+            continue
+        bad.append(detail)
+    return bad
+
+
+# A generated library of `rows` books and transactions with the hot
+# queries' indexes, analyzed; returns an open connection
+def build_library(path, rows):
+    books, users = rows, max(1, rows // 10)
+    seed(path, books=books, users=users)
+    generate_transactions(path, rows, books, users)
+    conn = sqlite3.connect(path)
+    create_indexes(conn)
+    create_fine_tables(conn)
+    create_patron_registry(conn)
+    for statement in ARCHIVE_SCHEMA:
+        conn.execute(statement)
+    conn.execute("ANALYZE")
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN regression check")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    conn = build_library(temp_db_path(), args.rows)
+    print(f"generated {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+    failures = 0
+    for name, (sql, params) in HOT_QUERIES.items():
+        bad = scans(conn, sql, params)
+        plan = "; ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        print(f"{'FAIL' if bad else 'ok  '} {name:22} {plan}")
+        failures += bool(bad)
+    conn.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
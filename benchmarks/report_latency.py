@@ -0,0 +1,104 @@
+# Reports dashboard latency on a large circulation history.  Builds a
+# library with `--rows` transactions spread over three years, creates the
+# fine and report summary tables (timing the one-off backfill), then times
+# every dashboard query and a full dashboard load with the query cache
+# (library.cache) bypassed.  Exits non-zero if any p99 exceeds --budget
+# milliseconds.
+#
+#   python -m benchmarks.report_latency [--rows 10000000] [--budget 100]
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import percentile, seed, temp_db_path
+from library import reports
+from library.fines import accrue_fines, create_fine_tables, overdue_report
+from library.schema import create_indexes
+
+HISTORY_DAYS = 3 * 365
+
+
+# Loans over the last HISTORY_DAYS days; most are returned within a month,
+# ~3% are still open
+def generate_history(path, rows, books, users, seed_value=11):
+    rng = random.Random(seed_value)
+    today = date.today()
+    days = [(today - timedelta(days=offset)).isoformat() for offset in range(HISTORY_DAYS + 31)]
+
+    def rows_iter():
+        for _ in range(rows):
+            borrowed = rng.randint(0, HISTORY_DAYS)
+            if borrowed < 30 or rng.random() < 0.03:
+                return_date = None
+            else:
+                return_date = days[borrowed - rng.randint(1, 30)]
+            # Popular books and busy readers get more loans
+            yield (int(rng.paretovariate(1.2)) % books + 1, rng.randint(1, users), days[borrowed], return_date)
+
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO transactions (book_id, user_id, borrow_date, return_date) VALUES (?, ?, ?, ?)", rows_iter())
+    conn.commit()
+    conn.close()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+# Everything the Reports page reads, in order, bypassing the query cache
+def dashboard(conn):
+    accrue_fines(conn)
+    reports.loans_per_day.uncached(conn)
+    reports.loans_per_week.uncached(conn)
+    reports.top_titles.uncached(conn)
+    reports.active_borrowers.uncached(conn)
+    reports.fine_totals.uncached(conn)
+    overdue_report.uncached(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reports dashboard latency")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--budget", type=float, default=100.0, help="p99 budget in milliseconds")
+    args = parser.parse_args()
+
+    books, users = max(1, args.rows // 100), max(1, args.rows // 1000)
+    start = time.perf_counter()
+    path = seed(temp_db_path(), books=books, users=users)
+    generate_history(path, args.rows, books, users)
+    print(f"generated {args.rows} transactions in {time.perf_counter() - start:.1f}s")
+
+    conn = sqlite3.connect(path)
+    create_indexes(conn)
+    print(f"fine backfill     {timed(lambda: (create_fine_tables(conn), accrue_fines(conn))):>10.0f} ms")
+    print(f"report backfill   {timed(lambda: reports.create_report_tables(conn)):>10.0f} ms")
+
+    queries = {
+        "loans per day": lambda: reports.loans_per_day.uncached(conn),
+        "loans per week": lambda: reports.loans_per_week.uncached(conn),
+        "top titles": lambda: reports.top_titles.uncached(conn),
+        "active borrowers": lambda: reports.active_borrowers.uncached(conn),
+        "fine totals": lambda: reports.fine_totals.uncached(conn),
+        "overdue report": lambda: overdue_report.uncached(conn),
+        "full dashboard": lambda: dashboard(conn),
+    }
+    failures = 0
+    print(f"{'query':18} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, fn in queries.items():
+        samples = [timed(fn) for _ in range(args.runs)]
+        p99 = percentile(samples, 99)
+        failures += p99 > args.budget
+        print(f"{name:18} {percentile(samples, 50):>9.2f} {p99:>9.2f}{'  FAIL' if p99 > args.budget else ''}")
+    conn.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
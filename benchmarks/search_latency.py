@@ -0,0 +1,66 @@
+# "Search Book" latency: the old title/author LIKE '%x%' query versus the
+# FTS5 index in library.search, at several catalogue sizes.
+#
+#   python -m benchmarks.search_latency [--sizes 10000 100000 1000000]
+import argparse
+import random
+import sqlite3
+import time
+
+from benchmarks.common import percentile, seed, temp_db_path
+from library.schema import create_indexes
+from library.search import create_search_index, search_books
+
+
+def like_search(conn, title, author):
+    return conn.execute("SELECT * FROM books WHERE title LIKE ? AND author LIKE ?",
+                        ('%' + title + '%', '%' + author + '%')).fetchall()
+
+
+def fts_search(conn, title, author):
+    return search_books.uncached(conn, title, author)
+
+
+# Queries typed by a user: a title word prefix, sometimes with an author
+def sample_queries(conn, count, rng):
+    titles = conn.execute("SELECT title, author FROM books ORDER BY random() LIMIT ?", (count,)).fetchall()
+    queries = []
+    for title, author in titles:
+        word = rng.choice(title.split())
+        prefix = word[:max(3, len(word) - 1)]
+        queries.append((prefix, author.split()[-1][:4] if rng.random() < 0.3 else ""))
+    return queries
+
+
+def latencies(conn, fn, queries):
+    samples = []
+    for title, author in queries:
+        start = time.perf_counter()
+        fn(conn, title, author)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search Book latency: LIKE versus FTS5")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    print(f"{'books':>9} {'query':>5} {'p50 ms':>9} {'p99 ms':>9}")
+    for size in args.sizes:
+        conn = sqlite3.connect(seed(temp_db_path(), books=size, users=10))
+        create_indexes(conn)
+        create_search_index(conn)
+        queries = sample_queries(conn, args.queries, rng)
+        # LIKE scans the whole table; fewer samples keep the big sizes bearable
+        like_queries = queries[:max(20, args.queries * 10_000 // size)]
+        for name, fn, batch in (("LIKE", like_search, like_queries), ("FTS5", fts_search, queries)):
+            samples = latencies(conn, fn, batch)
+            print(f"{size:>9} {name:>5} {percentile(samples, 50):>9.2f} {percentile(samples, 99):>9.2f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
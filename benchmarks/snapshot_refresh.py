@@ -0,0 +1,124 @@
+# Report snapshot refresh under circulation.  Generates a library
+# (library.datagen), starts a borrower process that borrows and returns
+# and, between operations, tries to take the write lock with no busy
+# timeout, then refreshes the snapshot (library.snapshot) --refreshes
+# times.  Exits non-zero if the write lock was ever found held for longer
+# than --max-lock-ms during a refresh, or the snapshot is not a consistent
+# copy (integrity check, inventory checks).
+#
+#   python -m benchmarks.snapshot_refresh [--scale 1m] [--refreshes 3]
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import percentile, temp_db_path
+from library import db
+from library.circulation import CirculationError, borrow_book, return_book
+from library.datagen import SCALES, generate
+from library.inventory import check_inventory
+from library.snapshot import refresh_snapshot, snapshot_connection, snapshot_path
+
+THINK = 0.002
+
+
+# Milliseconds the write lock stayed held once BEGIN IMMEDIATE (with no
+# busy timeout) found it taken; 0 when it was free.  Time the process
+# waited for the CPU, which the refresh also uses, is not counted.
+def lock_wait(probe):
+    busy_since = None
+    while True:
+        try:
+            probe.execute("BEGIN IMMEDIATE")
+            probe.rollback()
+            return 0.0 if busy_since is None else (time.monotonic() - busy_since) * 1000
+        except sqlite3.OperationalError as error:
+            if not db.is_lock_error(error):
+                raise
+            busy_since = busy_since or time.monotonic()
+            time.sleep(0.0001)
+
+
+# Runs in its own process until `stop` is set; puts
+# [(monotonic time, lock wait ms, operation ms)] on `results`
+def borrower(path, books, users, stop, results):
+    rng = random.Random(3)
+    probe = sqlite3.connect(path, timeout=0, isolation_level=None)
+    samples, loans = [], []
+    with db.connection(path) as conn:
+        while not stop.is_set():
+            wait = lock_wait(probe)
+            start = time.monotonic()
+            try:
+                if loans and rng.random() < 0.5:
+                    return_book(conn, *loans.pop(rng.randrange(len(loans))))
+                else:
+                    book_id, user_id = rng.randint(1, books), rng.randint(1, users)
+                    borrow_book(conn, book_id, user_id)
+                    loans.append((book_id, user_id))
+            except CirculationError:
+                pass
+            samples.append((start, wait, (time.monotonic() - start) * 1000))
+            time.sleep(THINK)
+    results.put(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot refresh under borrow/return traffic")
+    parser.add_argument("--scale", choices=SCALES, default="1m", help="library generated (library.datagen)")
+    parser.add_argument("--refreshes", type=int, default=3)
+    parser.add_argument("--max-lock-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    books, users, transactions = SCALES[args.scale]
+    path = temp_db_path()
+    start = time.perf_counter()
+    generate(path, books, users, transactions)
+    print(f"generated {transactions} transactions in {time.perf_counter() - start:.0f} s")
+
+    context = multiprocessing.get_context("spawn")
+    stop, results = context.Event(), context.Queue()
+    process = context.Process(target=borrower, args=(path, books, users, stop, results))
+    process.start()
+    time.sleep(3)
+    windows = []
+    with db.connection(path) as conn:
+        for _ in range(args.refreshes):
+            start = time.monotonic()
+            taken_at, pages, copy_ms = refresh_snapshot(conn)
+            windows.append((start, time.monotonic()))
+            size = os.path.getsize(snapshot_path(path)) / (1 << 20)
+            print(f"snapshot of {pages} pages ({size:.0f} MiB) copied in {copy_ms / 1000:.2f} s")
+    time.sleep(1)
+    stop.set()
+    samples = results.get()
+    process.join()
+
+    refreshing = [any(low <= sample[0] <= high for low, high in windows) for sample in samples]
+    during = [sample for sample, flag in zip(samples, refreshing) if flag]
+    outside = [sample for sample, flag in zip(samples, refreshing) if not flag]
+    for label, chosen in (("no refresh", outside), ("refreshing", during)):
+        waits, ops = [sample[1] for sample in chosen], [sample[2] for sample in chosen]
+        print(f"  {label}: {len(chosen)} operations, write lock wait max {max(waits):.2f} ms; "
+              f"borrow/return p50 {percentile(ops, 50):.2f} ms, p99 {percentile(ops, 99):.2f} ms")
+
+    failures = []
+    longest = max(sample[1] for sample in during)
+    if longest > args.max_lock_ms:
+        failures.append(f"write lock held {longest:.1f} ms during a refresh")
+    with snapshot_connection(path) as conn:
+        if conn.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+            failures.append("snapshot integrity check failed")
+        for name, (count, _) in check_inventory(conn).items():
+            if count and name != "orphaned_history":
+                failures.append(f"snapshot is not a consistent copy: {count} {name}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
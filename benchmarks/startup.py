@@ -0,0 +1,104 @@
+# App start-up and rerun latency for main.py, measured with Streamlit's
+# AppTest.  "cold" runs the script once in a fresh Python process (imports,
+# migrations, first page import); "warm" reruns it in the same process the
+# way every widget interaction does.  Also compares the per-rerun schema
+# work: ensure_schema() versus re-running every schema step, as the old
+# entry points did on each rerun.
+#
+#   python -m benchmarks.startup [--runs 30]
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import percentile, seed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["Home", "View Books", "Search Book", "Reports"]
+
+
+# Run main.py as an admin, on the home page for a new AppTest or on `page`
+# when rerunning one; returns (AppTest, milliseconds)
+def run_app(page="Home", app=None):
+    from streamlit.testing.v1 import AppTest
+
+    if app is None:
+        app = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=120)
+        app.session_state["role"] = "admin"
+    else:
+        app.sidebar.selectbox[0].select(page)
+    start = time.perf_counter()
+    app.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return app, elapsed
+
+
+# Time one cold run of main.py in a new interpreter
+def cold_run(workdir):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=ROOT, LIBRARY_DB=os.path.join(workdir, "library.db")),
+        capture_output=True, text=True, check=True).stdout
+    return float(output.split()[-1])
+
+
+# Per-rerun schema cost: the once-per-process check versus re-running every step
+def schema_costs(path, runs):
+    from library import db
+    from library.migrations import MIGRATIONS, ensure_schema
+
+    ensure_schema(path)
+    start = time.perf_counter()
+    for _ in range(runs):
+        ensure_schema(path)
+    once = (time.perf_counter() - start) * 1e6 / runs
+
+    with db.connection(path) as conn:
+        start = time.perf_counter()
+        for _ in range(runs):
+            for _, _, fn in MIGRATIONS:
+                fn(conn)
+        every = (time.perf_counter() - start) * 1e6 / runs
+    return once, every
+
+
+def main():
+    parser = argparse.ArgumentParser(description="App start-up and rerun latency")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(f"{run_app()[1]:.1f}")
+        return
+
+    workdir = tempfile.mkdtemp(prefix="library-startup-")
+    shutil.copy(os.path.join(ROOT, "bg1.jpg"), workdir)
+    path = os.path.join(workdir, "library.db")
+    os.environ["LIBRARY_DB"] = path
+    seed(path, books=args.books, users=1000)
+
+    print(f"cold, unmigrated database   {cold_run(workdir):>9.1f} ms")
+    print(f"cold, migrated database     {cold_run(workdir):>9.1f} ms")
+
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    app, _ = run_app()
+    print(f"{'warm rerun':28}{'p50 ms':>10}{'p99 ms':>10}")
+    for page in PAGES:
+        app, _ = run_app(page, app)
+        samples = [run_app(page, app)[1] for _ in range(args.runs)]
+        print(f"  {page:26}{percentile(samples, 50):>10.1f}{percentile(samples, 99):>10.1f}")
+
+    once, every = schema_costs(path, args.runs)
+    print(f"schema work per rerun: ensure_schema() {once:.1f} us, every step re-run {every:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# End-to-end benchmark suite.  Generates a library with library.datagen
+# (Zipf popularity, realistic loan history) and times the real code paths
+# of the pages: add, search, borrow, return, the overdue report, the
+# Reports dashboard and listing pages.  Results are written as JSON with
+# the commit they were measured on; --compare checks them against an
+# earlier file and exits non-zero if an operation's p50 got slower by more
+# than --threshold times.
+#
+#   python -m benchmarks.suite [--scale 100k] [--output suite.json] [--compare before.json]
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import percentile, temp_db_path
+from library import cache, db
+from library.catalogue import BOOK_COLUMNS, add_book
+from library.circulation import CirculationError, borrow_book, return_book
+from library.datagen import SCALES, generate, isbn13
+from library.fines import accrue_fines, overdue_report
+from library.listing import fetch_page, page_cursor
+from library.reports import active_borrowers, fine_totals, loans_per_day, loans_per_week, top_titles
+from library.search import search_books
+
+SUITE_VERSION = 1
+
+
+# Time fn(i) for i in range(iterations) after a few warm-up calls, in
+# `rounds` rounds; the round with the lowest p50 is kept, as the others
+# only add noise from the machine
+def measure(fn, iterations, rounds, warmup=3):
+    for i in range(warmup):
+        fn(i)
+    best = None
+    for round_number in range(rounds):
+        samples = []
+        for i in range(round_number * iterations, (round_number + 1) * iterations):
+            start = time.perf_counter()
+            fn(i)
+            samples.append((time.perf_counter() - start) * 1000)
+        result = {"n": iterations, "mean_ms": sum(samples) / iterations, "p50_ms": percentile(samples, 50),
+                  "p95_ms": percentile(samples, 95), "p99_ms": percentile(samples, 99)}
+        if best is None or result["p50_ms"] < best["p50_ms"]:
+            best = result
+    return best
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(conn, iterations, rounds, seed_value):
+    rng = random.Random(seed_value)
+    books = conn.execute("SELECT MAX(id) FROM books").fetchone()[0]
+    users = conn.execute("SELECT MAX(id) FROM users").fetchone()[0]
+    sample = rng.sample(range(1, books + 1), min(1000, books))
+    titles = [row[0] for row in conn.execute(
+        f"SELECT title FROM books WHERE id IN ({', '.join('?' * len(sample))}) ORDER BY id", sample)]
+    # Borrowable books in proportion to their loans, as the desk sees them
+    popular = [row[0] for row in conn.execute("""
+        SELECT book_id FROM transactions WHERE book_id IN (SELECT id FROM books WHERE quantity > 0)
+        ORDER BY id DESC LIMIT 5000
+    """)]
+    loans = []
+
+    def borrow(i):
+        user_id = rng.randint(1, users)
+        for book_id in rng.sample(popular, 10):
+            try:
+                borrow_book(conn, book_id, user_id)
+                loans.append((book_id, user_id))
+                return
+            except CirculationError:
+                continue
+
+    def give_back(i):
+        if loans:
+            return_book(conn, *loans.pop(rng.randrange(len(loans))))
+
+    def deep_page(i):
+        title = rng.choice(titles)
+        rows, _ = fetch_page.uncached(conn, "books", BOOK_COLUMNS, "title", (title, 0), 50)
+        if rows:
+            fetch_page.uncached(conn, "books", BOOK_COLUMNS, "title", page_cursor(BOOK_COLUMNS, "title", rows[-1]), 50)
+
+    def dashboard(i):
+        loans_per_day.uncached(conn)
+        loans_per_week.uncached(conn)
+        top_titles.uncached(conn)
+        active_borrowers.uncached(conn)
+        fine_totals.uncached(conn)
+
+    return {
+        "add_book": measure(lambda i: add_book(conn, f"Suite title {i}", "Suite Author", f"SUITE-{i}", "S-1", 1),
+                            iterations, rounds),
+        "search_title": measure(lambda i: search_books.uncached(conn, title=rng.choice(titles).split()[0]),
+                                iterations, rounds),
+        "search_isbn": measure(lambda i: search_books.uncached(conn, isbn=isbn13(rng.randint(1, books))),
+                               iterations, rounds),
+        "borrow": measure(borrow, iterations, rounds),
+        "return": measure(give_back, iterations, rounds),
+        "accrue_fines": measure(lambda i: accrue_fines(conn), iterations, rounds),
+        "overdue_report": measure(lambda i: overdue_report.uncached(conn), iterations, rounds),
+        "reports_dashboard": measure(dashboard, iterations, rounds),
+        "list_books_first_page": measure(
+            lambda i: fetch_page.uncached(conn, "books", BOOK_COLUMNS, "title", None, 50), iterations, rounds),
+        "list_books_deep_page": measure(deep_page, iterations, rounds),
+    }
+
+
+# Print new versus baseline p50s; returns the operations that regressed,
+# ignoring differences under min_delta ms (timer noise on fast operations)
+def compare(results, baseline, threshold, min_delta):
+    regressions = []
+    print(f"{'operation':24}{'base p50':>11}{'new p50':>11}{'ratio':>8}")
+    for name, result in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"  {name:22}{'-':>11}{result['p50_ms']:>11.3f}")
+            continue
+        ratio = result["p50_ms"] / max(before["p50_ms"], 1e-6)
+        slower = ratio > threshold and result["p50_ms"] - before["p50_ms"] > min_delta
+        print(f"  {name:22}{before['p50_ms']:>11.3f}{result['p50_ms']:>11.3f}{ratio:>8.2f}{'  SLOWER' if slower else ''}")
+        if slower:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite with JSON results")
+    parser.add_argument("--scale", choices=SCALES, default="100k")
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON results file (default: suite-<scale>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 slowdown ratio counted as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ms a p50 must grow by to count")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("scale") != args.scale:
+            parser.error(f"{args.compare} was measured at scale {baseline.get('scale')}, not {args.scale}")
+
+    books, users, transactions = SCALES[args.scale]
+    path = temp_db_path()
+    start = time.perf_counter()
+    generate(path, books, users, transactions, seed=args.seed)
+    generated = time.perf_counter() - start
+
+    cache.clear()
+    with db.connection(path) as conn:
+        operations = run_suite(conn, args.iterations, args.rounds, args.seed)
+
+    commit = git_commit()
+    results = {
+        "suite": SUITE_VERSION,
+        "commit": commit,
+        "measured_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "scale": args.scale,
+        "rows": {"books": books, "users": users, "transactions": transactions},
+        "seed": args.seed,
+        "generate_seconds": round(generated, 2),
+        "results": operations,
+    }
+    output = args.output or f"suite-{args.scale}-{commit or 'unknown'}.json"
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+
+    print(f"{args.scale}: {books} books, {users} users, {transactions} transactions "
+          f"(generated in {generated:.1f} s); results in {output}")
+    print(f"{'operation':24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in operations.items():
+        print(f"  {name:22}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['p99_ms']:>10.3f}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        for name in regressions:
+            print(f"FAIL {name} p50 more than {args.threshold}x slower than {baseline.get('commit')}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Memory used by "View Books" for a catalogue where every title has a cover:
+# the old SELECT * (cover BLOBs inline) versus the cover-store listing.
+#
+#   python -m benchmarks.view_books_memory [--books 50000 --cover-kb 40]
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+import tracemalloc
+
+from benchmarks.common import seed, temp_db_path
+from library.catalogue import BOOK_COLUMNS
+from library.listing import fetch_page
+from library.schema import add_columns
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(rows), peak / 2**20, elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="View Books memory benchmark")
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--cover-kb", type=int, default=40)
+    args = parser.parse_args()
+
+    path = seed(temp_db_path(), books=args.books, users=1)
+    conn = sqlite3.connect(path)
+    add_columns(conn)
+    # Old layout: the JPEG itself in books.image
+    cover = os.urandom(args.cover_kb * 1024)
+    conn.execute("UPDATE books SET image = ?", (cover,))
+    # New layout: only the content key (the bytes would live in covers/)
+    conn.execute("UPDATE books SET cover_key = ?", (hashlib.sha256(cover).hexdigest(),))
+    conn.commit()
+
+    old = measure(lambda: conn.execute("SELECT * FROM books").fetchall())
+    new = measure(lambda: fetch_page.uncached(conn, "books", BOOK_COLUMNS, page_size=args.books)[0])
+    conn.close()
+
+    print(f"{'listing':<22} {'rows':>7} {'peak MiB':>9} {'ms':>8}")
+    print(f"{'SELECT * (BLOBs)':<22} {old[0]:>7} {old[1]:>9.1f} {old[2]:>8.0f}")
+    print(f"{'listing (keys)':<22} {new[0]:>7} {new[1]:>9.1f} {new[2]:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# Archival of old loans.
+#
+# transactions is the hot partition: open loans and loans returned within
+# the last ARCHIVE_AFTER_DAYS days.  The archive job moves older returned
+# loans, ARCHIVE_BATCH at a time, into one table per year of return
+# (transactions_archive_2023, ...), keeping their ids.  Circulation, fines
+# and the inventory checks only ever read transactions, so they cost the
+# same however long the history gets; history reports (View Transactions,
+# exports) read the transaction_history view, transactions UNION ALL every
+# archive table, which is recreated when a year's table is added.
+#
+# A move is an insert into the archive and a delete from transactions in
+# one transaction.  The ids being moved are listed in archive_moves for its
+# duration, and the delete triggers of library.reports and library.fines
+# skip them, so report summaries and overdue_loans still count archived
+# loans; their fines stay as charged.
+import os
+import time
+from datetime import date, timedelta
+
+from library import db
+from library.cache import bump
+from library.fines import create_fine_tables
+from library.reports import create_report_tables
+
+# Loans returned more than this many days ago are archived
+ARCHIVE_AFTER_DAYS = int(os.environ.get("LIBRARY_ARCHIVE_DAYS", "365"))
+
+# Loans moved per write transaction, and seconds to pause between them
+ARCHIVE_BATCH = 5000
+ARCHIVE_PAUSE = 0.02
+
+HISTORY_VIEW = "transaction_history"
+ARCHIVE_COLUMNS = ("id", "book_id", "user_id", "borrow_date", "return_date", "overdue_days", "fine_amount", "copy_id")
+
+# Archive tables have no secondary indexes: they are only read in id order
+ARCHIVE_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY,
+        book_id INTEGER,
+        user_id INTEGER,
+        borrow_date TEXT,
+        return_date TEXT,
+        overdue_days INTEGER DEFAULT 0,
+        fine_amount REAL DEFAULT 0.0,
+        copy_id INTEGER
+    )
+"""
+
+ARCHIVE_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS archive_moves (id INTEGER PRIMARY KEY, year TEXT NOT NULL)",
+    # Returned loans by return date, to find the ones due for the archive
+    """
+    CREATE INDEX IF NOT EXISTS idx_transactions_returned
+    ON transactions(return_date) WHERE return_date IS NOT NULL
+    """,
+]
+
+# The next batch of loans to archive.  The newest loan is never moved, so a
+# transactions table without AUTOINCREMENT cannot hand its id out again.
+NEXT_BATCH = """
+    INSERT INTO archive_moves (id, year)
+    SELECT id, strftime('%Y', return_date) FROM transactions
+    WHERE return_date < :horizon AND strftime('%Y', return_date) IS NOT NULL
+      AND id < (SELECT MAX(id) FROM transactions)
+    ORDER BY return_date LIMIT :batch
+"""
+
+
+def archive_table(year):
+    return f"transactions_archive_{year}"
+
+
+# Names of the archive tables, oldest year first
+def archive_tables(conn):
+    return [row[0] for row in conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name GLOB 'transactions_archive_[0-9][0-9][0-9][0-9]' ORDER BY name
+    """)]
+
+
+def create_history_view(conn):
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    parts = [f"SELECT {columns} FROM {table}" for table in ["transactions"] + archive_tables(conn)]
+    conn.execute(f"DROP VIEW IF EXISTS {HISTORY_VIEW}")
+    conn.execute(f"CREATE VIEW {HISTORY_VIEW} AS {' UNION ALL '.join(parts)}")
+
+
+# Create archive_moves, the return date index and the history view, and
+# recreate the report and fine delete triggers that skip archived loans
+def create_archive(conn):
+    for statement in ARCHIVE_SCHEMA:
+        conn.execute(statement)
+    create_history_view(conn)
+    for trigger in ("reports_loan_delete", "fine_queue_delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.commit()
+    create_fine_tables(conn)
+    create_report_tables(conn)
+
+
+# Move the loans returned more than `days` days ago to the archive; returns
+# how many were moved
+def archive_loans(conn, days=ARCHIVE_AFTER_DAYS, batch=ARCHIVE_BATCH, pause=ARCHIVE_PAUSE, today=None):
+    params = {"horizon": ((today or date.today()) - timedelta(days=days)).isoformat(), "batch": batch}
+    columns = ", ".join(ARCHIVE_COLUMNS)
+
+    def move(conn):
+        moved = conn.execute(NEXT_BATCH, params).rowcount
+        if not moved:
+            return 0
+        tables = set(archive_tables(conn))
+        for (year,) in conn.execute("SELECT DISTINCT year FROM archive_moves").fetchall():
+            table = archive_table(year)
+            if table not in tables:
+                conn.execute(ARCHIVE_TABLE.format(name=table))
+                create_history_view(conn)
+            conn.execute(f"""
+                INSERT INTO {table} ({columns})
+                SELECT {columns} FROM transactions WHERE id IN (SELECT id FROM archive_moves WHERE year = ?)
+            """, (year,))
+        conn.execute("DELETE FROM transactions WHERE id IN (SELECT id FROM archive_moves)")
+        conn.execute("DELETE FROM archive_moves")
+        return moved
+
+    archived = 0
+    while True:
+        moved = db.run_in_transaction(conn, move)
+        archived += moved
+        if moved < batch:
+            break
+        time.sleep(pause)
+    if archived:
+        bump("transactions")
+    return archived
+
+
+# Loans in the hot table and in each archive table: [(table, rows)]
+def partition_sizes(conn):
+    return [(table, conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+            for table in ["transactions"] + archive_tables(conn)]
@@ -0,0 +1,76 @@
+# Theme assets (the page background) are optimised once per process and
+# re-used by every rerun.  The cache is keyed on the source file's mtime, so
+# replacing bg1.jpg takes effect without a restart.
+import base64
+import hashlib
+import io
+import os
+import threading
+
+from PIL import Image
+
+# Streamlit serves ./static as /app/static when server.enableStaticServing is on
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+
+# Largest edge and encoded size the background is reduced to
+BACKGROUND_MAX_EDGE = 1600
+BACKGROUND_BUDGET = 100 * 1024
+
+BACKGROUND_CSS = """
+    <style>
+    .stApp {{
+        background-image: url("{url}");
+        background-size: cover;
+        background-repeat: no-repeat;
+        background-attachment: fixed;
+    }}
+    </style>
+    """
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# Downsize an image and lower the JPEG quality until it fits the byte budget
+def optimize_image(path, max_edge=BACKGROUND_MAX_EDGE, budget=BACKGROUND_BUDGET):
+    image = Image.open(path).convert("RGB")
+    image.thumbnail((max_edge, max_edge))
+    for quality in (85, 75, 65, 55, 45, 35):
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+        if buffer.tell() <= budget:
+            break
+    return buffer.getvalue()
+
+
+# Publish optimised bytes under static/ with a content hash in the name,
+# so browsers can cache the file indefinitely
+def publish_static(name, data):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    file_name = f"{stem}-{hashlib.sha256(data).hexdigest()[:12]}.jpg"
+    path = os.path.join(STATIC_DIR, file_name)
+    if not os.path.exists(path):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        with open(path, "wb") as static_file:
+            static_file.write(data)
+    return f"app/static/{file_name}"
+
+
+# CSS that sets the page background; served as a static file URL when
+# static serving is enabled, otherwise inlined as base64
+def background_css(image_path, static=False):
+    mtime = os.stat(image_path).st_mtime_ns
+    key = (os.path.abspath(image_path), static)
+    cached = _cache.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with _cache_lock:
+        data = optimize_image(image_path)
+        if static:
+            url = publish_static(image_path, data)
+        else:
+            url = "data:image/jpeg;base64," + base64.b64encode(data).decode()
+        css = BACKGROUND_CSS.format(url=url)
+        _cache[key] = (mtime, css)
+    return css
@@ -0,0 +1,119 @@
+# Process-wide cache for read queries.
+#
+# Each cached function names the tables it reads.  Writers call bump() for
+# the tables they change after committing, which moves those tables to a
+# new generation; the generations are part of every cache key, so the next
+# read misses and re-queries while older entries age out of the LRU.
+# Writes made by another process (e.g. the importer CLI) are not seen until
+# an entry's TTL expires.
+#
+# Keys ignore the connection, so one process should serve one database
+# (clear() resets everything, e.g. between benchmark runs).  Cached results
+# are shared between sessions and must not be modified by callers.
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = 512  # entries
+CACHE_TTL = 60.0  # seconds
+
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+# Invalidate every cached read of these tables
+def bump(*tables):
+    with _generations_lock:
+        for table in tables:
+            _generations[table] = _generations.get(table, 0) + 1
+
+
+def generation(table):
+    return _generations.get(table, 0)
+
+
+# Least-recently-used cache with a time-to-live per entry
+class QueryCache:
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        self.expirations = 0
+
+    # (True, value) on a hit, (False, None) otherwise
+    def get(self, name, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses[name] = self.misses.get(name, 0) + 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits[name] = self.hits.get(name, 0) + 1
+            return True, entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits.clear()
+            self.misses.clear()
+            self.evictions = 0
+            self.expirations = 0
+
+    # Per-function hit/miss counts plus cache-wide totals
+    def stats(self):
+        with self._lock:
+            names = sorted(set(self.hits) | set(self.misses))
+            return {
+                "entries": len(self._entries),
+                "size": self.size,
+                "ttl": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "functions": [(name, self.hits.get(name, 0), self.misses.get(name, 0)) for name in names],
+                "generations": dict(sorted(_generations.items())),
+            }
+
+
+CACHE = QueryCache()
+
+
+# Cache fn(conn, ...) by its other arguments and the generations of
+# `tables`, in CACHE or a dedicated QueryCache (e.g. library.patrons)
+def cached(*tables, cache=CACHE):
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(conn, *args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())), tuple(generation(table) for table in tables))
+            hit, value = cache.get(name, key)
+            if not hit:
+                value = fn(conn, *args, **kwargs)
+                cache.put(key, value)
+            return value
+
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+
+# Forget every cached result and counter
+def clear():
+    CACHE.clear()
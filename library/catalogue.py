@@ -0,0 +1,74 @@
+from library.cache import bump
+from library.copies import stock_books
+from library.db import run_in_transaction
+
+# Columns shown by View Books; never includes cover bytes
+BOOK_COLUMNS = ("id", "title", "author", "isbn", "shelf_location", "quantity", "cover_key")
+BOOK_LABELS = {"id": "ID", "title": "Title", "author": "Author", "isbn": "ISBN",
+               "shelf_location": "Shelf", "quantity": "Quantity"}
+BOOK_SORT_KEYS = ("id", "title", "author", "quantity")
+
+# Columns shown by View Users
+USER_COLUMNS = ("id", "name", "user_type", "card_number")
+USER_LABELS = {"id": "ID", "name": "Name", "user_type": "Type", "card_number": "Card"}
+USER_SORT_KEYS = ("id", "name")
+
+# Columns shown by View Transactions
+TRANSACTION_COLUMNS = ("id", "book_id", "user_id", "borrow_date", "return_date", "fine_amount")
+TRANSACTION_LABELS = {"id": "Transaction ID", "book_id": "Book ID", "user_id": "User ID",
+                      "borrow_date": "Borrow Date", "return_date": "Return Date", "fine_amount": "Fine"}
+TRANSACTION_SORT_KEYS = ("id",)
+
+
+# ISBNs are stored in one canonical form, digits and check letter only
+# ("978-3-16-148410-0" -> "9783161484100"), by Add Book, the importer and
+# the Search Book lookup alike
+def normalize_isbn(isbn):
+    return "".join(ch for ch in str(isbn or "") if ch.isalnum()).upper()
+
+
+# Bring ISBNs stored before they were normalised into the canonical form;
+# blank ones become NULL, as the importer stores them
+def normalize_isbns(conn):
+    changed = [(normalize_isbn(isbn) or None, book_id)
+               for book_id, isbn in conn.execute("SELECT id, isbn FROM books WHERE isbn IS NOT NULL")
+               if normalize_isbn(isbn) != isbn]
+    conn.executemany("UPDATE books SET isbn = ? WHERE id = ?", changed)
+    conn.commit()
+    if changed:
+        bump("books")
+
+
+# Add a book to the catalogue with `quantity` copies and return its id
+def add_book(conn, title, author, isbn, shelf_location, quantity, cover_key=None):
+    cursor = conn.execute("""
+        INSERT INTO books (title, author, isbn, shelf_location, quantity, cover_key)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (title, author, normalize_isbn(isbn) or None, shelf_location, quantity, cover_key))
+    stock_books(conn, cursor.lastrowid)
+    conn.commit()
+    bump("books", "copies")
+    return cursor.lastrowid
+
+
+# Raised when a book cannot be removed
+class CatalogueError(Exception):
+    pass
+
+
+# Remove a book with its copies; refused while a copy is on loan, so no
+# loan is left without its book.  Holds on the title are cancelled.
+def remove_book(conn, book_id):
+    def remove(conn):
+        if conn.execute("SELECT 1 FROM books WHERE id = ?", (book_id,)).fetchone() is None:
+            raise CatalogueError("Book not found.")
+        on_loan = conn.execute(
+            "SELECT COUNT(*) FROM transactions WHERE book_id = ? AND return_date IS NULL", (book_id,)).fetchone()[0]
+        if on_loan:
+            raise CatalogueError(f"{on_loan} copy(ies) of this book are on loan; they must be returned first.")
+        conn.execute("UPDATE holds SET status = 'cancelled' WHERE book_id = ? AND status IN ('waiting', 'ready')",
+                     (book_id,))
+        conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+
+    run_in_transaction(conn, remove)
+    bump("books", "copies", "holds")
@@ -0,0 +1,293 @@
+from datetime import date
+
+from library.cache import bump
+from library.copies import copy_by_barcode
+from library.db import run_in_transaction
+from library.fines import LOAN_FINES, loan_fine
+from library.holds import active_hold, release_copy
+
+# Cache tables every borrow and return changes
+CIRCULATION_TABLES = ("books", "copies", "transactions", "holds")
+
+
+# Raised when a borrow or return cannot be carried out
+class CirculationError(Exception):
+    pass
+
+
+# Lend a copy inside the caller's transaction; the user's hold on the
+# title, if any, is fulfilled by the loan.  Returns the transaction id.
+def lend_copy(conn, copy_id, book_id, user_id, hold):
+    conn.execute("UPDATE copies SET status = 'on_loan' WHERE id = ?", (copy_id,))
+    cursor = conn.execute(
+        "INSERT INTO transactions (book_id, user_id, borrow_date, copy_id) VALUES (?, ?, DATE('now'), ?)",
+        (book_id, user_id, copy_id))
+    if hold is not None:
+        conn.execute("UPDATE holds SET status = 'fulfilled', transaction_id = ? WHERE id = ?",
+                     (cursor.lastrowid, hold[0]))
+    return cursor.lastrowid
+
+
+# Lend one copy of a book: the copy kept for the user's ready hold
+# (library.holds), or any copy on the shelf.  Picking the copy and marking
+# it on loan happen under the transaction's write lock, so a copy is never
+# lent twice.
+def borrow_book(conn, book_id, user_id):
+    def borrow(conn):
+        hold = active_hold(conn, book_id, user_id)
+        if hold is not None and hold[1] == "ready":
+            copy_id = hold[2]
+        else:
+            copy = conn.execute(
+                "SELECT id FROM copies WHERE book_id = ? AND status = 'available' LIMIT 1", (book_id,)).fetchone()
+            if copy is None:
+                raise CirculationError("Book not available.")
+            copy_id = copy[0]
+        return lend_copy(conn, copy_id, book_id, user_id, hold)
+
+    transaction_id = run_in_transaction(conn, borrow)
+    bump(*CIRCULATION_TABLES)
+    return transaction_id
+
+
+# Lend the copy with a barcode: one on the shelf, or the one kept for the
+# user's ready hold
+def borrow_copy(conn, barcode, user_id):
+    def borrow(conn):
+        copy = copy_by_barcode(conn, barcode)
+        if copy is None:
+            raise CirculationError("No copy has that barcode.")
+        copy_id, book_id, status = copy
+        hold = active_hold(conn, book_id, user_id)
+        if status == "held":
+            if hold is None or hold[2] != copy_id:
+                raise CirculationError("This copy is kept for another patron's hold.")
+        elif status != "available":
+            raise CirculationError(f"This copy is {status.replace('_', ' ')}.")
+        elif hold is not None and hold[1] == "ready":
+            # The user took a copy off the shelf; the one kept for them moves on
+            release_copy(conn, hold[2], book_id)
+        return lend_copy(conn, copy_id, book_id, user_id, hold)
+
+    transaction_id = run_in_transaction(conn, borrow)
+    bump(*CIRCULATION_TABLES)
+    return transaction_id
+
+
+# Close a loan inside the caller's transaction and return the fine charged;
+# the copy goes to the head of the title's hold queue if there is one
+def close_loan(conn, transaction_id, copy_id, book_id):
+    # Fine according to the borrower's loan policy (library.fines)
+    overdue_days, fine_amount = loan_fine(conn, transaction_id)
+    conn.execute(
+        "UPDATE transactions SET return_date = DATE('now'), overdue_days = ?, fine_amount = ? WHERE id = ?",
+        (overdue_days, fine_amount, transaction_id))
+    release_copy(conn, copy_id, book_id)
+    return fine_amount
+
+
+# Close the user's open loan for a book and return the fine charged
+def return_book(conn, book_id, user_id):
+    def give_back(conn):
+        transaction = conn.execute("""
+            SELECT id, copy_id FROM transactions
+            WHERE book_id = ? AND user_id = ? AND return_date IS NULL
+            ORDER BY id LIMIT 1
+        """, (book_id, user_id)).fetchone()
+        if transaction is None:
+            raise CirculationError("No active borrow record found for this user and book.")
+        return close_loan(conn, transaction[0], transaction[1], book_id)
+
+    fine_amount = run_in_transaction(conn, give_back)
+    bump(*CIRCULATION_TABLES)
+    return fine_amount
+
+
+# Close the open loan of the copy with a barcode; returns (book id, fine)
+def return_copy(conn, barcode):
+    def give_back(conn):
+        copy = copy_by_barcode(conn, barcode)
+        if copy is None:
+            raise CirculationError("No copy has that barcode.")
+        transaction = conn.execute(
+            "SELECT id FROM transactions WHERE copy_id = ? AND return_date IS NULL", (copy[0],)).fetchone()
+        if transaction is None:
+            raise CirculationError("This copy is not on loan.")
+        return copy[1], close_loan(conn, transaction[0], copy[0], copy[1])
+
+    result = run_in_transaction(conn, give_back)
+    bump(*CIRCULATION_TABLES)
+    return result
+
+
+# Batch circulation: a queue of (book_id, user_id) pairs, scanned or pasted,
+# is validated with a few set-based queries and applied in one transaction,
+# each item's copy picked and updated set-based too.  Items that fail
+# validation are skipped with an error; the others go through.  Both
+# functions return one result dict per item, in queue order.  hold_id marks
+# items lent from, or returned to, a ready hold.
+
+# The queue; TEMP, so private to the connection
+BATCH_SCHEMA = """
+    CREATE TEMP TABLE IF NOT EXISTS circulation_batch (
+        seq INTEGER PRIMARY KEY,
+        book_id INTEGER,
+        user_id INTEGER,
+        transaction_id INTEGER,
+        copy_id INTEGER,
+        hold_id INTEGER,
+        overdue_days INTEGER,
+        fine_amount REAL,
+        error TEXT
+    )
+"""
+
+def load_batch(conn, items):
+    conn.execute(BATCH_SCHEMA)
+    conn.execute("DELETE FROM temp.circulation_batch")
+    conn.executemany("INSERT INTO temp.circulation_batch (seq, book_id, user_id) VALUES (?, ?, ?)",
+                     ((seq, book_id, user_id) for seq, (book_id, user_id) in enumerate(items)))
+
+
+def batch_results(conn):
+    rows = conn.execute("""
+        SELECT book_id, user_id, transaction_id, hold_id, fine_amount, error FROM temp.circulation_batch ORDER BY seq
+    """)
+    return [dict(zip(("book_id", "user_id", "transaction_id", "hold_id", "fine_amount", "error"), row))
+            for row in rows]
+
+
+# Lend every pair that can be lent; a book's copies go to the earliest items,
+# after any kept for the user's ready hold
+def borrow_many(conn, items):
+    def borrow(conn):
+        load_batch(conn, items)
+        rows = conn.execute("""
+            SELECT b.seq, b.book_id, u.id IS NOT NULL, k.id IS NOT NULL, COALESCE(k.quantity, 0), h.id, h.copy_id
+            FROM temp.circulation_batch b
+            LEFT JOIN users u ON u.id = b.user_id
+            LEFT JOIN books k ON k.id = b.book_id
+            LEFT JOIN holds h ON h.book_id = b.book_id AND h.user_id = b.user_id AND h.status = 'ready'
+            ORDER BY b.seq
+        """).fetchall()
+        errors, accepted, held, used, available = [], [], [], set(), {}
+        for seq, book_id, user_found, book_found, quantity, hold_id, copy_id in rows:
+            available.setdefault(book_id, quantity)
+            if not user_found:
+                errors.append(("User not found.", seq))
+            elif not book_found:
+                errors.append(("Book not found.", seq))
+            elif hold_id is not None and hold_id not in used:
+                used.add(hold_id)
+                held.append((hold_id, copy_id, seq))
+                accepted.append(seq)
+            elif available[book_id] <= 0:
+                errors.append(("Book not available.", seq))
+            else:
+                available[book_id] -= 1
+                accepted.append(seq)
+        conn.executemany("UPDATE temp.circulation_batch SET error = ? WHERE seq = ?", errors)
+        conn.executemany("UPDATE temp.circulation_batch SET hold_id = ?, copy_id = ? WHERE seq = ?", held)
+
+        # The other items take their titles' shelf copies in queue order
+        conn.execute("""
+            WITH wanted AS (
+                SELECT seq, book_id, ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY seq) AS n
+                FROM temp.circulation_batch WHERE error IS NULL AND copy_id IS NULL
+            ),
+            shelf AS (
+                SELECT id, book_id, ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY id) AS n
+                FROM copies WHERE status = 'available' AND book_id IN (SELECT book_id FROM wanted)
+            )
+            UPDATE temp.circulation_batch SET copy_id = matched.id
+            FROM (SELECT w.seq, s.id FROM wanted w JOIN shelf s ON s.book_id = w.book_id AND s.n = w.n) AS matched
+            WHERE circulation_batch.seq = matched.seq
+        """)
+        conn.execute("""
+            UPDATE copies SET status = 'on_loan'
+            WHERE id IN (SELECT copy_id FROM temp.circulation_batch WHERE error IS NULL)
+        """)
+
+        # Ids above the current maximum are this statement's, in queue order,
+        # since the transaction holds the write lock
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        conn.execute("""
+            INSERT INTO transactions (book_id, user_id, borrow_date, copy_id)
+            SELECT book_id, user_id, DATE('now'), copy_id FROM temp.circulation_batch WHERE error IS NULL ORDER BY seq
+        """)
+        ids = conn.execute("SELECT id FROM transactions WHERE id > ? ORDER BY id", (last_id,))
+        conn.executemany("UPDATE temp.circulation_batch SET transaction_id = ? WHERE seq = ?",
+                         ((row[0], seq) for row, seq in zip(ids.fetchall(), accepted)))
+        # The borrowers' holds on these titles, ready or still waiting, are met
+        conn.execute("""
+            UPDATE holds SET status = 'fulfilled', transaction_id = queued.transaction_id
+            FROM temp.circulation_batch AS queued
+            WHERE queued.error IS NULL AND holds.book_id = queued.book_id AND holds.user_id = queued.user_id
+              AND holds.status IN ('waiting', 'ready')
+        """)
+        return batch_results(conn)
+
+    results = run_in_transaction(conn, borrow)
+    bump(*CIRCULATION_TABLES)
+    return results
+
+
+# Return every pair with an open loan, charging fines as return_book does;
+# a pair queued n times closes that user's n oldest loans of the book
+def return_many(conn, items):
+    def give_back(conn):
+        load_batch(conn, items)
+        conn.execute("""
+            WITH queued AS (
+                SELECT seq, book_id, user_id,
+                       ROW_NUMBER() OVER (PARTITION BY book_id, user_id ORDER BY seq) AS n
+                FROM temp.circulation_batch
+            ),
+            loans AS (
+                SELECT id, book_id, user_id, copy_id,
+                       ROW_NUMBER() OVER (PARTITION BY book_id, user_id ORDER BY id) AS n
+                FROM transactions
+                WHERE return_date IS NULL
+                  AND (book_id, user_id) IN (SELECT book_id, user_id FROM temp.circulation_batch)
+            )
+            UPDATE temp.circulation_batch SET transaction_id = matched.id, copy_id = matched.copy_id
+            FROM (SELECT q.seq, l.id, l.copy_id FROM queued q
+                  JOIN loans l ON l.book_id = q.book_id AND l.user_id = q.user_id AND l.n = q.n) AS matched
+            WHERE circulation_batch.seq = matched.seq
+        """)
+        conn.execute("""
+            UPDATE temp.circulation_batch SET error = 'No active borrow record found for this user and book.'
+            WHERE transaction_id IS NULL
+        """)
+
+        # Fines according to each borrower's loan policy (library.fines)
+        conn.execute(f"""
+            UPDATE temp.circulation_batch
+            SET overdue_days = MAX(0, fines.overdue_days), fine_amount = MAX(0, fines.fine_amount)
+            FROM ({LOAN_FINES.format(where="t.id IN (SELECT transaction_id FROM temp.circulation_batch)")}) AS fines
+            WHERE circulation_batch.transaction_id = fines.transaction_id
+        """, {"today": date.today().isoformat()})
+        conn.execute("""
+            UPDATE transactions
+            SET return_date = DATE('now'), overdue_days = queued.overdue_days, fine_amount = queued.fine_amount
+            FROM temp.circulation_batch AS queued
+            WHERE transactions.id = queued.transaction_id
+        """)
+        # Returned copies of held titles go to the heads of their queues, the
+        # others back on the shelf
+        held = conn.execute("""
+            SELECT seq, copy_id, book_id FROM temp.circulation_batch b
+            WHERE error IS NULL AND EXISTS (SELECT 1 FROM holds h WHERE h.book_id = b.book_id AND h.status = 'waiting')
+            ORDER BY seq
+        """).fetchall()
+        conn.executemany("UPDATE temp.circulation_batch SET hold_id = ? WHERE seq = ?",
+                         [(release_copy(conn, copy_id, book_id), seq) for seq, copy_id, book_id in held])
+        conn.execute("""
+            UPDATE copies SET status = 'available'
+            WHERE id IN (SELECT copy_id FROM temp.circulation_batch WHERE error IS NULL AND hold_id IS NULL)
+        """)
+        return batch_results(conn)
+
+    results = run_in_transaction(conn, give_back)
+    bump(*CIRCULATION_TABLES)
+    return results
@@ -0,0 +1,143 @@
+import streamlit as st
+
+from library import cache
+from library.db import connection
+from library.jobs import request_run, scheduler_running
+from library.listing import PAGE_SIZES, fetch_page, page_cursor
+from library.patrons import find_patrons, patron_label, suggest_patrons
+from library.reports import active_borrowers, fine_totals, loans_per_day, loans_per_week, top_titles
+from library.snapshot import SNAPSHOT_INTERVAL, refresh_snapshot, snapshot_age, snapshot_connection, snapshot_info
+
+
+# Paginated, sortable table rendered as a single st.dataframe.  Only the
+# columns named in `labels` are displayed; the stack of page cursors lives
+# in session state under `key`.  With snapshot=True the rows come from the
+# read-only snapshot (library.snapshot).
+# Returns the rows shown on the current page.
+def paginated_table(key, table, columns, labels, sort_keys, snapshot=False):
+    sort_column, size_column = st.columns(2)
+    sort_key = sort_column.selectbox("Sort by", sort_keys, format_func=labels.get, key=f"{key}_sort")
+    page_size = size_column.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+
+    # Start again from the first page whenever the ordering or page size changes
+    if st.session_state.get(f"{key}_view") != (sort_key, page_size):
+        st.session_state[f"{key}_view"] = (sort_key, page_size)
+        st.session_state[f"{key}_cursors"] = [None]
+    cursors = st.session_state[f"{key}_cursors"]
+
+    with (snapshot_connection if snapshot else connection)() as conn:
+        rows, has_more = fetch_page(conn, table, columns, sort_key, cursors[-1], page_size)
+
+    if not rows:
+        return rows
+
+    shown = [index for index, column in enumerate(columns) if column in labels]
+    st.dataframe([{labels[columns[index]]: row[index] for index in shown} for row in rows],
+                 hide_index=True, width="stretch")
+
+    previous_column, page_column, next_column = st.columns([1, 2, 1])
+    previous_column.button("Previous", key=f"{key}_previous", disabled=len(cursors) == 1,
+                           on_click=cursors.pop)
+    page_column.caption(f"Page {len(cursors)}")
+    next_column.button("Next", key=f"{key}_next", disabled=not has_more,
+                       on_click=cursors.append, args=(page_cursor(columns, sort_key, rows[-1]),))
+    return rows
+
+
+# Patron lookup by card number or name.  An exact card or name match is
+# used directly; otherwise (or when several patrons share the name) the
+# matches or typeahead suggestions are offered in a selectbox.
+# Returns the chosen user id, or None with a message shown.
+def patron_picker(key):
+    text = st.text_input("Card number or name", key=f"{key}_patron")
+    if not text.strip():
+        return None
+    with connection() as conn:
+        matches = find_patrons(conn, text) or suggest_patrons(conn, text)
+    if not matches:
+        st.error("No patron matches that card number or name. ❌")
+        return None
+    if len(matches) == 1:
+        st.caption(patron_label(matches[0]))
+        return matches[0][0]
+    choice = st.selectbox("Patron", matches, format_func=patron_label, key=f"{key}_patron_choice")
+    return choice[0]
+
+
+# Circulation dashboards.  Every chart reads a summary table from
+# library.reports, never transactions, so the page stays fast on large
+# histories; the tables are read from the snapshot.
+def circulation_dashboard():
+    with snapshot_connection() as conn:
+        daily = loans_per_day(conn)
+        weekly = loans_per_week(conn)
+        titles = top_titles(conn)
+        borrowers = active_borrowers(conn)
+        fines = fine_totals(conn)
+
+    st.subheader("Loans")
+    per_day, per_week = st.tabs(["Per day (90 days)", "Per week (26 weeks)"])
+    per_day.line_chart({"Day": [row[0] for row in daily], "Loans": [row[1] for row in daily],
+                        "Returns": [row[2] for row in daily]}, x="Day")
+    per_week.bar_chart({"Week": [row[0] for row in weekly], "Loans": [row[1] for row in weekly],
+                        "Returns": [row[2] for row in weekly]}, x="Week", stack=False)
+
+    st.subheader("Most Borrowed Titles")
+    st.dataframe([{"Title": title, "Author": author, "Loans": loans} for title, author, loans in titles],
+                 hide_index=True, width="stretch")
+
+    borrowers_column, fines_column = st.columns(2)
+    borrowers_column.subheader("Active Borrowers")
+    borrowers_column.bar_chart({"User Type": [row[0] for row in borrowers],
+                                "Borrowers": [row[1] for row in borrowers]}, x="User Type")
+    fines_column.subheader("Fines")
+    fines_column.bar_chart({"User Type": [row[0] for row in fines], "Charged": [row[2] for row in fines],
+                            "Outstanding": [row[3] for row in fines]}, x="User Type", stack=False)
+    fines_column.metric("Outstanding on open loans", f"${sum(row[3] for row in fines):.2f}")
+
+
+def take_snapshot():
+    with connection() as conn:
+        refresh_snapshot(conn)
+
+
+# When the snapshot (library.snapshot) a page reads was taken, with a
+# button to refresh it.  Without the scheduler (LIBRARY_JOBS=0) a snapshot
+# older than SNAPSHOT_INTERVAL is refreshed here first.
+def snapshot_caption():
+    info = snapshot_info()
+    if info is None or (not scheduler_running() and snapshot_age(info[0]) > SNAPSHOT_INTERVAL):
+        with st.spinner("Taking a snapshot of the database..."):
+            take_snapshot()
+        info = snapshot_info()
+
+    caption_column, button_column = st.columns([3, 1])
+    caption_column.caption(f"Figures as of {info[0][:19].replace('T', ' ')} UTC "
+                           f"({snapshot_age(info[0]) // 60:.0f} min ago), from a read-only snapshot "
+                           f"refreshed every {SNAPSHOT_INTERVAL // 60} min.")
+    if scheduler_running():
+        if button_column.button("Refresh Snapshot", key="snapshot_refresh", on_click=request_run, args=("snapshot",)):
+            caption_column.info("A new snapshot is being taken in the background. Refresh the page shortly.")
+    else:
+        button_column.button("Refresh Snapshot", key="snapshot_refresh", on_click=take_snapshot)
+
+
+# Hit/miss counters of this process's query cache (library.cache)
+def cache_stats_panel():
+    stats = cache.CACHE.stats()
+    hits = sum(row[1] for row in stats["functions"])
+    misses = sum(row[2] for row in stats["functions"])
+
+    entries_column, hit_rate_column, evictions_column = st.columns(3)
+    entries_column.metric("Entries", f"{stats['entries']} / {stats['size']}")
+    hit_rate_column.metric("Hit rate", f"{hits / (hits + misses):.0%}" if hits + misses else "-")
+    evictions_column.metric("Evicted / expired", f"{stats['evictions']} / {stats['expirations']}")
+
+    if stats["functions"]:
+        st.dataframe([{"Query": name, "Hits": hit_count, "Misses": miss_count,
+                       "Hit Rate": f"{hit_count / (hit_count + miss_count):.0%}"}
+                      for name, hit_count, miss_count in stats["functions"]],
+                     hide_index=True, width="stretch")
+    st.caption(f"Entries expire after {stats['ttl']:.0f} s. Table generations: "
+               + (", ".join(f"{table} {number}" for table, number in stats["generations"].items()) or "none"))
+    st.button("Clear Cache", on_click=cache.clear)
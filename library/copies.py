@@ -0,0 +1,174 @@
+# Copy inventory: every physical copy of a title is a row of `copies` with
+# a unique barcode and a status, and a loan (transactions.copy_id) names the
+# copy lent.  Copies are 'available' on the shelf, 'on_loan', 'held' for a
+# ready hold (library.holds) or 'withdrawn'.
+#
+# books.quantity is still the number of copies on the shelf, but no code
+# adds to or subtracts from it any more: triggers on copies keep it equal
+# to the title's available copies, in the same statement as the status
+# change, so it cannot drift.  Picking a copy to lend is a probe of the
+# partial index on available copies, and checkout or return by barcode a
+# seek on the unique barcode index.
+import sqlite3
+
+from library.cache import bump, cached
+from library.holds import release_copy
+
+# Barcodes given to copies added without one: C + 9-digit copy id
+AUTO_BARCODE_FORMAT = "C%09d"
+
+COPIES_TABLE = """
+    CREATE TABLE IF NOT EXISTS copies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id INTEGER NOT NULL,
+        barcode TEXT,
+        status TEXT NOT NULL DEFAULT 'available' CHECK(status IN ('available', 'on_loan', 'held', 'withdrawn')),
+        FOREIGN KEY(book_id) REFERENCES books(id)
+    )
+"""
+
+COPIES_SCHEMA = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_copies_barcode ON copies(barcode)",
+    # A title's copies, and "is one on the shelf": one probe of the second
+    "CREATE INDEX IF NOT EXISTS idx_copies_book ON copies(book_id)",
+    "CREATE INDEX IF NOT EXISTS idx_copies_available ON copies(book_id) WHERE status = 'available'",
+    # The open loan of a copy, for returns by barcode
+    """
+    CREATE INDEX IF NOT EXISTS idx_transactions_open_copy ON transactions(copy_id)
+    WHERE return_date IS NULL
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS copies_barcode AFTER INSERT ON copies WHEN new.barcode IS NULL BEGIN
+        UPDATE copies SET barcode = printf('{AUTO_BARCODE_FORMAT}', new.id) WHERE id = new.id;
+    END
+    """,
+    # books.quantity = the title's available copies
+    """
+    CREATE TRIGGER IF NOT EXISTS copies_quantity_insert AFTER INSERT ON copies
+    WHEN new.status = 'available' BEGIN
+        UPDATE books SET quantity = quantity + 1 WHERE id = new.book_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS copies_quantity_delete AFTER DELETE ON copies
+    WHEN old.status = 'available' BEGIN
+        UPDATE books SET quantity = quantity - 1 WHERE id = old.book_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS copies_quantity_update AFTER UPDATE OF book_id, status ON copies
+    WHEN (old.status = 'available') != (new.status = 'available') OR old.book_id != new.book_id BEGIN
+        UPDATE books SET quantity = quantity - 1 WHERE id = old.book_id AND old.status = 'available';
+        UPDATE books SET quantity = quantity + 1 WHERE id = new.book_id AND new.status = 'available';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_copies_delete AFTER DELETE ON books BEGIN
+        DELETE FROM copies WHERE book_id = old.id;
+    END
+    """,
+]
+
+# Copies of books with id >= :first_id, `quantity` of each, in id order
+STOCK_BOOKS = """
+    WITH RECURSIVE n(i) AS (
+        SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < (SELECT MAX(quantity) FROM books WHERE id >= :first_id)
+    )
+    INSERT INTO copies (book_id, status)
+    SELECT b.id, 'available' FROM books b JOIN n ON n.i <= b.quantity
+    WHERE b.id >= :first_id ORDER BY b.id, n.i
+"""
+
+
+# Raised when a copy cannot be found, added or withdrawn
+class CopyError(Exception):
+    pass
+
+
+# Add the copies table and transactions.copy_id / holds.copy_id, and give
+# every existing title its copies: one per copy on the shelf, one per open
+# loan (linked to it) and one per ready hold.  The backfill runs before the
+# triggers exist, so books.quantity is left as it was, and in one
+# transaction, so an interrupted migration starts it again from scratch.
+def create_copy_inventory(conn):
+    for table in ("transactions", "holds"):
+        if "copy_id" not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN copy_id INTEGER")
+    conn.execute(COPIES_TABLE)
+    conn.commit()
+    if conn.execute("SELECT 1 FROM copies LIMIT 1").fetchone() is None:
+        conn.execute("UPDATE books SET quantity = 0 WHERE quantity < 0")
+        conn.execute(STOCK_BOOKS, {"first_id": 0})
+        # Ids above the current maximum are each statement's, in its order
+        for table, status, where in (("transactions", "on_loan", "return_date IS NULL AND book_id IS NOT NULL"),
+                                     ("holds", "held", "status = 'ready'")):
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM copies").fetchone()[0]
+            conn.execute(f"INSERT INTO copies (book_id, status) SELECT book_id, ? FROM {table} WHERE {where} ORDER BY id",
+                         (status,))
+            conn.execute(f"""
+                UPDATE {table} SET copy_id = numbered.copy_id
+                FROM (SELECT id, ? + ROW_NUMBER() OVER (ORDER BY id) AS copy_id FROM {table} WHERE {where}) AS numbered
+                WHERE {table}.id = numbered.id
+            """, (last_id,))
+        conn.execute(f"UPDATE copies SET barcode = printf('{AUTO_BARCODE_FORMAT}', id) WHERE barcode IS NULL")
+    for statement in COPIES_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+# Give the books inserted with id >= first_id the copies their quantity
+# says, inside the caller's transaction; the triggers count them into
+# quantity again, so it is reset from the copies afterwards
+def stock_books(conn, first_id):
+    conn.execute(STOCK_BOOKS, {"first_id": first_id})
+    conn.execute("""
+        UPDATE books SET quantity = (SELECT COUNT(*) FROM copies c WHERE c.book_id = books.id AND c.status = 'available')
+        WHERE id >= ?
+    """, (first_id,))
+
+
+# Add copies of a title, with the given barcodes and `count` automatic
+# ones; returns their barcodes.  New copies serve the title's hold queue
+# before going on the shelf.
+def add_copies(conn, book_id, count=0, barcodes=()):
+    barcodes = [barcode.strip() for barcode in barcodes if barcode.strip()]
+    if conn.execute("SELECT 1 FROM books WHERE id = ?", (book_id,)).fetchone() is None:
+        raise CopyError("Book not found.")
+    try:
+        ids = [conn.execute("INSERT INTO copies (book_id, barcode) VALUES (?, ?)", (book_id, barcode)).lastrowid
+               for barcode in barcodes + [None] * count]
+        for copy_id in ids:
+            release_copy(conn, copy_id, book_id)
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        raise CopyError("A barcode is already in use.")
+    bump("books", "copies", "holds")
+    return [row[0] for row in conn.execute(
+        f"SELECT barcode FROM copies WHERE id IN ({', '.join('?' * len(ids))}) ORDER BY id", ids)]
+
+
+# Take a copy on the shelf out of circulation
+def withdraw_copy(conn, barcode):
+    cursor = conn.execute("UPDATE copies SET status = 'withdrawn' WHERE barcode = ? AND status = 'available'",
+                          (barcode,))
+    conn.commit()
+    if cursor.rowcount == 0:
+        raise CopyError("No copy with that barcode is on the shelf.")
+    bump("books", "copies")
+
+
+# (copy id, book id, status) of a barcode, or None
+def copy_by_barcode(conn, barcode):
+    return conn.execute("SELECT id, book_id, status FROM copies WHERE barcode = ?", (barcode.strip(),)).fetchone()
+
+
+# A title's copies with the borrower of each copy on loan:
+# (barcode, status, user id, borrow date)
+@cached("copies", "transactions")
+def book_copies(conn, book_id):
+    return conn.execute("""
+        SELECT c.barcode, c.status, t.user_id, t.borrow_date
+        FROM copies c LEFT JOIN transactions t ON t.copy_id = c.id AND t.return_date IS NULL
+        WHERE c.book_id = ? ORDER BY c.id
+    """, (book_id,)).fetchall()
@@ -0,0 +1,223 @@
+# Content-addressed cover store.  Covers live on disk under COVER_DIR keyed
+# by the SHA-256 of the encoded JPEG; books rows only keep that key.
+#
+#   covers/ab/ab12...ef.jpg         full-size cover
+#   covers/ab/ab12...ef_96.webp     thumbnails, one per THUMBNAIL_SIZES entry
+#                                   (.jpg where Pillow lacks WebP)
+#
+# Uploads are decoded in memory at reduced scale (Image.draft lets the JPEG
+# decoder skip detail the cover will not keep) and processed in a pool of
+# worker processes (submit_cover()), so Streamlit threads never hold the GIL
+# for image work.  Uploads over MAX_UPLOAD_BYTES or MAX_PIXELS are refused.
+#
+# Move covers still stored in books.image into the store with:
+#   python -m library.covers migrate
+import argparse
+import hashlib
+import io
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, features
+
+from library.db import connection
+from library.schema import table_columns
+
+COVER_DIR = os.environ.get("LIBRARY_COVERS", "covers")
+
+# Longest edge of the pre-generated thumbnails, smallest first
+THUMBNAIL_SIZES = (96, 320)
+JPEG_QUALITY = 85
+THUMBNAIL_FORMAT, THUMBNAIL_EXT = ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+WEBP_QUALITY = 80
+
+# Largest upload accepted, its largest pixel count, and the longest edge a
+# stored cover is reduced to (by halving, so larger photos end up between
+# half of it and it)
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_PIXELS = 50_000_000
+MAX_COVER_EDGE = 1600
+
+# Worker processes encoding covers (default: one per CPU)
+COVER_WORKERS = int(os.environ.get("LIBRARY_COVER_WORKERS", "0")) or os.cpu_count()
+
+
+# Raised for an upload that is not an image or is too large
+class CoverError(Exception):
+    pass
+
+
+# Path of a stored cover, or of one of its thumbnails
+def cover_path(key, size=None):
+    if size is None:
+        return os.path.join(COVER_DIR, key[:2], f"{key}.jpg")
+    return os.path.join(COVER_DIR, key[:2], f"{key}_{size}.{THUMBNAIL_EXT}")
+
+
+# Write a file so readers never see it half-written
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as temp_file:
+        temp_file.write(data)
+    os.replace(temp_path, path)
+
+
+# Open image bytes as RGB, halving larger images until the longest edge is
+# at most `max_edge` (so it ends up over half of it).  The size checks read
+# only the header; draft() makes the JPEG decoder do the halving while
+# decoding (by 1/2, 1/4 or 1/8), and reduce() does the rest with a box
+# filter, both far cheaper than a full decode and resample.
+def open_scaled(data, max_edge=MAX_COVER_EDGE):
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise CoverError(f"The image is over {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError:
+        raise CoverError(f"The image is over {MAX_PIXELS // 1_000_000} megapixels.")
+    except (OSError, SyntaxError):
+        raise CoverError("The file is not a readable image.")
+    width, height = image.size
+    if width * height > MAX_PIXELS:
+        raise CoverError(f"The image is {width}x{height}, over {MAX_PIXELS // 1_000_000} megapixels.")
+    if max(width, height) > max_edge:
+        scale = max_edge / max(width, height) / 2
+        image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+    try:
+        image = image.convert("RGB")
+    except (OSError, SyntaxError):
+        raise CoverError("The image is damaged or truncated.")
+    factor = math.ceil(max(image.size) / max_edge)
+    return image.reduce(factor) if factor > 1 else image
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "WEBP":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY)
+    else:
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+# Decode an upload (bytes or a file object) and re-encode it as JPEG bytes
+def encode_cover(upload):
+    data = upload if isinstance(upload, bytes) else upload.read(MAX_UPLOAD_BYTES + 1)
+    return _encode(open_scaled(data), "JPEG")
+
+
+# Write any missing thumbnails of a cover from its decoded image, each
+# made from the next larger one
+def _write_thumbnails(key, image):
+    for size in reversed(THUMBNAIL_SIZES):
+        image = image.copy()
+        image.thumbnail((size, size))
+        path = cover_path(key, size)
+        if not os.path.exists(path):
+            _write_atomic(path, _encode(image, THUMBNAIL_FORMAT))
+
+
+# Generate any missing thumbnails of a stored cover
+def generate_thumbnails(key, data=None):
+    if all(os.path.exists(cover_path(key, size)) for size in THUMBNAIL_SIZES):
+        return
+    if data is None:
+        with open(cover_path(key), "rb") as cover_file:
+            data = cover_file.read()
+    _write_thumbnails(key, open_scaled(data, 2 * max(THUMBNAIL_SIZES)))
+
+
+# Store JPEG bytes and their thumbnails; returns the content key.
+# Identical covers are stored once.  With thumbnails=False the thumbnails
+# are left to the background thumbnails job (library.jobs).
+def store_cover(data, thumbnails=True):
+    key = hashlib.sha256(data).hexdigest()
+    path = cover_path(key)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    if thumbnails:
+        generate_thumbnails(key, data)
+    return key
+
+
+# Decode, downscale and store an upload with its thumbnails, from one
+# decode; returns the content key.  Runs in the worker processes.
+def ingest_cover(data):
+    image = open_scaled(data)
+    encoded = _encode(image, "JPEG")
+    key = hashlib.sha256(encoded).hexdigest()
+    if not os.path.exists(cover_path(key)):
+        _write_atomic(cover_path(key), encoded)
+    _write_thumbnails(key, image)
+    return key
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# The worker pool, started on first use.  Workers are spawned rather than
+# forked, as forking the multi-threaded Streamlit server is unsafe.
+def cover_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(COVER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+# Process an upload in the pool; returns a Future of its content key
+# (raising CoverError for a refused image)
+def submit_cover(data):
+    return cover_pool().submit(ingest_cover, data)
+
+
+# Process many uploads in the pool; returns their keys in order
+def ingest_covers(uploads, chunksize=8):
+    return list(cover_pool().map(ingest_cover, uploads, chunksize=chunksize))
+
+
+# Smallest thumbnail that is at least `size` pixels, or the full cover
+# (also while the thumbnail has not been generated yet)
+def thumbnail_path(key, size=THUMBNAIL_SIZES[0]):
+    for thumbnail_size in THUMBNAIL_SIZES:
+        if thumbnail_size >= size:
+            path = cover_path(key, thumbnail_size)
+            return path if os.path.exists(path) else cover_path(key)
+    return cover_path(key)
+
+
+# Move covers out of books.image into the store, a batch per transaction
+def migrate_cover_blobs(conn, batch_size=200):
+    moved = 0
+    if "image" not in table_columns(conn, "books"):
+        return moved
+    while True:
+        rows = conn.execute("""
+            SELECT id, image FROM books
+            WHERE image IS NOT NULL AND cover_key IS NULL
+            LIMIT ?
+        """, (batch_size,)).fetchall()
+        if not rows:
+            return moved
+        updates = [(store_cover(image), book_id) for book_id, image in rows]
+        conn.executemany("UPDATE books SET cover_key = ?, image = NULL WHERE id = ?", updates)
+        conn.commit()
+        moved += len(updates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cover image store")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args()
+    with connection() as conn:
+        moved = migrate_cover_blobs(conn)
+    print(f"Moved {moved} covers into {COVER_DIR}/")
+
+
+if __name__ == "__main__":
+    main()
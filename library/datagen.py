@@ -0,0 +1,209 @@
+# Synthetic library generator: books, users and their loan history at a
+# chosen scale, the same for the same seed and end date.
+#
+#   - book popularity and user activity follow Zipf laws, so a few titles
+#     and readers account for most loans, as in a real library;
+#   - popular titles have more copies;
+#   - loans arrive day by day over HISTORY_DAYS up to `today`, fewer at
+#     weekends; most are returned within the loan period, some late, a few
+#     never.  Loans still out today are open, never more than a title has
+#     copies, and books.quantity is what remains on the shelf.
+#
+# The core tables are bulk-loaded first; ensure_schema() then builds the
+# search index, report summaries, card numbers, copies etc. set-based, as
+# for an upgraded database, and overdue fines are accrued as of `today`.
+#
+#   python -m library.datagen --scale 1m --db big.db [--seed 1] [--today 2025-06-30]
+import argparse
+import itertools
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from library import db
+from library.fines import DEFAULT_DAILY_FINE, DEFAULT_LOAN_DAYS, accrue_fines
+from library.migrations import create_core_tables, ensure_schema
+
+# Named scales: transactions -> (books, users, transactions)
+SCALES = {
+    "10k": (2_000, 500, 10_000),
+    "100k": (20_000, 5_000, 100_000),
+    "1m": (100_000, 20_000, 1_000_000),
+    "10m": (1_000_000, 100_000, 10_000_000),
+}
+
+# Days of loan history, and loans per weekday relative to Monday-Friday
+HISTORY_DAYS = 3 * 365
+WEEKDAY_WEIGHTS = (1.0, 1.0, 1.0, 1.0, 1.0, 0.6, 0.3)
+
+# Zipf exponents of book popularity and user activity
+BOOK_SKEW = 1.0
+USER_SKEW = 0.8
+
+# Share of staff among users, and of loans never returned
+STAFF_SHARE = 0.1
+LOST_SHARE = 0.005
+
+# Loan length in days: log-normal around a median of LOAN_MEDIAN_DAYS
+LOAN_MEDIAN_DAYS = 9
+LOAN_SPREAD = 0.6
+
+SYLLABLES = ["ka", "ri", "mo", "an", "tel", "vor", "shi", "lu", "den", "pra", "gor", "ne", "sa", "thu", "bel", "im",
+             "or", "ve", "da", "quin", "ha", "sol", "mer", "ti"]
+
+
+def _word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+
+
+# Cumulative Zipf weights of ranks 1..n, for rng.choices(cum_weights=...)
+def zipf_weights(n, skew):
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, n + 1)))
+
+
+# A valid ISBN-13 for a book number
+def isbn13(number):
+    digits = f"978{number % 10 ** 9:09d}"
+    check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10) % 10
+    return f"{digits}{check}"
+
+
+def book_rows(rng, books, popularity_rank):
+    vocabulary = sorted({_word(rng) for _ in range(5000)})
+    authors = [f"{_word(rng).capitalize()} {_word(rng).capitalize()}" for _ in range(max(1, books // 8))]
+    author_weights = zipf_weights(len(authors), 1.0)
+    for book_id in range(1, books + 1):
+        title = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 5))).capitalize()
+        author = rng.choices(authors, cum_weights=author_weights)[0]
+        shelf = f"{author[0]}-{rng.randint(1, 200):03d}"
+        yield title, author, isbn13(book_id), shelf, copies(popularity_rank[book_id], books)
+
+
+# Copies of a title by popularity rank: up to 10 for the most borrowed
+def copies(rank, books):
+    return max(1, min(10, round(10 * (books / 100 / rank) ** 0.5)))
+
+
+def user_rows(rng, users):
+    first = sorted({_word(rng).capitalize() for _ in range(400)})
+    last = sorted({_word(rng).capitalize() for _ in range(2000)})
+    for _ in range(users):
+        yield f"{rng.choice(first)} {rng.choice(last)}", "staff" if rng.random() < STAFF_SHARE else "student"
+
+
+# Loans per day over the history: the total split by weekday weights,
+# rounding the running total so the counts add up exactly
+def daily_counts(transactions, start, days):
+    weights = [WEEKDAY_WEIGHTS[(start + timedelta(days=day)).weekday()] for day in range(days)]
+    per_weight = transactions / sum(weights)
+    running = done = 0
+    for day, weight in enumerate(weights):
+        running += weight * per_weight
+        count = round(running) - done
+        done += count
+        yield day, count
+
+
+# (book_id, user_id, borrow_date, return_date, overdue_days, fine_amount)
+# in borrow order; returned loans carry the fine the default policy charged
+def transaction_rows(rng, books, users, transactions, today, book_by_rank, user_by_rank, stock):
+    start = today - timedelta(days=HISTORY_DAYS - 1)
+    book_weights = zipf_weights(books, BOOK_SKEW)
+    user_weights = zipf_weights(users, USER_SKEW)
+    out = {}
+    mu = math.log(LOAN_MEDIAN_DAYS)
+    for day, count in daily_counts(transactions, start, HISTORY_DAYS):
+        borrowed = start + timedelta(days=day)
+        book_ranks = rng.choices(range(books), cum_weights=book_weights, k=count)
+        user_ranks = rng.choices(range(users), cum_weights=user_weights, k=count)
+        for book_rank, user_rank in zip(book_ranks, user_ranks):
+            book_id = book_by_rank[book_rank]
+            length = 10 ** 6 if rng.random() < LOST_SHARE else max(1, round(rng.lognormvariate(mu, LOAN_SPREAD)))
+            returned = borrowed + timedelta(days=min(length, (today - borrowed).days + 1))
+            if returned > today:
+                # Still out, unless every copy already is: then back today
+                if out.get(book_id, 0) < stock[book_id]:
+                    out[book_id] = out.get(book_id, 0) + 1
+                    returned = None
+                else:
+                    returned = today
+            if returned is None:
+                yield book_id, user_by_rank[user_rank], borrowed.isoformat(), None, 0, 0.0
+            else:
+                overdue_days = max(0, (returned - borrowed).days - DEFAULT_LOAN_DAYS)
+                yield (book_id, user_by_rank[user_rank], borrowed.isoformat(), returned.isoformat(),
+                       overdue_days, overdue_days * DEFAULT_DAILY_FINE)
+
+
+# Create a new library database at `path`; returns the counts generated
+def generate(path, books, users, transactions, seed=1, today=None):
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+    today = today or date.today()
+    rng = random.Random(seed)
+    # Popularity ranks are shuffled over ids, so popular titles are spread
+    # across the catalogue
+    book_by_rank = list(range(1, books + 1))
+    rng.shuffle(book_by_rank)
+    popularity_rank = {book_id: rank for rank, book_id in enumerate(book_by_rank, start=1)}
+    user_by_rank = list(range(1, users + 1))
+    rng.shuffle(user_by_rank)
+
+    conn = sqlite3.connect(path)
+    # Bulk load: nothing to recover if it fails, the file is thrown away
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    create_core_tables(conn)
+    conn.executemany("INSERT INTO books (title, author, isbn, shelf_location, quantity) VALUES (?, ?, ?, ?, ?)",
+                     book_rows(rng, books, popularity_rank))
+    conn.executemany("INSERT INTO users (name, user_type) VALUES (?, ?)", user_rows(rng, users))
+    stock = {book_id: copies(rank, books) for book_id, rank in popularity_rank.items()}
+    conn.executemany("""
+        INSERT INTO transactions (book_id, user_id, borrow_date, return_date, overdue_days, fine_amount)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, transaction_rows(rng, books, users, transactions, today, book_by_rank, user_by_rank, stock))
+    # Copies on the shelf: the title's copies less its open loans
+    conn.execute("""
+        UPDATE books SET quantity = quantity - open.loans
+        FROM (SELECT book_id, COUNT(*) AS loans FROM transactions WHERE return_date IS NULL GROUP BY book_id) AS open
+        WHERE books.id = open.book_id
+    """)
+    conn.commit()
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("books", "users", "transactions")}
+    conn.close()
+    ensure_schema(path)
+    # Nothing else writes yet, so the first accrual can run in large chunks
+    with db.connection(path) as conn:
+        accrue_fines(conn, today.isoformat(), chunk=1_000_000)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic library database")
+    parser.add_argument("--db", required=True, help="new database file to create")
+    parser.add_argument("--scale", choices=SCALES, default="100k", help="transactions (sets books and users too)")
+    parser.add_argument("--books", type=int)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--transactions", type=int)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--today", type=date.fromisoformat, help="last day of the history (default: today)")
+    args = parser.parse_args()
+    books, users, transactions = SCALES[args.scale]
+
+    start = time.perf_counter()
+    try:
+        counts = generate(args.db, args.books or books, args.users or users, args.transactions or transactions,
+                          seed=args.seed, today=args.today)
+    except FileExistsError as error:
+        parser.error(str(error))
+    print(", ".join(f"{count} {table}" for table, count in counts.items())
+          + f" in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from library import metrics
+
+# Database file shared by every page (override with LIBRARY_DB for benchmarks)
+DB_PATH = os.environ.get("LIBRARY_DB", "library.db")
+
+# Number of connections kept open per database file
+POOL_SIZE = 8
+
+# Seconds to wait for a pooled connection once all are in use before
+# opening an extra one, closed again when it is released, so a burst of
+# sessions (or a leaked connection) slows pages down instead of hanging them
+POOL_TIMEOUT = 2.0
+
+# Prepared statements kept per connection (sqlite3 default is 128)
+STATEMENT_CACHE_SIZE = 512
+
+# Pragmas applied once to every new connection
+PRAGMAS = [
+    # Only takes effect on a new, empty database (before WAL is enabled);
+    # the vacuum job in library.jobs then returns free pages to the OS
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",  # 64 MiB page cache
+    "PRAGMA mmap_size = 268435456",  # 256 MiB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+# Retries for write transactions that still find the database locked once
+# busy_timeout has expired; the delay doubles on each attempt
+LOCK_RETRIES = 6
+LOCK_BACKOFF = 0.02
+
+
+# Open a new tuned connection, timing its statements unless metrics are
+# disabled (library.metrics)
+def open_connection(path=None):
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        timeout=5.0,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=metrics.TimedConnection if metrics.ENABLED else sqlite3.Connection,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# Pool of long-lived connections, shared by all sessions of the process
+class ConnectionPool:
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._overflow = set()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return open_connection(self.path)
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            conn = open_connection(self.path)
+            with self._lock:
+                self._overflow.add(id(conn))
+            return conn
+
+    def release(self, conn):
+        with self._lock:
+            overflow = id(conn) in self._overflow
+            self._overflow.discard(id(conn))
+        if overflow:
+            conn.close()
+            return
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._created -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# Process-wide pool for a database file; Streamlit reruns reuse it because
+# imported modules survive between script executions
+def get_pool(path=None):
+    path = os.path.abspath(path or DB_PATH)
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+# Borrow a pooled connection for the duration of a with-block
+@contextmanager
+def connection(path=None):
+    with get_pool(path).connection() as conn:
+        yield conn
+
+
+# Close every pooled connection (used by benchmarks between runs)
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+# True for the "database is locked" / "database is busy" family of errors
+def is_lock_error(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+# Run fn(conn) inside BEGIN IMMEDIATE and commit, retrying with jittered
+# exponential backoff while another writer holds the lock
+def run_in_transaction(conn, fn, retries=LOCK_RETRIES, backoff=LOCK_BACKOFF):
+    for attempt in range(retries + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = fn(conn)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as error:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_lock_error(error) or attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
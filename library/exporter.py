@@ -0,0 +1,122 @@
+# Streaming exports of books, users, transactions (open and recent loans)
+# and transaction_history (every loan, archived ones too).  Rows are read
+# with fetchmany() and written batch by batch, so memory use does not grow
+# with the size of the table.
+#
+#   python -m library.exporter transactions --format csv --output transactions.csv
+import argparse
+import csv
+import io
+import json
+import sys
+import tempfile
+
+from library.db import connection
+from library.snapshot import snapshot_connection
+
+EXPORT_TABLES = ("books", "users", "transactions", "transaction_history")
+FORMATS = ("csv", "jsonl", "parquet")
+FETCH_SIZE = 5000
+
+
+# Exported columns of a table; BLOB columns (old inline covers) are left out
+def export_columns(conn, table):
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Cannot export {table}")
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})") if row[2].upper() != "BLOB"]
+
+
+# Rows of a table, fetchmany() batches at a time
+def iter_batches(conn, table, columns, size=FETCH_SIZE):
+    cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table}")
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+# CSV text, one chunk per batch, starting with the header row
+def iter_csv(conn, table):
+    columns = export_columns(conn, table)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in iter_batches(conn, table, columns):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# JSON Lines text, one chunk per batch
+def iter_jsonl(conn, table):
+    columns = export_columns(conn, table)
+    for rows in iter_batches(conn, table, columns):
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+
+
+# Parquet file written one row group per batch (needs pyarrow)
+def write_parquet(conn, table, binary_file):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs the pyarrow package") from None
+
+    # Column types come from the declared SQLite types, so a batch of NULLs
+    # cannot change the schema half-way through the file
+    types = {"INTEGER": pa.int64(), "REAL": pa.float64()}
+    declared = {row[1]: row[2].upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+    columns = export_columns(conn, table)
+    schema = pa.schema([(column, types.get(declared[column], pa.string())) for column in columns])
+
+    with pq.ParquetWriter(binary_file, schema) as writer:
+        for rows in iter_batches(conn, table, columns):
+            writer.write_table(pa.Table.from_pylist([dict(zip(columns, row)) for row in rows], schema=schema))
+
+
+# Write an export to an open binary file
+def write_export(conn, table, file_format, binary_file):
+    if file_format == "parquet":
+        write_parquet(conn, table, binary_file)
+        return
+    chunks = iter_csv(conn, table) if file_format == "csv" else iter_jsonl(conn, table)
+    for chunk in chunks:
+        binary_file.write(chunk.encode())
+
+
+# Export through a temporary file and return its contents, for
+# st.download_button, which reads whatever it is given into bytes anyway.
+# The rows stream to disk, so the bytes returned are the only full copy in
+# memory.  With snapshot=True the rows come from the read-only snapshot
+# (library.snapshot) rather than the database.
+def export_bytes(table, file_format, db_path=None, snapshot=False):
+    with tempfile.TemporaryFile() as spool:
+        with (snapshot_connection if snapshot else connection)(db_path) as conn:
+            write_export(conn, table, file_format, spool)
+        spool.seek(0)
+        return spool.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export library tables")
+    parser.add_argument("table", choices=EXPORT_TABLES)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--output", help="file to write (default: standard output; required for parquet)")
+    args = parser.parse_args()
+
+    if args.output is None and args.format == "parquet":
+        parser.error("--output is required for parquet")
+    with connection() as conn:
+        if args.output is None:
+            write_export(conn, args.table, args.format, sys.stdout.buffer)
+        else:
+            with open(args.output, "wb") as binary_file:
+                write_export(conn, args.table, args.format, binary_file)
+
+
+if __name__ == "__main__":
+    main()
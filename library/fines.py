@@ -0,0 +1,211 @@
+# Overdue and fine accrual.
+#
+# Fines are materialised in overdue_loans so the Reports page is a plain
+# indexed read.  accrue_fines() keeps the table current incrementally:
+#   - loans inserted, returned or edited since the last run are queued in
+#     fine_queue by triggers and recomputed;
+#   - on the first run of a new day every open loan that is past due is
+#     recomputed in one set-based statement (found through an index on
+#     open loans' borrow dates);
+#   - the first run, and the first after a policy change, recomputes every
+#     loan not yet archived (library.archive) a range of FULL_ACCRUAL_CHUNK
+#     transactions at a time, so borrows and returns are never locked out
+#     for long.
+# Loan periods and fine rates per user type come from loan_policies.
+import time
+from datetime import date
+
+from library.cache import bump, cached
+from library.db import run_in_transaction
+
+# Used for user types without a row in loan_policies
+DEFAULT_LOAN_DAYS = 14
+DEFAULT_DAILY_FINE = 1.0
+
+# Transactions recomputed per write transaction on a full recompute, and
+# seconds to pause between them so waiting writers get the lock
+FULL_ACCRUAL_CHUNK = 2000
+FULL_ACCRUAL_PAUSE = 0.02
+
+DEFAULT_POLICIES = [
+    # user_type, loan_days, daily_fine, max_fine (NULL = uncapped)
+    ("student", 14, 1.0, None),
+    ("staff", 14, 1.0, None),
+]
+
+FINES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS loan_policies (
+        user_type TEXT PRIMARY KEY,
+        loan_days INTEGER NOT NULL,
+        daily_fine REAL NOT NULL,
+        max_fine REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS overdue_loans (
+        transaction_id INTEGER PRIMARY KEY,
+        book_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        borrow_date TEXT NOT NULL,
+        due_date TEXT NOT NULL,
+        return_date TEXT,
+        overdue_days INTEGER NOT NULL,
+        fine_amount REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_overdue_loans_days ON overdue_loans(overdue_days)",
+    # The overdue report reads overdue_loans now, so transactions' index of
+    # loans with a fine only cost writes
+    "DROP INDEX IF EXISTS idx_transactions_overdue",
+    # Open loans by borrow date, to find the ones past due without a scan
+    """
+    CREATE INDEX IF NOT EXISTS idx_transactions_open_borrow_date
+    ON transactions(borrow_date) WHERE return_date IS NULL
+    """,
+    "CREATE TABLE IF NOT EXISTS fine_queue (transaction_id INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS fine_runs (id INTEGER PRIMARY KEY CHECK (id = 1), last_run_date TEXT)",
+    """
+    CREATE TRIGGER IF NOT EXISTS fine_queue_insert AFTER INSERT ON transactions BEGIN
+        INSERT OR IGNORE INTO fine_queue (transaction_id) VALUES (new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fine_queue_update AFTER UPDATE OF borrow_date, return_date ON transactions BEGIN
+        INSERT OR IGNORE INTO fine_queue (transaction_id) VALUES (new.id);
+    END
+    """,
+    # Archived loans (library.archive) keep their fines
+    """
+    CREATE TRIGGER IF NOT EXISTS fine_queue_delete AFTER DELETE ON transactions
+    WHEN NOT EXISTS (SELECT 1 FROM archive_moves WHERE id = old.id) BEGIN
+        DELETE FROM overdue_loans WHERE transaction_id = old.id;
+    END
+    """,
+]
+
+# Overdue days and fine of each loan in `t`, as of :today for open loans
+LOAN_FINES = f"""
+    SELECT t.id AS transaction_id, t.book_id, t.user_id, t.borrow_date,
+           date(t.borrow_date, '+' || loan_days || ' days') AS due_date,
+           t.return_date, overdue_days,
+           MIN(overdue_days * daily_fine, COALESCE(max_fine, overdue_days * daily_fine)) AS fine_amount
+    FROM (
+        SELECT t.id, t.book_id, t.user_id, t.borrow_date, t.return_date,
+               COALESCE(loan_policies.loan_days, {DEFAULT_LOAN_DAYS}) AS loan_days,
+               COALESCE(loan_policies.daily_fine, {DEFAULT_DAILY_FINE}) AS daily_fine,
+               loan_policies.max_fine,
+               CAST(julianday(COALESCE(t.return_date, :today)) - julianday(t.borrow_date) AS INTEGER)
+                   - COALESCE(loan_policies.loan_days, {DEFAULT_LOAN_DAYS}) AS overdue_days
+        FROM transactions t
+        LEFT JOIN users u ON u.id = t.user_id
+        LEFT JOIN loan_policies ON loan_policies.user_type = u.user_type
+        WHERE {{where}}
+    ) t
+"""
+
+# Upsert rather than REPLACE so update triggers on overdue_loans (library.reports) fire
+MATERIALIZE = f"""
+    INSERT INTO overdue_loans
+        (transaction_id, book_id, user_id, borrow_date, due_date, return_date, overdue_days, fine_amount)
+    SELECT * FROM ({LOAN_FINES}) WHERE overdue_days > 0
+    ON CONFLICT (transaction_id) DO UPDATE SET
+        book_id = excluded.book_id, user_id = excluded.user_id, borrow_date = excluded.borrow_date,
+        due_date = excluded.due_date, return_date = excluded.return_date,
+        overdue_days = excluded.overdue_days, fine_amount = excluded.fine_amount
+"""
+
+# Open loans past due since the last accrual (also checked by benchmarks.query_plans)
+NEW_DAY_WHERE = """
+    t.return_date IS NULL
+    AND t.borrow_date < date(:today, '-' || (SELECT COALESCE(MIN(loan_days), 0) FROM loan_policies) || ' days')
+"""
+
+
+# Create the fine tables and triggers, with the default loan policies
+def create_fine_tables(conn):
+    for statement in FINES_SCHEMA:
+        conn.execute(statement)
+    conn.executemany("INSERT OR IGNORE INTO loan_policies VALUES (?, ?, ?, ?)", DEFAULT_POLICIES)
+    conn.commit()
+
+
+# Change the loan period and fine schedule of a user type
+def set_policy(conn, user_type, loan_days, daily_fine, max_fine=None):
+    conn.execute("INSERT OR REPLACE INTO loan_policies VALUES (?, ?, ?, ?)",
+                 (user_type, loan_days, daily_fine, max_fine))
+    # Every loan of that type may now have a different fine
+    conn.execute("UPDATE fine_runs SET last_run_date = NULL")
+    conn.commit()
+
+
+# Overdue days and fine of one loan if it were returned on `today`
+def loan_fine(conn, transaction_id, today=None):
+    row = conn.execute(
+        f"SELECT overdue_days, fine_amount FROM ({LOAN_FINES.format(where='t.id = :id')})",
+        {"id": transaction_id, "today": today or date.today().isoformat()}).fetchone()
+    overdue_days, fine_amount = row
+    return max(0, overdue_days), max(0, fine_amount)
+
+
+# Bring overdue_loans up to date; returns the number of loans recomputed
+def accrue_fines(conn, today=None, chunk=FULL_ACCRUAL_CHUNK):
+    today = today or date.today().isoformat()
+    params = {"today": today}
+    last_run = conn.execute("SELECT last_run_date FROM fine_runs WHERE id = 1").fetchone()
+    last_run_date = last_run[0] if last_run else None
+
+    changed = 0
+    if last_run_date is None:
+        # First run (or policies changed): recompute every loan in
+        # transactions, one id range per transaction; loans changed meanwhile
+        # are queued.  Archived loans keep the fines they were charged.
+        first_id, last_id = conn.execute("SELECT COALESCE(MIN(id), 1), COALESCE(MAX(id), 0) FROM transactions").fetchone()
+        for low in range(first_id - 1, last_id, chunk):
+            bounds = dict(params, low=low, high=low + chunk)
+
+            def recompute(conn, bounds=bounds):
+                conn.execute("""
+                    DELETE FROM overdue_loans WHERE transaction_id IN (
+                        SELECT id FROM transactions WHERE id > :low AND id <= :high)
+                """, bounds)
+                return conn.execute(MATERIALIZE.format(where="t.id > :low AND t.id <= :high"), bounds).rowcount
+
+            changed += run_in_transaction(conn, recompute)
+            time.sleep(FULL_ACCRUAL_PAUSE)
+
+    def accrue(conn):
+        # Loans whose state changed since the last run
+        conn.execute("DELETE FROM overdue_loans WHERE transaction_id IN (SELECT transaction_id FROM fine_queue)")
+        conn.execute(MATERIALIZE.format(where="t.id IN (SELECT transaction_id FROM fine_queue)"), params)
+        queued = conn.execute("DELETE FROM fine_queue").rowcount
+
+        if last_run_date is not None and last_run_date != today:
+            # A new day: every open loan past its shortest possible due date
+            queued += conn.execute(MATERIALIZE.format(where=NEW_DAY_WHERE), params).rowcount
+
+        conn.execute("INSERT OR REPLACE INTO fine_runs (id, last_run_date) VALUES (1, ?)", (today,))
+        return queued
+
+    changed += run_in_transaction(conn, accrue)
+    if changed or last_run_date != today:
+        bump("overdue_loans")
+    return changed
+
+
+# The overdue report: an indexed read of overdue_loans, worst first
+OVERDUE_REPORT = """
+    SELECT b.title, u.name, o.borrow_date, o.due_date, o.return_date, o.overdue_days, o.fine_amount
+    FROM overdue_loans o
+    JOIN books b ON b.id = o.book_id
+    JOIN users u ON u.id = o.user_id
+    WHERE o.overdue_days > 0
+    ORDER BY o.overdue_days DESC
+    LIMIT ?
+"""
+
+
+# Rows of the overdue report, at most `limit` of them
+@cached("overdue_loans", "books", "users")
+def overdue_report(conn, limit=100):
+    return conn.execute(OVERDUE_REPORT, (limit,)).fetchall()
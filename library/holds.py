@@ -0,0 +1,255 @@
+# Holds: patrons queue for a title none of whose copies is on the shelf.
+#
+# A title's queue is its 'waiting' holds ordered by (priority, id), staff
+# before students and first come first served within each, read through a
+# partial index on (book_id, priority, id); placing a hold or finding the
+# head is an index seek however long the queue.  Triggers keep the number
+# waiting per title and priority in hold_queues, and number each title and
+# priority's holds 1, 2, 3... in the order placed (holds.ticket), so a
+# hold's position is arithmetic rather than a count.  A returned copy goes
+# to the head of the queue in the return's own transaction: the hold turns
+# 'ready' and the copy (library.copies) is 'held' for that patron instead
+# of going back on the shelf.  Their next borrow of the title takes it.
+# Ready holds not picked up within HOLD_PICKUP_DAYS expire (the holds
+# job), and the copy moves on to the next in the queue.
+from datetime import date, timedelta
+
+from library.cache import bump, cached
+from library.db import run_in_transaction
+
+# Queue priority per user type, lowest first
+HOLD_PRIORITY = {"staff": 0, "student": 1}
+DEFAULT_PRIORITY = 1
+
+HOLD_PICKUP_DAYS = 7
+
+HOLDS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS holds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        priority INTEGER NOT NULL,
+        placed_date TEXT NOT NULL,
+        status TEXT NOT NULL CHECK(status IN ('waiting', 'ready', 'fulfilled', 'cancelled', 'expired')),
+        ready_date TEXT,
+        transaction_id INTEGER,
+        ticket INTEGER,
+        FOREIGN KEY(book_id) REFERENCES books(id),
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """,
+    # The queues: head of a title's queue, and a hold's position, by seek
+    """
+    CREATE INDEX IF NOT EXISTS idx_holds_queue ON holds(book_id, priority, id)
+    WHERE status = 'waiting'
+    """,
+    # One active hold per patron and title; also finds a patron's ready copy
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_active ON holds(book_id, user_id)
+    WHERE status IN ('waiting', 'ready')
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_holds_ready ON holds(ready_date) WHERE status = 'ready'",
+    """
+    CREATE TABLE IF NOT EXISTS hold_queues (
+        book_id INTEGER NOT NULL,
+        priority INTEGER NOT NULL,
+        waiting INTEGER NOT NULL,
+        issued INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (book_id, priority)
+    ) WITHOUT ROWID
+    """,
+]
+
+# Triggers keeping hold_queues.waiting equal to the waiting holds of each
+# title and priority, and giving each new hold the next ticket of its title
+# and priority (hold_queues.issued).  Tickets follow ids, so within a
+# priority the queue is in ticket order; holds that left it from the middle
+# (cancelled, or served while an earlier hold was back to waiting) are
+# found through idx_holds_left.
+HOLD_QUEUE_SCHEMA = [
+    """
+    CREATE INDEX IF NOT EXISTS idx_holds_left ON holds(book_id, priority, ticket)
+    WHERE status != 'waiting'
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hold_queues_insert AFTER INSERT ON holds
+    WHEN new.status = 'waiting' BEGIN
+        INSERT INTO hold_queues (book_id, priority, waiting, issued) VALUES (new.book_id, new.priority, 1, 1)
+        ON CONFLICT (book_id, priority) DO UPDATE SET waiting = waiting + 1, issued = issued + 1;
+        UPDATE holds SET ticket = (SELECT issued FROM hold_queues WHERE book_id = new.book_id AND priority = new.priority)
+        WHERE id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hold_queues_update AFTER UPDATE OF book_id, priority, status ON holds
+    WHEN old.status = 'waiting' OR new.status = 'waiting' BEGIN
+        UPDATE hold_queues SET waiting = waiting - 1
+        WHERE old.status = 'waiting' AND book_id = old.book_id AND priority = old.priority;
+        INSERT INTO hold_queues (book_id, priority, waiting) SELECT new.book_id, new.priority, 1
+        WHERE new.status = 'waiting'
+        ON CONFLICT (book_id, priority) DO UPDATE SET waiting = waiting + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hold_queues_delete AFTER DELETE ON holds
+    WHEN old.status = 'waiting' BEGIN
+        UPDATE hold_queues SET waiting = waiting - 1 WHERE book_id = old.book_id AND priority = old.priority;
+    END
+    """,
+]
+
+
+# Raised when a hold cannot be placed or cancelled
+class HoldError(Exception):
+    pass
+
+
+# Create the hold tables.  Tickets and hold_queues are filled in from the
+# holds in the transaction that adds the triggers, once: the first time,
+# or on a database from before tickets (whose older triggers are replaced).
+def create_hold_tables(conn):
+    for statement in HOLDS_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+    def count_queues(conn):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_holds_left'").fetchone():
+            return
+        if "ticket" not in {row[1] for row in conn.execute("PRAGMA table_info(holds)")}:
+            conn.execute("ALTER TABLE holds ADD COLUMN ticket INTEGER")
+        if "issued" not in {row[1] for row in conn.execute("PRAGMA table_info(hold_queues)")}:
+            conn.execute("ALTER TABLE hold_queues ADD COLUMN issued INTEGER NOT NULL DEFAULT 0")
+        for action in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS hold_queues_{action}")
+        conn.execute("""
+            UPDATE holds SET ticket = numbered.ticket
+            FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY book_id, priority ORDER BY id) AS ticket FROM holds)
+                AS numbered
+            WHERE holds.id = numbered.id
+        """)
+        conn.execute("DELETE FROM hold_queues")
+        conn.execute("""
+            INSERT INTO hold_queues (book_id, priority, waiting, issued)
+            SELECT book_id, priority, SUM(status = 'waiting'), MAX(ticket) FROM holds GROUP BY book_id, priority
+        """)
+        for statement in HOLD_QUEUE_SCHEMA:
+            conn.execute(statement)
+
+    run_in_transaction(conn, count_queues)
+
+
+# The patron's active hold on a title: (id, status, copy id) or None
+def active_hold(conn, book_id, user_id):
+    return conn.execute("""
+        SELECT id, status, copy_id FROM holds
+        WHERE book_id = ? AND user_id = ? AND status IN ('waiting', 'ready')
+    """, (book_id, user_id)).fetchone()
+
+
+# Put a returned copy, or one no longer kept for a hold, back into
+# circulation inside the caller's transaction: to the head of its title's
+# queue, or on the shelf.  Returns the id of the hold now ready, or None.
+def release_copy(conn, copy_id, book_id):
+    head = conn.execute("""
+        SELECT id FROM holds WHERE book_id = ? AND status = 'waiting'
+        ORDER BY priority, id LIMIT 1
+    """, (book_id,)).fetchone()
+    if head is None:
+        conn.execute("UPDATE copies SET status = 'available' WHERE id = ?", (copy_id,))
+        return None
+    conn.execute("UPDATE holds SET status = 'ready', ready_date = DATE('now'), copy_id = ? WHERE id = ?",
+                 (copy_id, head[0]))
+    conn.execute("UPDATE copies SET status = 'held' WHERE id = ?", (copy_id,))
+    return head[0]
+
+
+# Queue for a title; returns the hold id.  Only titles with no copy on the
+# shelf can be held.
+def place_hold(conn, book_id, user_id):
+    def place(conn):
+        book = conn.execute("SELECT quantity FROM books WHERE id = ?", (book_id,)).fetchone()
+        user = conn.execute("SELECT user_type FROM users WHERE id = ?", (user_id,)).fetchone()
+        if book is None:
+            raise HoldError("Book not found.")
+        if user is None:
+            raise HoldError("User not found.")
+        if book[0] > 0:
+            raise HoldError("A copy is on the shelf; borrow it instead.")
+        if active_hold(conn, book_id, user_id):
+            raise HoldError("This patron already holds this book.")
+        return conn.execute("""
+            INSERT INTO holds (book_id, user_id, priority, placed_date, status)
+            VALUES (?, ?, ?, DATE('now'), 'waiting')
+        """, (book_id, user_id, HOLD_PRIORITY.get(user[0], DEFAULT_PRIORITY))).lastrowid
+
+    hold_id = run_in_transaction(conn, place)
+    bump("holds")
+    return hold_id
+
+
+# Cancel a waiting or ready hold; a copy kept for it is passed on
+def cancel_hold(conn, hold_id):
+    def cancel(conn):
+        hold = conn.execute("SELECT book_id, status, copy_id FROM holds WHERE id = ?", (hold_id,)).fetchone()
+        if hold is None or hold[1] not in ("waiting", "ready"):
+            raise HoldError("No active hold with that ID.")
+        conn.execute("UPDATE holds SET status = 'cancelled' WHERE id = ?", (hold_id,))
+        if hold[1] == "ready":
+            release_copy(conn, hold[2], hold[0])
+
+    run_in_transaction(conn, cancel)
+    bump("holds", "books", "copies")
+
+
+# Expire ready holds not picked up in time, passing their copies on;
+# returns how many expired
+def expire_holds(conn, today=None):
+    cutoff = ((today or date.today()) - timedelta(days=HOLD_PICKUP_DAYS)).isoformat()
+
+    def expire(conn):
+        expired = conn.execute("""
+            SELECT id, book_id, copy_id FROM holds WHERE status = 'ready' AND ready_date <= ?
+        """, (cutoff,)).fetchall()
+        for hold_id, book_id, copy_id in expired:
+            conn.execute("UPDATE holds SET status = 'expired' WHERE id = ?", (hold_id,))
+            release_copy(conn, copy_id, book_id)
+        return len(expired)
+
+    count = run_in_transaction(conn, expire)
+    if count:
+        bump("holds", "books", "copies")
+    return count
+
+
+# Position of a waiting hold in its title's queue (1 = next), or None: the
+# holds waiting at higher priorities (hold_queues), plus the tickets from
+# the head of its own priority to its own, less those of holds that have
+# left from between them.  Index seeks whatever the queue's length; only
+# the holds cancelled ahead of it (and still behind the head) are counted.
+def queue_position(conn, hold_id):
+    row = conn.execute("""
+        SELECT COALESCE((SELECT SUM(waiting) FROM hold_queues q
+                         WHERE q.book_id = h.book_id AND q.priority < h.priority), 0)
+             + h.ticket - head.ticket + 1
+             - (SELECT COUNT(*) FROM holds g
+                WHERE g.book_id = h.book_id AND g.priority = h.priority AND g.status != 'waiting'
+                  AND g.ticket > head.ticket AND g.ticket < h.ticket)
+        FROM holds h JOIN holds head ON head.id = (
+            SELECT id FROM holds WHERE book_id = h.book_id AND priority = h.priority AND status = 'waiting'
+            ORDER BY id LIMIT 1)
+        WHERE h.id = ? AND h.status = 'waiting'
+    """, (hold_id,)).fetchone()
+    return row[0] if row else None
+
+
+# Active holds on a title, ready ones first, then the queue in order:
+# (hold id, user id, name, card number, status, placed date, ready date)
+@cached("holds", "users")
+def title_holds(conn, book_id, limit=100):
+    return conn.execute("""
+        SELECT h.id, h.user_id, u.name, u.card_number, h.status, h.placed_date, h.ready_date
+        FROM holds h LEFT JOIN users u ON u.id = h.user_id
+        WHERE h.book_id = ? AND h.status IN ('waiting', 'ready')
+        ORDER BY h.status = 'waiting', h.priority, h.id LIMIT ?
+    """, (book_id, limit)).fetchall()
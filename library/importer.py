@@ -0,0 +1,230 @@
+# Streaming bulk import of books from CSV, JSONL or MARC-lite files.
+#
+# Records are parsed lazily, de-duplicated by ISBN (within the file and
+# against the catalogue) and inserted with executemany, one transaction per
+# batch.  Each batch also records how far into the file the import got, so
+# an interrupted import resumes where it stopped.
+#
+#   python -m library.importer books.csv [--format csv] [--batch-size 20000] [--defer-indexes]
+#
+# CSV files need a header row and JSONL files one object per line, both
+# with the fields title, author, isbn, shelf_location and quantity.
+# MARC-lite records are "TAG value" lines separated by blank lines:
+#   020 isbn, 100 author, 245 title, 852 shelf location, 949 quantity
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+
+from library.cache import bump
+from library.catalogue import normalize_isbn
+from library.copies import stock_books
+from library.db import connection, run_in_transaction
+from library.migrations import ensure_schema
+from library.schema import create_indexes, index_names
+from library.search import SEARCH_OBJECTS, create_search_index
+
+FORMATS = ("csv", "jsonl", "marc")
+BATCH_SIZE = 20_000
+
+MARC_FIELDS = {"020": "isbn", "100": "author", "245": "title", "852": "shelf_location", "949": "quantity"}
+
+IMPORT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS import_progress (
+        source TEXT PRIMARY KEY,
+        records INTEGER NOT NULL DEFAULT 0,
+        inserted INTEGER NOT NULL DEFAULT 0,
+        duplicates INTEGER NOT NULL DEFAULT 0,
+        rejected INTEGER NOT NULL DEFAULT 0,
+        finished INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+
+def read_csv(text_file):
+    yield from csv.DictReader(text_file)
+
+
+def read_jsonl(text_file):
+    for line in text_file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_marc(text_file):
+    record = {}
+    for line in text_file:
+        line = line.strip()
+        if not line:
+            if record:
+                yield record
+            record = {}
+            continue
+        tag, _, value = line.partition(" ")
+        if tag in MARC_FIELDS:
+            record[MARC_FIELDS[tag]] = value.strip()
+    if record:
+        yield record
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "marc": read_marc}
+
+
+# Format from the file extension
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    return {"txt": "marc", "mrk": "marc", "json": "jsonl", "ndjson": "jsonl"}.get(extension, extension)
+
+
+# Book row from a parsed record, or None if the record is unusable
+def to_row(record):
+    title = str(record.get("title") or "").strip()
+    author = str(record.get("author") or "").strip()
+    if not title or not author:
+        return None
+    try:
+        quantity = max(1, int(record.get("quantity") or 1))
+    except (TypeError, ValueError):
+        return None
+    shelf_location = str(record.get("shelf_location") or "").strip() or None
+    return title, author, normalize_isbn(record.get("isbn")) or None, shelf_location, quantity
+
+
+# Stable identity of an import file: its size plus a hash of the first MiB,
+# so re-uploading the same file resumes instead of starting over
+def fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        digest.update(source.read(1 << 20))
+    return f"{os.path.getsize(path)}:{digest.hexdigest()}"
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Drop the books indexes and the triggers keeping the full-text index in
+# sync before a large load.  books_fts itself stays, so Search Book keeps
+# working (without the books being loaded) until restore_deferred_indexes()
+# rebuilds it.
+def drop_deferred_indexes(conn):
+    for name in index_names("books"):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    for trigger in SEARCH_OBJECTS[1:]:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.commit()
+
+
+# Recreate what drop_deferred_indexes() dropped and rebuild the full-text
+# index.  An import killed before it gets here leaves them dropped until
+# the next ensure_schema() (library.migrations) recreates them.
+def restore_deferred_indexes(conn):
+    if conn.in_transaction:
+        conn.rollback()
+    create_indexes(conn)
+    create_search_index(conn)
+
+
+# Import a file; `progress` is called after every batch with the counters.
+# Returns the final counters.
+def import_books(path, file_format=None, batch_size=BATCH_SIZE, defer_indexes=False, progress=None, db_path=None):
+    file_format = file_format or guess_format(path)
+    if file_format not in READERS:
+        raise ValueError(f"Unsupported import format: {file_format}")
+    source = fingerprint(path)
+
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        conn.execute(IMPORT_SCHEMA)
+        conn.execute("INSERT OR IGNORE INTO import_progress (source) VALUES (?)", (source,))
+        conn.commit()
+        state = conn.execute("""
+            SELECT records, inserted, duplicates, rejected, finished FROM import_progress WHERE source = ?
+        """, (source,)).fetchone()
+        counters = dict(zip(("records", "inserted", "duplicates", "rejected"), state[:4]))
+        if state[4]:
+            return counters
+
+        seen = {row[0] for row in conn.execute("SELECT isbn FROM books WHERE isbn IS NOT NULL AND isbn != ''")}
+        if defer_indexes:
+            drop_deferred_indexes(conn)
+
+        # Each book gets `quantity` copies (library.copies); the newest id
+        # is read under the write lock, so only this batch's books are stocked
+        def insert(conn, rows, counters):
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM books").fetchone()[0]
+            conn.executemany("""
+                INSERT INTO books (title, author, isbn, shelf_location, quantity) VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            stock_books(conn, last_id + 1)
+            conn.execute("""
+                UPDATE import_progress SET records = ?, inserted = ?, duplicates = ?, rejected = ?
+                WHERE source = ?
+            """, (counters["records"], counters["inserted"], counters["duplicates"], counters["rejected"], source))
+
+        start = time.perf_counter()
+        try:
+            with io.open(path, newline="", encoding="utf-8-sig") as text_file:
+                records = READERS[file_format](text_file)
+                # Skip what a previous, interrupted run already committed
+                for _ in range(counters["records"]):
+                    next(records, None)
+
+                for batch in batches(records, batch_size):
+                    rows = []
+                    for record in batch:
+                        row = to_row(record)
+                        if row is None:
+                            counters["rejected"] += 1
+                        elif row[2] and row[2] in seen:
+                            counters["duplicates"] += 1
+                        else:
+                            if row[2]:
+                                seen.add(row[2])
+                            rows.append(row)
+                    counters["records"] += len(batch)
+                    counters["inserted"] += len(rows)
+
+                    run_in_transaction(conn, lambda conn: insert(conn, rows, counters))
+                    bump("books", "copies")
+                    if progress:
+                        progress(dict(counters, seconds=time.perf_counter() - start))
+        finally:
+            restore_deferred_indexes(conn)
+
+        conn.execute("UPDATE import_progress SET finished = 1 WHERE source = ?", (source,))
+        conn.commit()
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import books into library.db")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="drop the books indexes and full-text triggers during the load and rebuild them at the end")
+    args = parser.parse_args()
+
+    def report(counters):
+        rate = counters["records"] / max(counters["seconds"], 1e-9)
+        print(f"{counters['records']:>10} records  {counters['inserted']:>10} inserted  "
+              f"{counters['duplicates']:>8} duplicates  {counters['rejected']:>6} rejected  {rate:>9.0f} rows/s")
+
+    counters = import_books(args.path, args.format, args.batch_size, args.defer_indexes, report)
+    print(f"Done: {counters['inserted']} books added, {counters['duplicates']} duplicates, "
+          f"{counters['rejected']} rejected.")
+
+
+if __name__ == "__main__":
+    main()
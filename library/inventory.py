@@ -0,0 +1,302 @@
+# Inventory consistency checker and repair.
+#
+# Each check is one set-based query over the whole catalogue that lists
+# the rows breaking an invariant, in id order:
+#
+#   orphaned_history   closed loans of a book or user that no longer exists
+#                      (reported only: they are history)
+#   orphaned_loans     open loans of a book or user that no longer exists
+#   loans_without_copy open loans with no copy of their title, or sharing
+#                      one with an older open loan
+#   loan_copy_status   copies of open loans not marked on loan
+#   ready_holds_without_copy
+#                      ready holds whose copy is not held for them
+#   stray_copies       copies on loan or held with no open loan or ready hold
+#   queue_skipped      titles with copies on the shelf and holds waiting
+#   quantity_drift     books whose quantity is not their copies on the shelf
+#
+# Repairs run in that order, since fixing one can expose the next (a
+# closed orphaned loan leaves a stray copy).  Each check's query finds up
+# to REPAIR_BATCH candidates as a plain read, which never holds up
+# borrows and returns; then short write transactions, REPAIR_CHUNK
+# candidates each, re-check just those rows by id (the RECHECKS query:
+# index probes, no scan) and repair the ones still broken.  A pause after
+# each lets circulation in, and keyset paging (id > last id found) means
+# no row is looked at twice.
+# The inventory job repairs daily; from a shell:
+#
+#   python -m library.inventory [--repair] [--db library.db]
+import argparse
+import time
+
+from library import db
+from library.cache import bump
+from library.holds import release_copy
+
+# Candidates read per check query, candidates re-checked and repaired per
+# write transaction, and seconds to pause after each transaction
+REPAIR_BATCH = 5000
+REPAIR_CHUNK = 500
+REPAIR_PAUSE = 0.02
+
+# Rows listed per problem in a report
+SAMPLES = 10
+
+# Queries take :after (last id seen) and :limit (-1: all); the first column
+# is the id they page by
+ORPHANED = """
+    SELECT t.id FROM transactions t
+    WHERE t.return_date IS {} NULL AND t.id > :after
+      AND (NOT EXISTS (SELECT 1 FROM books b WHERE b.id = t.book_id)
+           OR NOT EXISTS (SELECT 1 FROM users u WHERE u.id = t.user_id))
+    ORDER BY t.id LIMIT :limit
+"""
+
+LOANS_WITHOUT_COPY = """
+    WITH open AS (
+        SELECT id, book_id, copy_id, ROW_NUMBER() OVER (PARTITION BY copy_id ORDER BY id) AS n
+        FROM transactions WHERE return_date IS NULL
+    )
+    SELECT o.id, o.book_id FROM open o LEFT JOIN copies c ON c.id = o.copy_id
+    WHERE o.id > :after AND EXISTS (SELECT 1 FROM books b WHERE b.id = o.book_id)
+      AND (c.id IS NULL OR c.book_id != o.book_id OR o.copy_id IS NULL OR o.n > 1)
+    ORDER BY o.id LIMIT :limit
+"""
+
+LOAN_COPY_STATUS = """
+    SELECT c.id FROM transactions t JOIN copies c ON c.id = t.copy_id AND c.book_id = t.book_id
+    WHERE t.return_date IS NULL AND c.status != 'on_loan' AND c.id > :after
+    ORDER BY c.id LIMIT :limit
+"""
+
+READY_HOLDS_WITHOUT_COPY = """
+    WITH ready AS (
+        SELECT id, book_id, copy_id, ROW_NUMBER() OVER (PARTITION BY copy_id ORDER BY id) AS n
+        FROM holds WHERE status = 'ready'
+    )
+    SELECT r.id FROM ready r LEFT JOIN copies c ON c.id = r.copy_id
+    WHERE r.id > :after
+      AND (c.id IS NULL OR c.status != 'held' OR c.book_id != r.book_id OR r.copy_id IS NULL OR r.n > 1)
+    ORDER BY r.id LIMIT :limit
+"""
+
+STRAY_COPIES = """
+    SELECT c.id, c.book_id FROM copies c
+    WHERE c.id > :after AND (
+        (c.status = 'on_loan' AND c.id NOT IN (
+            SELECT copy_id FROM transactions WHERE return_date IS NULL AND copy_id IS NOT NULL))
+        OR (c.status = 'held' AND c.id NOT IN (
+            SELECT copy_id FROM holds WHERE status = 'ready' AND copy_id IS NOT NULL)))
+    ORDER BY c.id LIMIT :limit
+"""
+
+QUEUE_SKIPPED = """
+    SELECT DISTINCT h.book_id FROM holds h
+    WHERE h.status = 'waiting' AND h.book_id > :after
+      AND EXISTS (SELECT 1 FROM copies c WHERE c.book_id = h.book_id AND c.status = 'available')
+    ORDER BY h.book_id LIMIT :limit
+"""
+
+QUANTITY_DRIFT = """
+    SELECT b.id FROM books b
+    WHERE b.id > :after
+      AND b.quantity IS NOT (SELECT COUNT(*) FROM copies c WHERE c.book_id = b.id AND c.status = 'available')
+    ORDER BY b.id LIMIT :limit
+"""
+
+
+# The same checks for the candidate ids in {ids} only, as of the write
+# transaction repairing them; same columns as the check
+RECHECKS = {
+    "orphaned_loans": """
+        SELECT t.id FROM transactions t
+        WHERE t.id IN {ids} AND t.return_date IS NULL
+          AND (NOT EXISTS (SELECT 1 FROM books b WHERE b.id = t.book_id)
+               OR NOT EXISTS (SELECT 1 FROM users u WHERE u.id = t.user_id))
+    """,
+    # An older open loan of the same copy, found through its index rather
+    # than by numbering every open loan
+    "loans_without_copy": """
+        SELECT t.id, t.book_id FROM transactions t LEFT JOIN copies c ON c.id = t.copy_id
+        WHERE t.id IN {ids} AND t.return_date IS NULL AND EXISTS (SELECT 1 FROM books b WHERE b.id = t.book_id)
+          AND (c.id IS NULL OR c.book_id != t.book_id OR t.copy_id IS NULL
+               OR EXISTS (SELECT 1 FROM transactions o
+                          WHERE o.copy_id = t.copy_id AND o.return_date IS NULL AND o.id < t.id))
+        ORDER BY t.id
+    """,
+    "loan_copy_status": """
+        SELECT c.id FROM copies c
+        WHERE c.id IN {ids} AND c.status != 'on_loan'
+          AND EXISTS (SELECT 1 FROM transactions t
+                      WHERE t.copy_id = c.id AND t.book_id = c.book_id AND t.return_date IS NULL)
+    """,
+    # Ready holds are few (they expire within HOLD_PICKUP_DAYS), so
+    # numbering them all stays cheap
+    "ready_holds_without_copy": """
+        WITH ready AS (
+            SELECT id, book_id, copy_id, ROW_NUMBER() OVER (PARTITION BY copy_id ORDER BY id) AS n
+            FROM holds WHERE status = 'ready'
+        )
+        SELECT r.id FROM ready r LEFT JOIN copies c ON c.id = r.copy_id
+        WHERE r.id IN {ids}
+          AND (c.id IS NULL OR c.status != 'held' OR c.book_id != r.book_id OR r.copy_id IS NULL OR r.n > 1)
+    """,
+    "stray_copies": """
+        SELECT c.id, c.book_id FROM copies c
+        WHERE c.id IN {ids} AND (
+            (c.status = 'on_loan' AND NOT EXISTS (
+                SELECT 1 FROM transactions t WHERE t.copy_id = c.id AND t.return_date IS NULL))
+            OR (c.status = 'held' AND c.id NOT IN (
+                SELECT copy_id FROM holds WHERE status = 'ready' AND copy_id IS NOT NULL)))
+        ORDER BY c.id
+    """,
+    "queue_skipped": """
+        SELECT DISTINCT h.book_id FROM holds h
+        WHERE h.book_id IN {ids} AND h.status = 'waiting'
+          AND EXISTS (SELECT 1 FROM copies c WHERE c.book_id = h.book_id AND c.status = 'available')
+    """,
+    "quantity_drift": """
+        SELECT b.id FROM books b
+        WHERE b.id IN {ids}
+          AND b.quantity IS NOT (SELECT COUNT(*) FROM copies c WHERE c.book_id = b.id AND c.status = 'available')
+    """,
+}
+
+
+def _in(rows):
+    return f"({', '.join(str(row[0]) for row in rows)})"
+
+
+# Repairs: fn(conn, rows) inside a transaction
+
+def close_orphaned_loans(conn, rows):
+    conn.execute(f"UPDATE transactions SET return_date = DATE('now') WHERE id IN {_in(rows)}")
+
+
+# A loan gets back a copy of its title marked on loan for nobody, if there
+# is one, or a new copy
+def give_loans_copies(conn, rows):
+    for transaction_id, book_id in rows:
+        copy = conn.execute("""
+            SELECT id FROM copies c WHERE book_id = ? AND status = 'on_loan'
+              AND NOT EXISTS (SELECT 1 FROM transactions t WHERE t.copy_id = c.id AND t.return_date IS NULL)
+            LIMIT 1
+        """, (book_id,)).fetchone()
+        if copy is None:
+            copy = (conn.execute("INSERT INTO copies (book_id, status) VALUES (?, 'on_loan')", (book_id,)).lastrowid,)
+        conn.execute("UPDATE transactions SET copy_id = ? WHERE id = ?", (copy[0], transaction_id))
+
+
+def mark_copies_on_loan(conn, rows):
+    conn.execute(f"UPDATE copies SET status = 'on_loan' WHERE id IN {_in(rows)}")
+
+
+# A ready hold that lost its copy goes back to waiting, at its old place
+def requeue_holds(conn, rows):
+    conn.execute(f"UPDATE holds SET status = 'waiting', ready_date = NULL, copy_id = NULL WHERE id IN {_in(rows)}")
+
+
+def release_stray_copies(conn, rows):
+    for copy_id, book_id in rows:
+        release_copy(conn, copy_id, book_id)
+
+
+def serve_queues(conn, rows):
+    for (book_id,) in rows:
+        while True:
+            copy = conn.execute(
+                "SELECT id FROM copies WHERE book_id = ? AND status = 'available' LIMIT 1", (book_id,)).fetchone()
+            if copy is None or release_copy(conn, copy[0], book_id) is None:
+                break
+
+
+def recount_quantity(conn, rows):
+    conn.execute(f"""
+        UPDATE books SET quantity = (SELECT COUNT(*) FROM copies c WHERE c.book_id = books.id AND c.status = 'available')
+        WHERE id IN {_in(rows)}
+    """)
+
+
+# name -> (description, query, repair or None), in repair order
+CHECKS = {
+    "orphaned_history": ("Closed loans of a removed book or user", ORPHANED.format("NOT"), None),
+    "orphaned_loans": ("Open loans of a removed book or user", ORPHANED.format(""), close_orphaned_loans),
+    "loans_without_copy": ("Open loans without a copy of their own", LOANS_WITHOUT_COPY, give_loans_copies),
+    "loan_copy_status": ("Copies on loan not marked on loan", LOAN_COPY_STATUS, mark_copies_on_loan),
+    "ready_holds_without_copy": ("Ready holds without a held copy", READY_HOLDS_WITHOUT_COPY, requeue_holds),
+    "stray_copies": ("Copies on loan or held for nobody", STRAY_COPIES, release_stray_copies),
+    "queue_skipped": ("Titles on the shelf with holds waiting", QUEUE_SKIPPED, serve_queues),
+    "quantity_drift": ("Books whose quantity is not their copies on the shelf", QUANTITY_DRIFT, recount_quantity),
+}
+
+
+# Run every check; returns {name: (problems found, first SAMPLES ids)}
+def check_inventory(conn):
+    report = {}
+    for name, (_, query, _) in CHECKS.items():
+        count, samples = 0, []
+        for row in conn.execute(query, {"after": 0, "limit": -1}):
+            count += 1
+            if len(samples) < SAMPLES:
+                samples.append(row[0])
+        report[name] = (count, samples)
+    return report
+
+
+# Repair what the checks find, in batches; returns {name: rows repaired}
+def repair_inventory(conn, batch=REPAIR_BATCH, chunk=REPAIR_CHUNK, pause=REPAIR_PAUSE):
+    repaired = {}
+    for name, (_, query, repair) in CHECKS.items():
+        if repair is None:
+            continue
+        after, total = 0, 0
+
+        def step(conn, candidates):
+            rows = conn.execute(RECHECKS[name].format(ids=_in(candidates))).fetchall()
+            if rows:
+                repair(conn, rows)
+            return len(rows)
+
+        while True:
+            candidates = conn.execute(query, {"after": after, "limit": batch}).fetchall()
+            for first in range(0, len(candidates), chunk):
+                total += db.run_in_transaction(conn, lambda conn: step(conn, candidates[first:first + chunk]))
+                time.sleep(pause)
+            if len(candidates) < batch:
+                break
+            after = candidates[-1][0]
+        repaired[name] = total
+    if any(repaired.values()):
+        bump("books", "copies", "transactions", "holds")
+    return repaired
+
+
+def print_report(report):
+    for name, (count, samples) in report.items():
+        detail = f"  e.g. {', '.join(map(str, samples))}" if count else ""
+        print(f"{CHECKS[name][0]:55}{count:>10}{detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check (and repair) copies, loans, holds and book quantities")
+    parser.add_argument("--repair", action="store_true", help="repair what the checks find")
+    parser.add_argument("--db", help="database file (default: LIBRARY_DB or library.db)")
+    args = parser.parse_args()
+
+    # Imported here: library.migrations imports library.jobs, which imports this module
+    from library.migrations import ensure_schema
+
+    ensure_schema(args.db)
+    with db.connection(args.db) as conn:
+        start = time.perf_counter()
+        print_report(check_inventory(conn))
+        print(f"checked in {time.perf_counter() - start:.1f} s")
+        if args.repair:
+            start = time.perf_counter()
+            repaired = repair_inventory(conn)
+            print(f"repaired {sum(repaired.values())} rows in {time.perf_counter() - start:.1f} s")
+            print_report(check_inventory(conn))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+# Background maintenance jobs.
+#
+# One daemon thread per process (start_scheduler(), called by main.py)
+# wakes every SCHEDULER_TICK seconds and runs the jobs that are due, one
+# after another on its own pooled connection.  Streamlit reruns never wait
+# for a job: pages only read job_runs or ask for a run (request_run()).
+# Every job keeps its write transactions short, so borrows and returns
+# interleave with it.
+#
+# Runs are recorded in job_runs, so schedules survive restarts and the Jobs
+# page can show runtimes.  A run is claimed by inserting its row, in a
+# write transaction that first checks no other process is running the job
+# (or, for a scheduled run, has started it within its interval), so several
+# app processes on one database never run a job twice.  Each row records
+# its owner, host:pid, so a run left 'running' by a process that has
+# exited can be told from one still in progress.  Jobs can also be run
+# from cron or a shell:
+#   python -m library.jobs                  run the jobs that are due
+#   python -m library.jobs fines optimize   run the named jobs now
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from library import db
+from library.archive import ARCHIVE_AFTER_DAYS, archive_loans
+from library.fines import accrue_fines
+from library.holds import expire_holds
+from library.inventory import repair_inventory
+from library.metrics import write_metrics_file
+from library.reports import prune_borrower_loans
+from library.snapshot import SNAPSHOT_INTERVAL, refresh_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Set LIBRARY_JOBS=0 to keep the app from starting the scheduler
+JOBS_ENABLED = os.environ.get("LIBRARY_JOBS", "1") != "0"
+
+# Seconds between scheduler wake-ups, and before the first one so start-up
+# is not slowed down
+SCHEDULER_TICK = 30
+SCHEDULER_DELAY = 60
+
+# Runs kept per job in job_runs
+RUNS_KEPT = 200
+
+# Seconds after which a run still 'running' counts as dead whatever its
+# owner: one on another host that died, or one whose pid has been reused
+RUN_TIMEOUT = 6 * 3600
+
+# Pages freed per incremental_vacuum step and borrower_loans rows pruned
+# per transaction, with a pause between steps so waiting writers get the lock
+VACUUM_STEP_PAGES = 1000
+PRUNE_STEP_ROWS = 5000
+STEP_PAUSE = 0.02
+
+JOBS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS job_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        finished_at TEXT,
+        duration_ms REAL,
+        status TEXT NOT NULL CHECK(status IN ('running', 'ok', 'error', 'interrupted')),
+        detail TEXT,
+        owner TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs(job, id)",
+]
+
+
+# Create job_runs, adding the owner column to one from before it existed
+def create_job_tables(conn):
+    for statement in JOBS_SCHEMA:
+        conn.execute(statement)
+    if "owner" not in {row[1] for row in conn.execute("PRAGMA table_info(job_runs)")}:
+        conn.execute("ALTER TABLE job_runs ADD COLUMN owner TEXT")
+    conn.commit()
+
+
+# Each job takes a connection and returns a one-line summary for job_runs
+
+def fines_job(conn):
+    return f"{accrue_fines(conn)} loans recomputed"
+
+
+def reports_job(conn):
+    # The totals are kept by triggers; only drop borrowers with no open loan
+    # A short step means the backlog is gone; returns keep adding a few rows
+    pruned, step = 0, PRUNE_STEP_ROWS
+    while step == PRUNE_STEP_ROWS:
+        step = db.run_in_transaction(conn, lambda conn: prune_borrower_loans(conn, PRUNE_STEP_ROWS))
+        pruned += step
+        time.sleep(STEP_PAUSE)
+    return f"{pruned} idle borrower rows pruned"
+
+
+def holds_job(conn):
+    return f"{expire_holds(conn)} uncollected holds expired"
+
+
+def inventory_job(conn):
+    repaired = repair_inventory(conn)
+    detail = ", ".join(f"{count} {name}" for name, count in repaired.items() if count)
+    return f"{sum(repaired.values())} inventory rows repaired" + (f" ({detail})" if detail else "")
+
+
+def archive_job(conn):
+    return f"{archive_loans(conn)} loans returned over {ARCHIVE_AFTER_DAYS} days ago archived"
+
+
+def snapshot_job(conn):
+    _, pages, copy_ms = refresh_snapshot(conn)
+    return f"{pages} pages copied in {copy_ms / 1000:.1f} s"
+
+
+def optimize_job(conn):
+    # analysis_limit keeps any ANALYZE that optimize decides on bounded
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("PRAGMA optimize")
+    return "statistics refreshed"
+
+
+def vacuum_job(conn):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return "skipped: auto_vacuum is not INCREMENTAL (needs a one-off VACUUM to enable)"
+    start = free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free:
+        db.run_in_transaction(conn, lambda conn: conn.execute(
+            f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall())
+        time.sleep(STEP_PAUSE)
+        previous, free = free, conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free >= previous:
+            break
+    return f"{start - free} pages freed"
+
+
+def checkpoint_job(conn):
+    # PASSIVE copies what it can without waiting for readers or writers
+    busy, wal_pages, copied = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    return f"{copied} of {wal_pages} WAL pages checkpointed" + (" (busy)" if busy else "")
+
+
+def thumbnails_job(conn):
+    # Imported here so start-up does not load PIL
+    from library.covers import THUMBNAIL_SIZES, cover_path, generate_thumbnails
+
+    keys = [row[0] for row in conn.execute("SELECT DISTINCT cover_key FROM books WHERE cover_key IS NOT NULL")]
+    missing = [key for key in keys
+               if os.path.exists(cover_path(key))
+               and not all(os.path.exists(cover_path(key, size)) for size in THUMBNAIL_SIZES)]
+    for key in missing:
+        generate_thumbnails(key)
+    return f"thumbnails made for {len(missing)} of {len(keys)} covers"
+
+
+def metrics_job(conn):
+    return f"written to {write_metrics_file()}"
+
+
+# name -> (description, seconds between runs, fn(conn))
+JOBS = {
+    "fines": ("Overdue fine accrual", 5 * 60, fines_job),
+    "reports": ("Report aggregate refresh", 24 * 3600, reports_job),
+    "holds": ("Uncollected hold expiry", 24 * 3600, holds_job),
+    "inventory": ("Inventory consistency repair", 24 * 3600, inventory_job),
+    "archive": ("Old loan archival", 24 * 3600, archive_job),
+    "snapshot": ("Report snapshot refresh", SNAPSHOT_INTERVAL, snapshot_job),
+    "optimize": ("PRAGMA optimize (ANALYZE)", 24 * 3600, optimize_job),
+    "vacuum": ("Incremental VACUUM", 24 * 3600, vacuum_job),
+    "checkpoint": ("WAL checkpoint", 5 * 60, checkpoint_job),
+    "thumbnails": ("Cover thumbnails", 3600, thumbnails_job),
+    "metrics": ("Prometheus metrics file", 60, metrics_job),
+}
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+# Owner recorded on this process's runs
+def run_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# True if process `pid` on this host is still running
+def pid_alive(pid):
+    if os.name == "nt":
+        # os.kill() would terminate the process on Windows; open it instead
+        import ctypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return ctypes.get_last_error() == 5  # access denied: running as another user
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# False for a run whose owner has exited: a process on this host that is
+# gone, or no owner at all (runs recorded before owners were).  Processes
+# on other hosts cannot be checked and count as alive.
+def owner_alive(owner):
+    if owner is None:
+        return False
+    host, _, pid = owner.rpartition(":")
+    return host != socket.gethostname() or pid_alive(int(pid))
+
+
+# Mark the 'running' rows whose owner has exited, or that started over
+# RUN_TIMEOUT ago, as interrupted (of one job, or of all); returns how many
+def interrupt_dead_runs(conn, name=None):
+    rows = conn.execute("""
+        SELECT id, owner, started_at FROM job_runs WHERE status = 'running' AND (? IS NULL OR job = ?)
+    """, (name, name)).fetchall()
+    now = datetime.now(timezone.utc)
+    dead = [(run_id,) for run_id, owner, started_at in rows
+            if not owner_alive(owner) or (now - datetime.fromisoformat(started_at)).total_seconds() > RUN_TIMEOUT]
+    conn.executemany("UPDATE job_runs SET status = 'interrupted' WHERE id = ?", dead)
+    return len(dead)
+
+
+# Claim a run of a job: its job_runs id, or None if another process is
+# running it or, with scheduled=True, has started it within its interval
+def claim_run(conn, name, scheduled=False):
+    def claim(conn):
+        interrupt_dead_runs(conn, name)
+        since = None
+        if scheduled:
+            since = (datetime.now(timezone.utc) - timedelta(seconds=JOBS[name][1])).isoformat(timespec="seconds")
+        cursor = conn.execute("""
+            INSERT INTO job_runs (job, started_at, status, owner)
+            SELECT ?, ?, 'running', ?
+            WHERE NOT EXISTS (SELECT 1 FROM job_runs
+                              WHERE job = ? AND (status = 'running' OR started_at > ?))
+        """, (name, utc_now(), run_owner(), name, since))
+        return cursor.lastrowid if cursor.rowcount else None
+
+    return db.run_in_transaction(conn, claim)
+
+
+# Run one job now, unless another process is running it, and record it in
+# job_runs; returns its status, or 'skipped'.  A scheduled run is also
+# skipped if the job is no longer due.
+def run_job(conn, name, scheduled=False):
+    run_id = claim_run(conn, name, scheduled)
+    if run_id is None:
+        return "skipped"
+    start = time.perf_counter()
+    try:
+        status, detail = "ok", JOBS[name][2](conn)
+    except Exception as error:
+        if conn.in_transaction:
+            conn.rollback()
+        status, detail = "error", f"{type(error).__name__}: {error}"
+    conn.execute("UPDATE job_runs SET finished_at = ?, duration_ms = ?, status = ?, detail = ? WHERE id = ?",
+                 (utc_now(), (time.perf_counter() - start) * 1000, status, detail, run_id))
+    conn.execute("""
+        DELETE FROM job_runs WHERE job = ? AND id <= (
+            SELECT id FROM job_runs WHERE job = ? ORDER BY id DESC LIMIT 1 OFFSET ?)
+    """, (name, name, RUNS_KEPT))
+    conn.commit()
+    return status
+
+
+# Jobs whose last run started at least their interval ago (or never ran)
+def due_jobs(conn):
+    last = dict(conn.execute("SELECT job, MAX(started_at) FROM job_runs GROUP BY job").fetchall())
+    now = datetime.now(timezone.utc)
+    return [name for name, (_, interval, _) in JOBS.items()
+            if name not in last or (now - datetime.fromisoformat(last[name])).total_seconds() >= interval]
+
+
+# Latest run of every job: (name, description, interval, started_at,
+# duration_ms, status, detail), never-run jobs with None
+def job_status(conn):
+    latest = {row[0]: row[1:] for row in conn.execute("""
+        SELECT job, started_at, duration_ms, status, detail FROM job_runs
+        WHERE id IN (SELECT MAX(id) FROM job_runs GROUP BY job)
+    """)}
+    return [(name, description, interval) + latest.get(name, (None, None, None, None))
+            for name, (description, interval, _) in JOBS.items()]
+
+
+# Recent runs, newest first
+def job_history(conn, limit=100):
+    return conn.execute("""
+        SELECT job, started_at, duration_ms, status, detail FROM job_runs ORDER BY id DESC LIMIT ?
+    """, (limit,)).fetchall()
+
+
+_requested = set()
+_requested_lock = threading.Lock()
+_wake = threading.Event()
+_threads = {}
+_threads_lock = threading.Lock()
+
+
+# True while the scheduler thread for a database file is alive
+def scheduler_running(path=None):
+    thread = _threads.get(os.path.abspath(path or db.DB_PATH))
+    return thread is not None and thread.is_alive()
+
+
+# Ask the scheduler to run a job at its next wake-up, which is immediate
+def request_run(name):
+    with _requested_lock:
+        _requested.add(name)
+    _wake.set()
+
+
+# Run the requested jobs, then the due ones.  A request is dropped once its
+# job has run (successfully or not: run_job records the error).
+def run_pending(path):
+    with _requested_lock:
+        requested = sorted(_requested)
+    with db.connection(path) as conn:
+        for name in dict.fromkeys(requested + due_jobs(conn)):
+            run_job(conn, name, scheduled=name not in requested)
+            with _requested_lock:
+                _requested.discard(name)
+
+
+# A failed tick (the database locked or unreadable, say) is logged and
+# retried at the next one, so the thread never dies
+def scheduler_loop(path, delay=SCHEDULER_DELAY, tick=SCHEDULER_TICK):
+    _wake.wait(delay)
+    while True:
+        _wake.clear()
+        try:
+            run_pending(path)
+        except Exception:
+            logger.exception("Background jobs for %s failed; retrying in %s s", path, tick)
+        _wake.wait(tick)
+
+
+# Start the scheduler thread for a database file, once per process (or
+# again if it has died).  Runs left 'running' by a process that has exited
+# are marked interrupted; other processes' runs in progress are left alone.
+def start_scheduler(path=None):
+    path = os.path.abspath(path or db.DB_PATH)
+    if not JOBS_ENABLED or scheduler_running(path):
+        return
+    with _threads_lock:
+        if scheduler_running(path):
+            return
+        with db.connection(path) as conn:
+            db.run_in_transaction(conn, interrupt_dead_runs)
+        thread = threading.Thread(target=scheduler_loop, args=(path,), name="library-jobs", daemon=True)
+        thread.start()
+        _threads[path] = thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background maintenance jobs")
+    parser.add_argument("jobs", nargs="*", help=f"jobs to run: {', '.join(JOBS)} (default: those due)")
+    parser.add_argument("--db", help="database file (default: LIBRARY_DB or library.db)")
+    args = parser.parse_args()
+    unknown = set(args.jobs) - set(JOBS)
+    if unknown:
+        parser.error(f"unknown jobs: {', '.join(sorted(unknown))}")
+
+    # Imported here: library.migrations imports this module
+    from library.migrations import ensure_schema
+
+    ensure_schema(args.db)
+    with db.connection(args.db) as conn:
+        for name in args.jobs or due_jobs(conn):
+            start = time.perf_counter()
+            status = run_job(conn, name, scheduled=not args.jobs)
+            print(f"{name:12} {status:6} {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
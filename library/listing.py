@@ -0,0 +1,35 @@
+# Keyset (seek) pagination.  A page starts after the (sort value, id) of the
+# previous page's last row, so fetching page 1000 costs the same index seek
+# as page 1 — no OFFSET, no counting.
+from library.cache import cached
+
+# Page sizes offered by the listing pages
+PAGE_SIZES = (25, 50, 100, 250)
+
+
+# One page of rows ordered by (sort_key, id) and whether more rows follow.
+# `columns` must contain "id" and the sort key; `after` is the cursor
+# returned for the previous page (None for the first page).
+@cached("books", "users", "transactions")
+def fetch_page(conn, table, columns, sort_key="id", after=None, page_size=PAGE_SIZES[0]):
+    if sort_key not in columns or "id" not in columns:
+        raise ValueError(f"Cannot sort {table} by {sort_key}")
+
+    if after is None:
+        where, params = "", ()
+    elif sort_key == "id":
+        where, params = "WHERE id > ?", (after[1],)
+    else:
+        where, params = f"WHERE ({sort_key}, id) > (?, ?)", after
+
+    order = "id" if sort_key == "id" else f"{sort_key}, id"
+    rows = conn.execute(f"""
+        SELECT {', '.join(columns)} FROM {table} {where}
+        ORDER BY {order} LIMIT ?
+    """, params + (page_size + 1,)).fetchall()
+    return rows[:page_size], len(rows) > page_size
+
+
+# Cursor that continues after the given row
+def page_cursor(columns, sort_key, row):
+    return row[columns.index(sort_key)], row[columns.index("id")]
@@ -0,0 +1,268 @@
+# Instrumentation: how long SQLite statements and page reruns take.
+#
+# Pooled connections (library.db) are TimedConnections, whose cursors time
+# every execute() and keep a latency histogram per statement, with literal
+# numbers and strings folded so one query shape is one entry.  Statements
+# slower than SLOW_QUERY_MS are also logged with their query plan.  main.py
+# times each rerun of the selected page with timed_rerun().
+#
+# Everything is kept in memory per process: the Performance page reads it,
+# and the metrics job (library.jobs) writes it to METRICS_FILE in the
+# Prometheus text format for node_exporter's textfile collector.
+import functools
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from library import cache
+
+# Set LIBRARY_METRICS=0 to use plain, untimed connections
+ENABLED = os.environ.get("LIBRARY_METRICS", "1") != "0"
+
+# Statements at least this slow go to the slow-query log, which keeps the
+# latest SLOW_QUERIES_KEPT of them
+SLOW_QUERY_MS = float(os.environ.get("LIBRARY_SLOW_QUERY_MS", "100"))
+SLOW_QUERIES_KEPT = 100
+
+# Distinct statements tracked; later ones are counted under "(other)"
+STATEMENTS_KEPT = 500
+
+METRICS_FILE = os.environ.get("LIBRARY_METRICS_FILE", os.path.join("metrics", "library.prom"))
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+# Latency histogram with fixed buckets; percentiles are interpolated
+# within a bucket, so they are estimates
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def merge(self, other):
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        rank = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                lower = BUCKETS_MS[i - 1] if i else 0.0
+                upper = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return 0.0
+
+
+_lock = threading.Lock()
+_statements = {}
+_pages = {}
+_slow = deque(maxlen=SLOW_QUERIES_KEPT)
+_context = threading.local()
+_since = datetime.now(timezone.utc)
+
+
+# Statement text with whitespace collapsed and literals replaced by ?
+@functools.lru_cache(maxsize=2048)
+def normalize(sql):
+    sql = re.sub(r"'(?:[^']|'')*'", "?", " ".join(sql.split()))
+    return re.sub(r"(?<![\w.])-?\d+(?:\.\d+)?\b", "?", sql)
+
+
+# EXPLAIN QUERY PLAN lines of a statement, or None when it has no plan
+def query_plan(conn, sql, parameters=()):
+    if sql.lstrip()[:6].upper() not in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLAC"):
+        return None
+    try:
+        rows = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    except sqlite3.Error:
+        return None
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return "\n".join(lines) or None
+
+
+def record_query(conn, sql, parameters, ms):
+    key = normalize(sql)
+    with _lock:
+        histogram = _statements.get(key)
+        if histogram is None:
+            bucket = key if len(_statements) < STATEMENTS_KEPT else "(other)"
+            histogram = _statements.setdefault(bucket, Histogram())
+        histogram.add(ms)
+    if ms >= SLOW_QUERY_MS:
+        plan = query_plan(conn, sql, parameters) if parameters is not None else None
+        _slow.append((datetime.now(timezone.utc).isoformat(timespec="seconds"), ms,
+                      getattr(_context, "page", None), key, plan))
+
+
+# Cursor timing execute(), which runs a statement up to its first row
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(self.connection, sql, parameters, (time.perf_counter() - start) * 1000)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(self.connection, sql, None, (time.perf_counter() - start) * 1000)
+
+    def executescript(self, script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            record_query(self.connection, script, None, (time.perf_counter() - start) * 1000)
+
+
+# Connection whose statements all go through a TimedCursor
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+# Time one rerun of a page; statements run meanwhile are logged with it
+@contextmanager
+def timed_rerun(page):
+    _context.page = page
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        _context.page = None
+        with _lock:
+            _pages.setdefault(page, Histogram()).add(ms)
+
+
+def _rows(histograms):
+    return [(name, h.count, h.total, h.percentile(50), h.percentile(95), h.percentile(99), h.max)
+            for name, h in histograms.items()]
+
+
+# Snapshot for the Performance page: per-page and per-statement rows of
+# (name, count, total ms, p50, p95, p99, max), slowest total first, and the
+# slow-query log, newest first
+def snapshot():
+    with _lock:
+        pages = _rows(_pages)
+        statements = _rows(_statements)
+        slow = list(reversed(_slow))
+    return {
+        "since": _since.isoformat(timespec="seconds"),
+        "pages": sorted(pages, key=lambda row: -row[2]),
+        "statements": sorted(statements, key=lambda row: -row[2]),
+        "slow": slow,
+    }
+
+
+def reset():
+    global _since
+    with _lock:
+        _statements.clear()
+        _pages.clear()
+        _slow.clear()
+        _since = datetime.now(timezone.utc)
+
+
+# Kind of a statement (its first keyword), the label of the query metrics
+def statement_kind(key):
+    word = key.split(" ", 1)[0].lower()
+    if word == "with":
+        return "select"
+    return word if word in ("select", "insert", "update", "delete", "begin", "commit", "pragma") else "other"
+
+
+def _prometheus_histogram(lines, name, label, histograms):
+    for value, h in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS_MS + (None,), h.buckets):
+            cumulative += count
+            le = "+Inf" if bound is None else f"{bound / 1000:g}"
+            lines.append(f'{name}_bucket{{{label}="{value}",le="{le}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}="{value}"}} {h.total / 1000:.6f}')
+        lines.append(f'{name}_count{{{label}="{value}"}} {h.count}')
+
+
+# All metrics in the Prometheus text exposition format
+def prometheus_text():
+    with _lock:
+        kinds = {}
+        for key, histogram in _statements.items():
+            kinds.setdefault(statement_kind(key), Histogram()).merge(histogram)
+        pages = {page: histogram for page, histogram in _pages.items()}
+        slow = len(_slow)
+    stats = cache.CACHE.stats()
+    escape = lambda text: text.replace("\\", "\\\\").replace('"', '\\"')
+    lines = [
+        "# HELP library_query_duration_seconds SQLite statement execution time.",
+        "# TYPE library_query_duration_seconds histogram",
+    ]
+    _prometheus_histogram(lines, "library_query_duration_seconds", "kind", kinds)
+    lines += [
+        "# HELP library_rerun_duration_seconds Streamlit rerun time of a page.",
+        "# TYPE library_rerun_duration_seconds histogram",
+    ]
+    _prometheus_histogram(lines, "library_rerun_duration_seconds", "page",
+                          {escape(page): histogram for page, histogram in pages.items()})
+    lines += [
+        f"# HELP library_slow_queries Statements over {SLOW_QUERY_MS:g} ms in the slow-query log.",
+        "# TYPE library_slow_queries gauge",
+        f"library_slow_queries {slow}",
+        "# HELP library_query_cache_hits_total Query cache hits.",
+        "# TYPE library_query_cache_hits_total counter",
+        f"library_query_cache_hits_total {sum(row[1] for row in stats['functions'])}",
+        "# HELP library_query_cache_misses_total Query cache misses.",
+        "# TYPE library_query_cache_misses_total counter",
+        f"library_query_cache_misses_total {sum(row[2] for row in stats['functions'])}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+# Write prometheus_text() to a file, atomically so a scrape never reads
+# half of it
+def write_metrics_file(path=METRICS_FILE):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as metrics_file:
+        metrics_file.write(prometheus_text())
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+    return path
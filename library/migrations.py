@@ -0,0 +1,402 @@
+# Versioned schema migrations.
+#
+# The database's PRAGMA user_version records the last migration applied.
+# ensure_schema() runs the pending ones once per process (Streamlit reruns
+# only pay for a set lookup).  Every step is idempotent, so a database left
+# half-way by a crash, or migrated by two processes at once, converges.
+#
+# Add a migration by appending (next version, description, fn(conn)).
+# Migrations that change a large table's definition use rebuild_table(),
+# which copies it in small transactions so the app keeps writing.
+#
+#   python -m library.migrations            apply pending migrations
+#   python -m library.migrations --status   show the current version
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from library import db
+from library.archive import create_archive
+from library.catalogue import normalize_isbns
+from library.copies import create_copy_inventory
+from library.fines import create_fine_tables
+from library.holds import create_hold_tables
+from library.jobs import create_job_tables
+from library.patrons import create_patron_registry
+from library.reports import create_report_tables
+from library.schema import add_columns, create_indexes, table_columns
+from library.search import create_search_index
+
+# Tables as a new database gets them ({name} is the table name, so the
+# same definitions serve rebuild_table)
+TABLES = {
+    "books": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT,
+            shelf_location TEXT,
+            quantity INTEGER DEFAULT 1,
+            cover_key TEXT
+        )
+    """,
+    "users": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            user_type TEXT NOT NULL CHECK(user_type IN ('student', 'staff')),
+            card_number TEXT,
+            name_key TEXT GENERATED ALWAYS AS (lower(trim(name))) VIRTUAL
+        )
+    """,
+    "transactions": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER,
+            user_id INTEGER,
+            borrow_date TEXT,
+            return_date TEXT,
+            overdue_days INTEGER DEFAULT 0,
+            fine_amount REAL DEFAULT 0.0,
+            copy_id INTEGER,
+            FOREIGN KEY(book_id) REFERENCES books(id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """,
+}
+
+# Online table rebuilds copy in chunks sized to hold the write lock for
+# about REBUILD_CHUNK_MS, pausing REBUILD_PAUSE seconds between chunks so
+# other writers get in
+REBUILD_CHUNK_MS = 5
+REBUILD_PAUSE = 0.02
+REBUILD_MIN_ROWS = 100
+REBUILD_MAX_ROWS = 50_000
+
+# Rebuilds in progress: rows up to copy_until (the last rowid when the
+# mirror triggers went in) are copied in chunks, later ones by the triggers
+REBUILD_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS table_rebuilds (
+        name TEXT PRIMARY KEY,
+        copied_to INTEGER NOT NULL,
+        copy_until INTEGER NOT NULL
+    )
+"""
+
+INDEX_SQL = re.compile(r"^(CREATE\s+(?:UNIQUE\s+)?INDEX\s+)(\S+)(\s+ON\s+)(\S+?)(\s*\()", re.IGNORECASE)
+
+
+def create_core_tables(conn):
+    for table, sql in TABLES.items():
+        conn.execute(sql.format(name=table))
+    conn.commit()
+
+
+# Run fn(conn) as one write transaction; returns (result, milliseconds the
+# write lock was held, from BEGIN IMMEDIATE succeeding to the commit)
+def timed_transaction(conn, fn):
+    started = []
+
+    def timed(conn):
+        started.append(time.perf_counter())
+        return fn(conn)
+
+    result = db.run_in_transaction(conn, timed)
+    return result, (time.perf_counter() - started[-1]) * 1000
+
+
+# Next chunk size, scaled so a chunk takes about chunk_ms
+def next_chunk(rows, elapsed_ms, chunk_ms):
+    scaled = int(rows * chunk_ms / max(elapsed_ms, 0.1))
+    return max(REBUILD_MIN_ROWS, min(REBUILD_MAX_ROWS, scaled, rows * 2))
+
+
+# New-table columns and the expressions filling them; by default every
+# column the two tables share
+def column_mapping(conn, table, new, columns=None):
+    if columns is None:
+        columns = {column: column for column in sorted(table_columns(conn, new) & table_columns(conn, table))}
+    return list(columns), list(columns.values())
+
+
+# Rebuild a table into a new definition without blocking other writers.
+#
+#   1. Create {table}__new with `create_sql` (a TABLES-style template), its
+#      copies of the table's indexes (suffixed __rebuild), and triggers on
+#      the old table that mirror every insert, update and delete into it.
+#   2. Copy the rows that existed before the triggers in rowid order, one
+#      short transaction per chunk; INSERT OR IGNORE keeps the newer copy a
+#      trigger already wrote.
+#   3. Swap in one transaction: drop the mirror triggers and the table's
+#      own triggers, rename old -> {table}__retired and new -> table, and
+#      recreate the triggers on the new table.
+#   4. Delete the retired rows in chunks, drop the (now empty) table and
+#      build the indexes again under their original names, dropping the
+#      copies.
+#
+# `columns` maps each new column to an SQL expression over the old row
+# (default: same-named columns).  Progress is kept in table_rebuilds, so
+# an interrupted rebuild resumes.  Returns timing statistics; max_lock_ms
+# covers every step but the index builds, timed apart in index_ms.
+def rebuild_table(conn, table, create_sql, columns=None, chunk_ms=REBUILD_CHUNK_MS, pause=REBUILD_PAUSE):
+    new, retired = f"{table}__new", f"{table}__retired"
+    stats = {"rows": 0, "chunks": 0, "max_lock_ms": 0.0, "swap_ms": 0.0, "index_ms": 0.0}
+
+    def hold(ms):
+        stats["max_lock_ms"] = max(stats["max_lock_ms"], ms)
+
+    conn.execute(REBUILD_SCHEMA)
+    conn.commit()
+    indexes = conn.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL AND name NOT LIKE '%__rebuild'
+    """, (table,)).fetchall()
+
+    # 1. Shadow table, indexes and mirror triggers
+    def prepare(conn):
+        if conn.execute("SELECT 1 FROM table_rebuilds WHERE name = ?", (table,)).fetchone():
+            return
+        conn.execute(f"DROP TABLE IF EXISTS {new}")
+        conn.execute(create_sql.format(name=new))
+        for name, sql in indexes:
+            copy_sql, matched = INDEX_SQL.subn(lambda m: f"{m[1]}{name}__rebuild{m[3]}{new}{m[5]}", sql)
+            if not matched:
+                raise ValueError(f"cannot copy index {name}: {sql}")
+            try:
+                conn.execute(copy_sql)
+            except sqlite3.OperationalError as error:
+                # Skip an index on a column the new table no longer has
+                if "no such column" not in str(error):
+                    raise
+        new_columns, expressions = column_mapping(conn, table, new, columns)
+        select = f"INSERT OR REPLACE INTO {new} ({', '.join(new_columns)}) SELECT {', '.join(expressions)} FROM {table}"
+        conn.execute(f"""
+            CREATE TRIGGER {table}__mirror_insert AFTER INSERT ON {table} BEGIN
+                {select} WHERE rowid = new.rowid;
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER {table}__mirror_update AFTER UPDATE ON {table} BEGIN
+                DELETE FROM {new} WHERE rowid = old.rowid;
+                {select} WHERE rowid = new.rowid;
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER {table}__mirror_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM {new} WHERE rowid = old.rowid;
+            END
+        """)
+        conn.execute(f"""
+            INSERT INTO table_rebuilds (name, copied_to, copy_until) SELECT ?, 0, COALESCE(MAX(rowid), 0) FROM {table}
+        """, (table,))
+
+    hold(timed_transaction(conn, prepare)[1])
+    new_columns, expressions = column_mapping(conn, table, new, columns)
+    copy = f"""
+        INSERT OR IGNORE INTO {new} ({', '.join(new_columns)})
+        SELECT {', '.join(expressions)} FROM {table} WHERE rowid > ? AND rowid <= ?
+    """
+
+    # 2. Copy in chunks
+    def copy_chunk(conn):
+        copied_to, copy_until = conn.execute(
+            "SELECT copied_to, copy_until FROM table_rebuilds WHERE name = ?", (table,)).fetchone()
+        upper = conn.execute(f"""
+            SELECT MAX(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?)
+        """, (copied_to, copy_until, rows)).fetchone()[0]
+        if upper is None:
+            return 0
+        copied = conn.execute(copy, (copied_to, upper)).rowcount
+        conn.execute("UPDATE table_rebuilds SET copied_to = ? WHERE name = ?", (upper, table))
+        return max(copied, 1)
+
+    rows = 1000
+    while True:
+        copied, elapsed = timed_transaction(conn, copy_chunk)
+        if not copied:
+            break
+        hold(elapsed)
+        stats["rows"] += copied
+        stats["chunks"] += 1
+        rows = next_chunk(rows, elapsed, chunk_ms)
+        time.sleep(pause)
+
+    # 3. Swap; legacy_alter_table stops the renames from rewriting views
+    # and other tables' triggers that refer to the table by name
+    triggers = conn.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'trigger' AND tbl_name = ? AND name NOT LIKE ?
+    """, (table, f"{table}__mirror_%")).fetchall()
+
+    def swap(conn):
+        for action in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}__mirror_{action}")
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.execute(f"ALTER TABLE {table} RENAME TO {retired}")
+        conn.execute(f"ALTER TABLE {new} RENAME TO {table}")
+        for _, sql in triggers:
+            conn.execute(sql)
+        conn.execute("DELETE FROM table_rebuilds WHERE name = ?", (table,))
+
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        _, stats["swap_ms"] = timed_transaction(conn, swap)
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+    hold(stats["swap_ms"])
+
+    stats["index_ms"] = retire_table(conn, retired, indexes, chunk_ms, pause, hold)
+    return stats
+
+
+# Empty a retired table in chunks, drop it and rebuild each copied index
+# under the name the retired table's index had.  Returns the longest index
+# build in milliseconds.
+def retire_table(conn, retired, indexes, chunk_ms=REBUILD_CHUNK_MS, pause=REBUILD_PAUSE, hold=None):
+    def delete_chunk(conn):
+        return conn.execute(f"""
+            DELETE FROM {retired} WHERE rowid IN (SELECT rowid FROM {retired} ORDER BY rowid LIMIT ?)
+        """, (rows,)).rowcount
+
+    rows = 1000
+    while True:
+        deleted, elapsed = timed_transaction(conn, delete_chunk)
+        if hold:
+            hold(elapsed)
+        if not deleted:
+            break
+        rows = next_chunk(rows, elapsed, chunk_ms)
+        time.sleep(pause)
+
+    def drop(conn):
+        conn.execute(f"DROP TABLE IF EXISTS {retired}")
+
+    _, elapsed = timed_transaction(conn, drop)
+    if hold:
+        hold(elapsed)
+
+    # SQLite cannot rename an index, so each one is built again under its
+    # original name (freed by the drop) and the copy dropped, in one
+    # transaction per index.  A build reads the whole table: writers wait
+    # for it (busy_timeout) rather than fail.
+    def rename(conn, name, sql):
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                            (f"{name}__rebuild",)).fetchone():
+            return
+        conn.execute(sql)
+        conn.execute(f"DROP INDEX {name}__rebuild")
+
+    index_ms = 0.0
+    for name, sql in indexes:
+        _, elapsed = timed_transaction(conn, lambda conn: rename(conn, name, sql))
+        index_ms = max(index_ms, elapsed)
+    return index_ms
+
+
+# Older databases (the old main.py / lm_1.py) stored the borrower's name in
+# transactions.user.  Each distinct name becomes a student in users and
+# transactions is rebuilt online with user_id, keeping the transaction ids.
+def migrate_user_names(conn):
+    columns = table_columns(conn, "transactions")
+    if "user" not in columns or "user_id" in columns:
+        return
+    # Read the names first so the write transaction is only the inserts
+    known = {row[0] for row in conn.execute("SELECT name FROM users")}
+    names = [(row[0],) for row in conn.execute("SELECT DISTINCT user FROM transactions") if row[0] not in known]
+    conn.executemany("INSERT INTO users (name, user_type) VALUES (?, 'student')", names)
+    conn.commit()
+
+    kept = ["id", "book_id", "borrow_date", "return_date"] + [
+        column for column in ("overdue_days", "fine_amount") if column in columns]
+    mapping = {column: column for column in kept}
+    mapping["user_id"] = "(SELECT MIN(u.id) FROM users u WHERE u.name = user)"
+    rebuild_table(conn, "transactions", TABLES["transactions"], mapping)
+
+
+MIGRATIONS = [
+    (1, "core tables", create_core_tables),
+    (2, "transactions.user -> user_id", migrate_user_names),
+    (3, "missing columns", add_columns),
+    (4, "secondary indexes", create_indexes),
+    (5, "full-text search", create_search_index),
+    (6, "fine accrual", create_fine_tables),
+    (7, "report summaries", create_report_tables),
+    (8, "patron registry", create_patron_registry),
+    (9, "background jobs", create_job_tables),
+    # Creates the reports_user_type trigger added since version 7
+    (10, "report totals follow user type", create_report_tables),
+    (11, "hold queue", create_hold_tables),
+    (12, "copy inventory", create_copy_inventory),
+    (13, "loan archive", create_archive),
+    (14, "canonical ISBNs", normalize_isbns),
+    # Drops idx_transactions_overdue, unused since version 6
+    (15, "drop the old overdue index", create_fine_tables),
+    # Creates and fills hold_queues, added since version 11
+    (16, "hold queue lengths", create_hold_tables),
+    # Adds job_runs.owner, added since version 9
+    (17, "job run owners", create_job_tables),
+    # Numbers the holds and replaces the hold_queues triggers of version 16
+    (18, "hold queue tickets", create_hold_tables),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# Apply the pending migrations in order; returns their descriptions
+def migrate(conn):
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version <= schema_version(conn):
+            continue
+        fn(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        applied.append(description)
+    return applied
+
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+
+# Bring a database file up to date, once per process
+def ensure_schema(path=None):
+    path = os.path.abspath(path or db.DB_PATH)
+    if path in _migrated:
+        return
+    with _migrated_lock:
+        if path in _migrated:
+            return
+        with db.connection(path) as conn:
+            migrate(conn)
+            # A bulk import killed mid-load leaves the books indexes and the
+            # full-text triggers dropped (library.importer); no-ops otherwise
+            create_indexes(conn)
+            create_search_index(conn)
+        _migrated.add(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema migrations to library.db")
+    parser.add_argument("--db", help="database file (default: LIBRARY_DB or library.db)")
+    parser.add_argument("--status", action="store_true", help="only show the schema version")
+    args = parser.parse_args()
+
+    with db.connection(args.db) as conn:
+        if not args.status:
+            for description in migrate(conn):
+                print(f"applied: {description}")
+        print(f"schema version {schema_version(conn)} of {SCHEMA_VERSION}")
+
+
+if __name__ == "__main__":
+    main()
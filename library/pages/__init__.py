@@ -0,0 +1,39 @@
+# Pages of the app (main.py).  Each page is a module here with a render()
+# function; main.py imports only the page that is selected, so a rerun
+# never loads the code (or PIL, the importer, pyarrow, ...) of the others.
+import importlib
+
+ROLES = ("admin", "user")
+
+# Sidebar label -> (module in library.pages, roles that may open it)
+PAGES = {
+    "Home": ("home", ROLES),
+    "Add Book": ("add_book", ("admin",)),
+    "View Books": ("view_books", ROLES),
+    "Search Book": ("search_book", ROLES),
+    "Borrow Book": ("borrow_book", ROLES),
+    "Return Book": ("return_book", ROLES),
+    "Holds": ("holds", ("admin",)),
+    "Copies": ("copies", ("admin",)),
+    "Batch Circulation": ("batch_circulation", ("admin",)),
+    "Add User": ("add_user", ("admin",)),
+    "View Users": ("view_users", ("admin",)),
+    "View Transactions": ("view_transactions", ("admin",)),
+    "Remove Book": ("remove_book", ("admin",)),
+    "Reports": ("reports", ("admin",)),
+    "Import Books": ("import_books", ("admin",)),
+    "Export Data": ("export_data", ("admin",)),
+    "Cache Stats": ("cache_stats", ("admin",)),
+    "Performance": ("performance", ("admin",)),
+    "Jobs": ("jobs", ("admin",)),
+}
+
+
+# Labels of the pages a role may open, in menu order
+def menu_for(role):
+    return [label for label, (_, roles) in PAGES.items() if role in roles]
+
+
+# Import (once) and return the module of a page
+def load_page(label):
+    return importlib.import_module(f"library.pages.{PAGES[label][0]}")
@@ -0,0 +1,28 @@
+import streamlit as st
+
+from library.catalogue import add_book
+from library.covers import CoverError, submit_cover
+from library.db import connection
+
+
+def render():
+    st.header("📚 Add a New Book")
+    title = st.text_input("Book Title")
+    author = st.text_input("Author")
+    isbn = st.text_input("ISBN")
+    shelf_location = st.text_input("Shelf Location")
+    quantity = st.number_input("Quantity", min_value=1, step=1)
+    book_image = st.file_uploader("Upload Book Cover Image", type=["jpg", "jpeg", "png", "webp"])
+
+    if st.button("Add Book 📖"):
+        cover_key = None
+        if book_image is not None:
+            # Decoded, downscaled and stored with its thumbnails by a worker process
+            try:
+                cover_key = submit_cover(book_image.getvalue()).result()
+            except CoverError as error:
+                st.error(f"{error} ❌")
+                return
+        with connection() as conn:
+            add_book(conn, title, author, isbn, shelf_location, quantity, cover_key)
+        st.success(f"Book '{title}' by {author} added successfully! 📚")
@@ -0,0 +1,20 @@
+import streamlit as st
+
+from library.db import connection
+from library.patrons import PatronError, register_patron
+
+
+# Add User (for Students and Staff)
+def render():
+    st.header("🧑‍🎓 Add a New User")
+    user_name = st.text_input("User Name")
+    user_type = st.selectbox("User Type", ["student", "staff"])
+    card_number = st.text_input("Card Number (leave empty to assign one)")
+
+    if st.button("Add User 👤"):
+        with connection() as conn:
+            try:
+                _, card_number = register_patron(conn, user_name, user_type, card_number)
+                st.success(f"User '{user_name}' added successfully with card {card_number}! 👤")
+            except PatronError as error:
+                st.error(f"{error} ❌")
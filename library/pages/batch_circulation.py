@@ -0,0 +1,48 @@
+import re
+
+import streamlit as st
+
+from library.circulation import borrow_many, return_many
+from library.db import connection
+
+
+# "user_id book_id" per line (comma, tab or space separated, as a scanner
+# or a pasted spreadsheet column pair gives them); returns the
+# (book_id, user_id) items and the lines that could not be read
+def parse_queue(text):
+    items, unreadable = [], []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        fields = re.split(r"[\s,;]+", line.strip())
+        if len(fields) == 2 and all(field.isdigit() for field in fields):
+            items.append((int(fields[1]), int(fields[0])))
+        else:
+            unreadable.append(line)
+    return items, unreadable
+
+
+def render():
+    st.header("🔁 Batch Circulation")
+    mode = st.radio("Mode", ["Borrow", "Return"], horizontal=True)
+    text = st.text_area("Queue: one \"user ID, book ID\" pair per line", height=240)
+    items, unreadable = parse_queue(text)
+    if unreadable:
+        st.warning(f"{len(unreadable)} line(s) skipped, not a user ID and a book ID: {unreadable[:5]}")
+
+    if items and st.button(f"{mode} {len(items)} item(s)"):
+        with connection() as conn:
+            results = borrow_many(conn, items) if mode == "Borrow" else return_many(conn, items)
+        failed = [result for result in results if result["error"]]
+        done = len(results) - len(failed)
+        if mode == "Borrow":
+            st.success(f"{done} book(s) borrowed. 📖")
+        else:
+            fines = sum(result["fine_amount"] or 0 for result in results)
+            st.success(f"{done} book(s) returned. Fines: ${fines} 💰")
+            held = sum(1 for result in results if result["hold_id"])
+            if held:
+                st.info(f"{held} copy(ies) went to holds; keep them at the desk for pickup. 🔖")
+        if failed:
+            st.error(f"{len(failed)} item(s) not processed. ❌")
+            st.dataframe(failed, hide_index=True, width="stretch")
@@ -0,0 +1,34 @@
+import streamlit as st
+
+from library.circulation import CirculationError, borrow_book, borrow_copy
+from library.components import patron_picker
+from library.db import connection
+from library.holds import HoldError, place_hold, queue_position
+
+
+def render():
+    st.header("📚 Borrow a Book")
+    user_id = patron_picker("borrow")
+    book_id = st.number_input("Book ID", min_value=1, step=1)
+    barcode = st.text_input("Copy barcode (scan to lend that copy)").strip()
+
+    borrow_column, hold_column = st.columns(2)
+    if borrow_column.button("Borrow 📖", disabled=user_id is None):
+        with connection() as conn:
+            try:
+                if barcode:
+                    borrow_copy(conn, barcode, user_id)
+                else:
+                    borrow_book(conn, book_id, user_id)
+                st.success("Book borrowed successfully! 📖")
+            except CirculationError as error:
+                st.error(f"{error} Place a hold to be next in line. ❌")
+
+    # Holds are only taken on titles with no copy on the shelf
+    if hold_column.button("Place Hold 🔖", disabled=user_id is None):
+        with connection() as conn:
+            try:
+                hold_id = place_hold(conn, book_id, user_id)
+                st.success(f"Hold placed! Position in queue: {queue_position(conn, hold_id)} 🔖")
+            except HoldError as error:
+                st.error(f"{error} ❌")
@@ -0,0 +1,8 @@
+import streamlit as st
+
+from library.components import cache_stats_panel
+
+
+def render():
+    st.header("⚡ Query Cache")
+    cache_stats_panel()
@@ -0,0 +1,43 @@
+import streamlit as st
+
+from library.copies import CopyError, add_copies, book_copies, withdraw_copy
+from library.db import connection
+
+STATUS_LABELS = {"available": "On the shelf", "on_loan": "On loan", "held": "Kept for a hold",
+                 "withdrawn": "Withdrawn"}
+
+
+def render():
+    st.header("🏷️ Copies")
+    book_id = st.number_input("Book ID", min_value=1, step=1)
+
+    with connection() as conn:
+        copies = book_copies(conn, book_id)
+    if not copies:
+        st.info("This book has no copies.")
+    else:
+        st.dataframe([
+            {"Barcode": barcode, "Status": STATUS_LABELS[status], "Borrower ID": user_id, "Borrowed": borrowed}
+            for barcode, status, user_id, borrowed in copies
+        ], hide_index=True, width="stretch")
+
+    st.subheader("Add copies")
+    barcodes = st.text_area("Barcodes, one per line (leave empty to number them automatically)")
+    count = st.number_input("Copies without a barcode", min_value=0, step=1)
+    if st.button("Add Copies"):
+        with connection() as conn:
+            try:
+                added = add_copies(conn, book_id, count, barcodes.splitlines())
+                st.success(f"{len(added)} copy(ies) added: {', '.join(added)} 🏷️")
+            except CopyError as error:
+                st.error(f"{error} ❌")
+
+    st.subheader("Withdraw a copy")
+    barcode = st.text_input("Barcode of a copy on the shelf")
+    if st.button("Withdraw Copy", disabled=not barcode.strip()):
+        with connection() as conn:
+            try:
+                withdraw_copy(conn, barcode.strip())
+                st.success(f"Copy {barcode.strip()} withdrawn.")
+            except CopyError as error:
+                st.error(f"{error} ❌")
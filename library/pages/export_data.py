@@ -0,0 +1,14 @@
+import streamlit as st
+
+from library.components import snapshot_caption
+from library.exporter import EXPORT_TABLES, FORMATS, export_bytes
+
+
+def render():
+    st.header("Export Data")
+    snapshot_caption()
+    table = st.selectbox("Table", EXPORT_TABLES)
+    file_format = st.selectbox("Format", FORMATS)
+    # The export is only generated when the button is clicked, from the snapshot
+    st.download_button("Download", data=lambda: export_bytes(table, file_format, snapshot=True),
+                       file_name=f"{table}.{file_format}", mime="application/octet-stream")
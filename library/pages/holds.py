@@ -0,0 +1,30 @@
+import streamlit as st
+
+from library.db import connection
+from library.holds import HOLD_PICKUP_DAYS, HoldError, cancel_hold, title_holds
+
+
+def render():
+    st.header("🔖 Holds")
+    book_id = st.number_input("Book ID", min_value=1, step=1)
+
+    with connection() as conn:
+        holds = title_holds(conn, book_id)
+    if not holds:
+        st.info("No active holds on this book.")
+    else:
+        st.caption(f"Ready holds are kept for {HOLD_PICKUP_DAYS} days, then the copy moves down the queue.")
+        st.dataframe([
+            {"Hold ID": hold_id, "User ID": user_id, "Name": name, "Card": card, "Status": status,
+             "Placed": placed, "Ready since": ready}
+            for hold_id, user_id, name, card, status, placed, ready in holds
+        ], hide_index=True, width="stretch")
+
+    hold_id = st.number_input("Hold ID to cancel", min_value=1, step=1)
+    if st.button("Cancel Hold"):
+        with connection() as conn:
+            try:
+                cancel_hold(conn, hold_id)
+                st.success("Hold cancelled. 🔖")
+            except HoldError as error:
+                st.error(f"{error} ❌")
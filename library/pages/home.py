@@ -0,0 +1,9 @@
+import streamlit as st
+
+
+def render():
+    st.header("Welcome to the Library Management System 🌟")
+    st.write("""
+        This system allows you to manage books, track borrowing and returning, and maintain a proper library workflow.
+        Explore the various functionalities using the sidebar. 📚
+    """)
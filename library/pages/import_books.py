@@ -0,0 +1,31 @@
+import os
+import shutil
+import tempfile
+
+import streamlit as st
+
+from library.importer import FORMATS, import_books
+
+
+def render():
+    st.header("📥 Bulk Import Books")
+    upload = st.file_uploader("Catalogue file (CSV, JSONL or MARC-lite)", type=["csv", "jsonl", "ndjson", "mrk", "txt"])
+    file_format = st.selectbox("Format", FORMATS)
+    defer_indexes = st.checkbox("Rebuild indexes at the end (faster for large files)", value=True)
+
+    if upload is not None and st.button("Import 📥"):
+        # Spool the upload to disk so it can be streamed, and resumed if interrupted
+        with tempfile.NamedTemporaryFile(delete=False) as spool:
+            shutil.copyfileobj(upload, spool)
+        status = st.empty()
+
+        def report(counters):
+            status.write(f"{counters['records']} records read, {counters['inserted']} added, "
+                         f"{counters['duplicates']} duplicates, {counters['rejected']} rejected")
+
+        try:
+            counters = import_books(spool.name, file_format, defer_indexes=defer_indexes, progress=report)
+        finally:
+            os.remove(spool.name)
+        st.success(f"Imported {counters['inserted']} books ({counters['duplicates']} duplicate ISBNs skipped, "
+                   f"{counters['rejected']} incomplete records rejected).")
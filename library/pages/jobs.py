@@ -0,0 +1,44 @@
+import streamlit as st
+
+from library.db import connection
+from library.jobs import JOBS, job_history, job_status, request_run, scheduler_running
+
+
+# Interval in the largest whole unit
+def every(seconds):
+    for unit, size in (("d", 86400), ("h", 3600), ("min", 60)):
+        if seconds % size == 0:
+            return f"{seconds // size} {unit}"
+    return f"{seconds} s"
+
+
+def render():
+    st.header("⏱️ Background Jobs")
+    if scheduler_running():
+        st.caption("The scheduler runs due jobs in the background; this page never waits for them.")
+    else:
+        st.warning("The scheduler is not running in this process (LIBRARY_JOBS=0). "
+                   "Run jobs with `python -m library.jobs`.")
+
+    with connection() as conn:
+        status = job_status(conn)
+        history = job_history(conn, limit=50)
+
+    st.dataframe([{"Job": name, "Description": description, "Every": every(interval), "Last Run (UTC)": started_at,
+                   "Runtime (ms)": None if duration_ms is None else round(duration_ms, 1),
+                   "Status": state, "Detail": detail}
+                  for name, description, interval, started_at, duration_ms, state, detail in status],
+                 hide_index=True, width="stretch")
+
+    job_column, button_column = st.columns([3, 1])
+    name = job_column.selectbox("Job", list(JOBS), format_func=lambda name: JOBS[name][0])
+    if button_column.button("Run now", disabled=not scheduler_running()):
+        request_run(name)
+        st.success(f"'{JOBS[name][0]}' will start in the background. Refresh to see its result.")
+
+    st.subheader("Recent Runs")
+    st.dataframe([{"Job": job, "Started (UTC)": started_at,
+                   "Runtime (ms)": None if duration_ms is None else round(duration_ms, 1),
+                   "Status": state, "Detail": detail}
+                  for job, started_at, duration_ms, state, detail in history],
+                 hide_index=True, width="stretch")
@@ -0,0 +1,41 @@
+import streamlit as st
+
+from library import metrics
+
+
+# Rows of metrics.snapshot() as dataframe records
+def timings(rows, label, limit=None):
+    return [{label: name, "Count": count, "Total (ms)": round(total, 1), "p50 (ms)": round(p50, 2),
+             "p95 (ms)": round(p95, 2), "p99 (ms)": round(p99, 2), "Max (ms)": round(longest, 1)}
+            for name, count, total, p50, p95, p99, longest in rows[:limit]]
+
+
+def render():
+    st.header("📈 Performance")
+    if not metrics.ENABLED:
+        st.warning("Statement timing is off in this process (LIBRARY_METRICS=0).")
+    snapshot = metrics.snapshot()
+    st.caption(f"Timings of this server process since {snapshot['since']} (UTC). "
+               f"Percentiles are estimated from histogram buckets.")
+
+    st.subheader("Page Reruns")
+    st.dataframe(timings(snapshot["pages"], "Page"), hide_index=True, width="stretch")
+
+    st.subheader("SQL Statements")
+    st.caption("Time to run each statement up to its first row, most total time first.")
+    st.dataframe(timings(snapshot["statements"], "Statement", limit=100), hide_index=True, width="stretch")
+
+    st.subheader(f"Slow Queries (over {metrics.SLOW_QUERY_MS:g} ms)")
+    if not snapshot["slow"]:
+        st.info("No slow queries logged.")
+    for logged_at, ms, page, sql, plan in snapshot["slow"]:
+        with st.expander(f"{ms:.0f} ms · {page or 'background'} · {logged_at} · {sql[:80]}"):
+            st.code(sql, language="sql")
+            if plan:
+                st.code(plan, language="text")
+
+    reset_column, download_column = st.columns(2)
+    reset_column.button("Reset Timings", on_click=metrics.reset)
+    download_column.download_button("Download Prometheus metrics", metrics.prometheus_text(),
+                                    file_name="library.prom", mime="text/plain")
+    st.caption(f"The metrics job writes the same text to `{metrics.METRICS_FILE}` every minute.")
@@ -0,0 +1,17 @@
+import streamlit as st
+
+from library.catalogue import CatalogueError, remove_book
+from library.db import connection
+
+
+def render():
+    st.header("Remove a Book")
+    book_id = st.number_input("Book ID to Remove", min_value=1)
+
+    if st.button("Remove Book"):
+        with connection() as conn:
+            try:
+                remove_book(conn, book_id)
+                st.success(f"Book with ID {book_id} has been removed.")
+            except CatalogueError as error:
+                st.error(f"{error} ❌")
@@ -0,0 +1,37 @@
+import streamlit as st
+
+from library.components import circulation_dashboard, snapshot_caption
+from library.db import connection
+from library.fines import accrue_fines, overdue_report
+from library.jobs import request_run, scheduler_running
+from library.snapshot import snapshot_connection
+
+
+def render():
+    st.header("📊 Library Reports")
+
+    # Fines are accrued by the background fines job (library.jobs); ask for
+    # a run so the next visit is current, rather than waiting for it here
+    with connection() as conn:
+        if scheduler_running():
+            request_run("fines")
+        else:
+            accrue_fines(conn)
+
+    # The report reads run on the snapshot, never on the database that
+    # borrows and returns write to
+    snapshot_caption()
+    with snapshot_connection() as conn:
+        overdue_books = overdue_report(conn)
+
+    circulation_dashboard()
+
+    # Overdue Books Report
+    if overdue_books:
+        st.subheader("Overdue Books 🕒")
+        st.dataframe(
+            [dict(zip(["Book", "User", "Borrow Date", "Due Date", "Return Date", "Overdue Days", "Fine"], record))
+             for record in overdue_books],
+            hide_index=True, width="stretch")
+    else:
+        st.write("No overdue books at the moment. 🕒❌")
@@ -0,0 +1,32 @@
+import streamlit as st
+
+from library.circulation import CirculationError, return_book, return_copy
+from library.components import patron_picker
+from library.db import connection
+from library.holds import title_holds
+
+
+def render():
+    st.header("📚 Return a Book")
+    barcode = st.text_input("Copy barcode (scan to return that copy)").strip()
+    user_id = book_id = None
+    if not barcode:
+        user_id = patron_picker("return")
+        book_id = st.number_input("Book ID", min_value=1, step=1)
+
+    if st.button("Return 📚", disabled=not barcode and user_id is None):
+        with connection() as conn:
+            try:
+                if barcode:
+                    book_id, fine_amount = return_copy(conn, barcode)
+                else:
+                    fine_amount = return_book(conn, book_id, user_id)
+                st.success(f"Book returned successfully! Fine: ${fine_amount} 💰")
+                ready = [hold for hold in title_holds(conn, book_id) if hold[4] == "ready"]
+            except CirculationError as error:
+                st.error(f"{error} ❌")
+                return
+        # Copies kept for holds stay at the desk instead of going on the shelf
+        if ready:
+            st.info("Keep this title at the desk for pickup: "
+                    + ", ".join(f"{name} ({card})" for _, _, name, card, *_ in ready) + " 🔖")
@@ -0,0 +1,24 @@
+import streamlit as st
+
+from library.db import connection
+from library.search import search_books
+
+
+def render():
+    st.header("🔍 Search for a Book")
+    search_title = st.text_input("Search by Title")
+    search_author = st.text_input("Search by Author")
+    search_isbn = st.text_input("Search by ISBN")
+    page = st.number_input("Page", min_value=1, step=1)
+
+    with connection() as conn:
+        books, has_more = search_books(conn, search_title, search_author, search_isbn, page=page - 1)
+
+    if books:
+        for book in books:
+            st.write(
+                f"**ID**: {book[0]}, **Title**: {book[1]}, **Author**: {book[2]}, **ISBN**: {book[3]}, **Shelf**: {book[4]}, **Quantity**: {book[5]}")
+        if has_more:
+            st.caption("More results on the next page.")
+    else:
+        st.write("No books found matching the search criteria. 📚❌")
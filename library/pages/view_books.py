@@ -0,0 +1,20 @@
+import streamlit as st
+
+from library.catalogue import BOOK_COLUMNS, BOOK_LABELS, BOOK_SORT_KEYS
+from library.components import paginated_table
+from library.covers import cover_path, thumbnail_path
+
+
+def render():
+    st.header("Available Books 📚")
+    books = paginated_table("books", "books", BOOK_COLUMNS, BOOK_LABELS, BOOK_SORT_KEYS)
+
+    if books:
+        covered = [book for book in books if book[6]]
+        if covered:
+            book = st.selectbox("Show cover", covered, format_func=lambda book: f"{book[0]}: {book[1]}")
+            st.image(thumbnail_path(book[6], 320), caption=book[1])
+            if st.checkbox("Full size"):
+                st.image(cover_path(book[6]), caption=book[1], width="stretch")
+    else:
+        st.write("No books available in the library. 📚❌")
@@ -0,0 +1,14 @@
+import streamlit as st
+
+from library.catalogue import TRANSACTION_COLUMNS, TRANSACTION_LABELS, TRANSACTION_SORT_KEYS
+from library.components import paginated_table, snapshot_caption
+
+
+def render():
+    st.header("All Transactions")
+    snapshot_caption()
+    transactions = paginated_table("transactions", "transaction_history", TRANSACTION_COLUMNS, TRANSACTION_LABELS,
+                                   TRANSACTION_SORT_KEYS, snapshot=True)
+
+    if not transactions:
+        st.write("No transactions yet.")
@@ -0,0 +1,12 @@
+import streamlit as st
+
+from library.catalogue import USER_COLUMNS, USER_LABELS, USER_SORT_KEYS
+from library.components import paginated_table
+
+
+def render():
+    st.header("View Users")
+    users = paginated_table("users", "users", USER_COLUMNS, USER_LABELS, USER_SORT_KEYS)
+
+    if not users:
+        st.write("No users found.")
@@ -0,0 +1,121 @@
+# Patron registry: every user has a unique library card number and a
+# normalized name key (lower-cased, trimmed), both indexed, so resolving
+# the card or name typed or scanned at the desk is an index seek however
+# many patrons there are.  Resolutions are kept in their own LRU
+# (PATRON_CACHE), invalidated like every cached read by bump("users").
+import re
+import sqlite3
+
+from library.cache import QueryCache, bump, cached
+
+# Card numbers given to patrons registered without one: P + 7-digit user id
+AUTO_CARD_FORMAT = "P%07d"
+AUTO_CARD_PATTERN = re.compile(r"^P\d{7}$")
+
+# Resolved cards/names kept per process; separate from the page cache so
+# a queue of lookups at the desk never evicts the listing pages
+PATRON_CACHE_SIZE = 10_000
+PATRON_CACHE = QueryCache(size=PATRON_CACHE_SIZE)
+
+# Suggestions shown while typing a name or card number
+SUGGESTIONS = 10
+
+PATRON_COLUMNS = "id, name, user_type, card_number"
+
+PATRON_SCHEMA = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_card_number ON users(card_number)",
+    "CREATE INDEX IF NOT EXISTS idx_users_name_key ON users(name_key)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_card_number AFTER INSERT ON users WHEN new.card_number IS NULL BEGIN
+        UPDATE users SET card_number = printf('{AUTO_CARD_FORMAT}', new.id) WHERE id = new.id;
+    END
+    """,
+]
+
+
+# Raised when a patron cannot be registered
+class PatronError(Exception):
+    pass
+
+
+# Add the card number and name key to users, give every existing user a
+# card, and create the indexes and the card-assigning trigger
+def create_patron_registry(conn):
+    # table_xinfo, unlike table_info, lists generated columns
+    columns = {row[1] for row in conn.execute("PRAGMA table_xinfo(users)")}
+    if "card_number" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN card_number TEXT")
+    if "name_key" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN name_key TEXT GENERATED ALWAYS AS (lower(trim(name))) VIRTUAL")
+    conn.execute(f"UPDATE users SET card_number = printf('{AUTO_CARD_FORMAT}', id) WHERE card_number IS NULL")
+    for statement in PATRON_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+# Register a patron; returns (user id, card number).  Without a card number
+# the patron gets the automatic one.
+def register_patron(conn, name, user_type, card_number=None):
+    name, card_number = name.strip(), (card_number or "").strip() or None
+    if not name:
+        raise PatronError("A name is required.")
+    if card_number and AUTO_CARD_PATTERN.match(card_number):
+        raise PatronError(f"Card numbers of the form {AUTO_CARD_FORMAT % 1234567} are assigned automatically.")
+    try:
+        cursor = conn.execute("INSERT INTO users (name, user_type, card_number) VALUES (?, ?, ?)",
+                              (name, user_type, card_number))
+        user_id = cursor.lastrowid
+        card_number = conn.execute("SELECT card_number FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+        conn.commit()
+    except sqlite3.IntegrityError as error:
+        conn.rollback()
+        if "card_number" in str(error):
+            raise PatronError(f"Card number {card_number} is already in use.")
+        raise PatronError(str(error))
+    bump("users")
+    return user_id, card_number
+
+
+# Patron lookups (also checked by benchmarks.query_plans)
+PATRON_BY_CARD = f"SELECT {PATRON_COLUMNS} FROM users WHERE card_number = ?"
+PATRON_BY_NAME = f"SELECT {PATRON_COLUMNS} FROM users WHERE name_key = lower(trim(?)) ORDER BY id LIMIT ?"
+# Name or card number starting with ?1, as index range scans (char(1114111)
+# sorts after any character)
+PATRON_PREFIX = f"""
+    SELECT * FROM (
+        SELECT {PATRON_COLUMNS} FROM users
+        WHERE card_number >= ?1 AND card_number < ?1 || char(1114111)
+        ORDER BY card_number LIMIT ?2
+    )
+    UNION
+    SELECT * FROM (
+        SELECT {PATRON_COLUMNS} FROM users
+        WHERE name_key >= lower(?1) AND name_key < lower(?1) || char(1114111)
+        ORDER BY name_key LIMIT ?2
+    )
+    ORDER BY 2, 1 LIMIT ?2
+"""
+
+
+# Patrons matching a scanned card number exactly, or else a name exactly
+# (ignoring case and surrounding spaces); several when a name is shared
+@cached("users", cache=PATRON_CACHE)
+def find_patrons(conn, text, limit=SUGGESTIONS):
+    text = text.strip()
+    return (conn.execute(PATRON_BY_CARD, (text,)).fetchall()
+            or conn.execute(PATRON_BY_NAME, (text, limit)).fetchall())
+
+
+# Typeahead: patrons whose name or card number starts with `prefix`
+@cached("users", cache=PATRON_CACHE)
+def suggest_patrons(conn, prefix, limit=SUGGESTIONS):
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    return conn.execute(PATRON_PREFIX, (prefix, limit)).fetchall()
+
+
+# One-line label of a patron row
+def patron_label(row):
+    user_id, name, user_type, card_number = row
+    return f"{name} ({user_type}) · card {card_number} · ID {user_id}"
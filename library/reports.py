@@ -0,0 +1,253 @@
+# Circulation statistics for the Reports dashboards.
+#
+# The dashboards never read transactions directly.  Triggers keep small
+# summary tables in step with every loan and with overdue_loans
+# (library.fines), so each chart is a read of a few hundred rows at most:
+#   loans_daily     loans and returns per day (weeks are summed from days)
+#   title_loans     loans per book, indexed for the most-borrowed list
+#   borrower_loans  open loans per user, to know when a borrower becomes active
+#   borrower_types  active borrowers and open loans per user_type
+#   fine_totals     overdue loans and fines per user_type
+# rebuild_reports() recomputes everything from scratch; the nightly reports
+# job (library.jobs) only prunes borrower_loans rows that dropped to zero.
+from datetime import date, timedelta
+
+from library.cache import cached
+from library.schema import table_columns
+
+REPORT_TABLES = ["loans_daily", "title_loans", "borrower_loans", "borrower_types", "fine_totals"]
+
+REPORT_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS loans_daily (
+        day TEXT PRIMARY KEY,
+        loans INTEGER NOT NULL DEFAULT 0,
+        returns INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS title_loans (book_id INTEGER PRIMARY KEY, loans INTEGER NOT NULL DEFAULT 0)",
+    "CREATE INDEX IF NOT EXISTS idx_title_loans_loans ON title_loans(loans)",
+    "CREATE TABLE IF NOT EXISTS borrower_loans (user_id INTEGER PRIMARY KEY, open_loans INTEGER NOT NULL DEFAULT 0)",
+    """
+    CREATE TABLE IF NOT EXISTS borrower_types (
+        user_type TEXT PRIMARY KEY,
+        borrowers INTEGER NOT NULL DEFAULT 0,
+        open_loans INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fine_totals (
+        user_type TEXT PRIMARY KEY,
+        overdue_loans INTEGER NOT NULL DEFAULT 0,
+        fines REAL NOT NULL DEFAULT 0,
+        outstanding REAL NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+
+# Trigger statements adding (sign=1) or removing (sign=-1) one loan row
+def loan_effects(row, sign):
+    user_type = f"(SELECT user_type FROM users WHERE id = {row}.user_id)"
+    # A borrower turns active with their first open loan and inactive after the last
+    threshold = 0 if sign > 0 else 1
+    return f"""
+        INSERT INTO loans_daily (day, loans) VALUES ({row}.borrow_date, {sign})
+            ON CONFLICT (day) DO UPDATE SET loans = loans + {sign};
+        INSERT INTO loans_daily (day, returns) SELECT {row}.return_date, {sign} WHERE {row}.return_date IS NOT NULL
+            ON CONFLICT (day) DO UPDATE SET returns = returns + {sign};
+        INSERT INTO title_loans (book_id, loans) VALUES ({row}.book_id, {sign})
+            ON CONFLICT (book_id) DO UPDATE SET loans = loans + {sign};
+        INSERT OR IGNORE INTO borrower_types (user_type) SELECT {user_type}
+            WHERE {row}.return_date IS NULL AND {user_type} IS NOT NULL;
+        UPDATE borrower_types SET
+            open_loans = open_loans + {sign},
+            borrowers = borrowers + {sign} * (
+                COALESCE((SELECT open_loans FROM borrower_loans WHERE user_id = {row}.user_id), 0) = {threshold})
+        WHERE {row}.return_date IS NULL AND user_type = {user_type};
+        INSERT INTO borrower_loans (user_id, open_loans) SELECT {row}.user_id, {sign} WHERE {row}.return_date IS NULL
+            ON CONFLICT (user_id) DO UPDATE SET open_loans = open_loans + {sign};
+    """
+
+
+# Trigger statements adding or removing one overdue_loans row
+def fine_effects(row, sign):
+    return f"""
+        INSERT INTO fine_totals (user_type, overdue_loans, fines, outstanding)
+        SELECT COALESCE((SELECT user_type FROM users WHERE id = {row}.user_id), ''), {sign},
+               {sign} * {row}.fine_amount, {sign} * {row}.fine_amount * ({row}.return_date IS NULL)
+        WHERE 1
+        ON CONFLICT (user_type) DO UPDATE SET
+            overdue_loans = overdue_loans + excluded.overdue_loans,
+            fines = fines + excluded.fines,
+            outstanding = outstanding + excluded.outstanding;
+    """
+
+
+REPORT_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reports_loan_insert AFTER INSERT ON transactions BEGIN
+        {loan_effects("new", 1)}
+    END
+    """,
+    # Loans moved to the archive (library.archive) still count
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reports_loan_delete AFTER DELETE ON transactions
+    WHEN NOT EXISTS (SELECT 1 FROM archive_moves WHERE id = old.id) BEGIN
+        {loan_effects("old", -1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reports_loan_update
+    AFTER UPDATE OF book_id, user_id, borrow_date, return_date ON transactions BEGIN
+        {loan_effects("old", -1)}
+        {loan_effects("new", 1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reports_fine_insert AFTER INSERT ON overdue_loans BEGIN
+        {fine_effects("new", 1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reports_fine_delete AFTER DELETE ON overdue_loans BEGIN
+        {fine_effects("old", -1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reports_fine_update AFTER UPDATE ON overdue_loans BEGIN
+        {fine_effects("old", -1)}
+        {fine_effects("new", 1)}
+    END
+    """,
+    # Move a user's open loans and fines to their new type's totals
+    """
+    CREATE TRIGGER IF NOT EXISTS reports_user_type AFTER UPDATE OF user_type ON users
+    WHEN old.user_type IS NOT new.user_type BEGIN
+        UPDATE borrower_types SET borrowers = borrowers - 1, open_loans = borrower_types.open_loans - b.open_loans
+        FROM borrower_loans b
+        WHERE b.user_id = new.id AND b.open_loans > 0 AND borrower_types.user_type = old.user_type;
+        INSERT INTO borrower_types (user_type, borrowers, open_loans)
+        SELECT new.user_type, 1, open_loans FROM borrower_loans WHERE user_id = new.id AND open_loans > 0
+        ON CONFLICT (user_type) DO UPDATE SET
+            borrowers = borrowers + 1, open_loans = open_loans + excluded.open_loans;
+        INSERT INTO fine_totals (user_type, overdue_loans, fines, outstanding)
+        SELECT side.user_type, side.sign * COUNT(*), side.sign * TOTAL(o.fine_amount),
+               side.sign * TOTAL(o.fine_amount * (o.return_date IS NULL))
+        FROM overdue_loans o, (SELECT old.user_type AS user_type, -1 AS sign
+                               UNION ALL SELECT new.user_type, 1) AS side
+        WHERE o.user_id = new.id
+        GROUP BY side.user_type, side.sign
+        ON CONFLICT (user_type) DO UPDATE SET
+            overdue_loans = overdue_loans + excluded.overdue_loans,
+            fines = fines + excluded.fines,
+            outstanding = outstanding + excluded.outstanding;
+    END
+    """,
+]
+
+
+# Create the summary tables and triggers; the first time, fill them from
+# the existing history.  Needs the user_id schema and library.fines tables.
+def create_report_tables(conn):
+    if "user_id" not in table_columns(conn, "transactions"):
+        return
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'loans_daily'").fetchone()
+    for statement in REPORT_SCHEMA + REPORT_TRIGGERS:
+        conn.execute(statement)
+    if not exists:
+        rebuild_reports(conn)
+    conn.commit()
+
+
+# Recompute every summary table with one grouped pass per table, over the
+# archived loans too once there is an archive (library.archive)
+def rebuild_reports(conn):
+    for table in REPORT_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+    history = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'transaction_history'").fetchone()
+    source = "transaction_history" if history else "transactions"
+    conn.execute(f"""
+        INSERT INTO loans_daily (day, loans, returns)
+        SELECT day, SUM(loans), SUM(returns) FROM (
+            SELECT borrow_date AS day, COUNT(*) AS loans, 0 AS returns FROM {source}
+            WHERE borrow_date IS NOT NULL GROUP BY borrow_date
+            UNION ALL
+            SELECT return_date, 0, COUNT(*) FROM {source}
+            WHERE return_date IS NOT NULL GROUP BY return_date
+        ) GROUP BY day
+    """)
+    conn.execute(f"INSERT INTO title_loans (book_id, loans) SELECT book_id, COUNT(*) FROM {source} GROUP BY book_id")
+    conn.execute("""
+        INSERT INTO borrower_loans (user_id, open_loans)
+        SELECT user_id, COUNT(*) FROM transactions WHERE return_date IS NULL GROUP BY user_id
+    """)
+    group_type_totals(conn)
+
+
+# Fill borrower_types and fine_totals from borrower_loans and overdue_loans
+def group_type_totals(conn):
+    conn.execute("""
+        INSERT INTO borrower_types (user_type, borrowers, open_loans)
+        SELECT u.user_type, COUNT(*), SUM(b.open_loans)
+        FROM borrower_loans b JOIN users u ON u.id = b.user_id
+        GROUP BY u.user_type
+    """)
+    conn.execute("""
+        INSERT INTO fine_totals (user_type, overdue_loans, fines, outstanding)
+        SELECT COALESCE(u.user_type, ''), COUNT(*), SUM(o.fine_amount),
+               SUM(CASE WHEN o.return_date IS NULL THEN o.fine_amount ELSE 0 END)
+        FROM overdue_loans o LEFT JOIN users u ON u.id = o.user_id
+        GROUP BY COALESCE(u.user_type, '')
+    """)
+
+
+# Delete up to `limit` borrower_loans rows of borrowers with no open loan
+# left; returns how many were deleted
+def prune_borrower_loans(conn, limit=5000):
+    return conn.execute("""
+        DELETE FROM borrower_loans WHERE user_id IN (SELECT user_id FROM borrower_loans WHERE open_loans = 0 LIMIT ?)
+    """, (limit,)).rowcount
+
+
+# Loans and returns per day for the last `days` days
+@cached("transactions")
+def loans_per_day(conn, days=90, today=None):
+    start = ((today or date.today()) - timedelta(days=days)).isoformat()
+    return conn.execute(
+        "SELECT day, loans, returns FROM loans_daily WHERE day > ? ORDER BY day", (start,)).fetchall()
+
+
+# Loans and returns per week (Monday first) for the last `weeks` weeks
+@cached("transactions")
+def loans_per_week(conn, weeks=26, today=None):
+    start = ((today or date.today()) - timedelta(weeks=weeks)).isoformat()
+    return conn.execute("""
+        SELECT date(day, 'weekday 0', '-6 days') AS week, SUM(loans), SUM(returns)
+        FROM loans_daily WHERE day > ?
+        GROUP BY week ORDER BY week
+    """, (start,)).fetchall()
+
+
+# Most-borrowed titles, most loans first
+@cached("transactions", "books")
+def top_titles(conn, limit=10):
+    return conn.execute("""
+        SELECT b.title, b.author, t.loans
+        FROM title_loans t JOIN books b ON b.id = t.book_id
+        ORDER BY t.loans DESC LIMIT ?
+    """, (limit,)).fetchall()
+
+
+# Active borrowers (users with an open loan) and their open loans per user_type
+@cached("transactions", "users")
+def active_borrowers(conn):
+    return conn.execute(
+        "SELECT user_type, borrowers, open_loans FROM borrower_types ORDER BY user_type").fetchall()
+
+
+# Overdue loans, fines charged and fines outstanding on open loans per user_type
+@cached("overdue_loans", "users")
+def fine_totals(conn):
+    return conn.execute(
+        "SELECT user_type, overdue_loans, fines, outstanding FROM fine_totals ORDER BY user_type").fetchall()
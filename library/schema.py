@@ -0,0 +1,75 @@
+import re
+
+# Columns added to tables created by older versions of the pages
+COLUMNS = [
+    # Catalogue details missing from the oldest books table
+    ("books", "isbn", "TEXT"),
+    ("books", "shelf_location", "TEXT"),
+    # Key into the cover store (library.covers); replaces the books.image BLOB
+    ("books", "cover_key", "TEXT"),
+    # Fine charged on return (library.fines)
+    ("transactions", "overdue_days", "INTEGER DEFAULT 0"),
+    ("transactions", "fine_amount", "REAL DEFAULT 0.0"),
+]
+
+# Secondary indexes for the hot lookups.  Each entry names the table and
+# columns it needs so the same list works for every page's schema variant.
+INDEXES = [
+    # Open-loan lookup in Return Book: book_id = ? AND user_id = ? AND return_date IS NULL
+    ("transactions", ("book_id", "user_id", "return_date"), """
+        CREATE INDEX IF NOT EXISTS idx_transactions_open_loan
+        ON transactions(book_id, user_id) WHERE return_date IS NULL
+    """),
+    # ISBN exact-match fast path in Search Book
+    ("books", ("isbn",), """
+        CREATE INDEX IF NOT EXISTS idx_books_isbn ON books(isbn)
+    """),
+    # Keyset pagination of View Books by title, author or quantity
+    ("books", ("title",), """
+        CREATE INDEX IF NOT EXISTS idx_books_title ON books(title)
+    """),
+    ("books", ("author",), """
+        CREATE INDEX IF NOT EXISTS idx_books_author ON books(author)
+    """),
+    ("books", ("quantity",), """
+        CREATE INDEX IF NOT EXISTS idx_books_quantity ON books(quantity)
+    """),
+    # User lookup in Borrow Book (name, user_type) and Return Book (name)
+    ("users", ("name", "user_type"), """
+        CREATE INDEX IF NOT EXISTS idx_users_name_type ON users(name, user_type)
+    """),
+    # Keyset pagination of View Users by name
+    ("users", ("name",), """
+        CREATE INDEX IF NOT EXISTS idx_users_name ON users(name)
+    """),
+]
+
+
+# Names of the secondary indexes defined on a table
+def index_names(table):
+    return [re.search(r"EXISTS\s+(\w+)", sql).group(1) for index_table, _, sql in INDEXES if index_table == table]
+
+
+# Column names of a table (empty when the table does not exist)
+def table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+# Add any missing columns to existing tables
+def add_columns(conn):
+    for table, column, definition in COLUMNS:
+        existing = table_columns(conn, table)
+        if existing and column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    conn.commit()
+
+
+# Create the secondary indexes that apply to the current schema
+def create_indexes(conn):
+    columns = {}
+    for table, needed, sql in INDEXES:
+        if table not in columns:
+            columns[table] = table_columns(conn, table)
+        if set(needed) <= columns[table]:
+            conn.execute(sql)
+    conn.commit()
@@ -0,0 +1,100 @@
+import re
+
+from library.cache import cached
+from library.catalogue import normalize_isbn
+
+# Results shown per page of "Search Book"
+SEARCH_PAGE_SIZE = 25
+
+BOOK_COLUMNS = "b.id, b.title, b.author, b.isbn, b.shelf_location, b.quantity"
+
+# Word characters as the unicode61 tokenizer sees them (underscore separates)
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# External-content FTS5 index over books, kept in sync by triggers.
+# prefix='2 3' adds prefix indexes so short "typing" queries stay fast.
+SEARCH_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END
+    """,
+]
+
+
+SEARCH_OBJECTS = ("books_fts", "books_fts_insert", "books_fts_delete", "books_fts_update")
+
+
+# Create the full-text index and its triggers, or whichever of them is
+# missing; the index is then rebuilt from the catalogue, since books
+# written while a trigger was missing are not in it
+def create_search_index(conn):
+    present = conn.execute(f"""
+        SELECT COUNT(*) FROM sqlite_master WHERE name IN ({", ".join("?" * len(SEARCH_OBJECTS))})
+    """, SEARCH_OBJECTS).fetchone()[0]
+    if present == len(SEARCH_OBJECTS):
+        return
+    for statement in SEARCH_SCHEMA:
+        conn.execute(statement)
+    rebuild_search_index(conn)
+    conn.commit()
+
+
+# Re-index every book (after bulk loads or if the index is ever suspect)
+def rebuild_search_index(conn):
+    conn.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+
+# FTS5 query matching every word of the title and author inputs as a prefix
+def match_expression(title="", author=""):
+    terms = []
+    for column, text in (("title", title), ("author", author)):
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            terms.append(f'{column}:"{token}"*')
+    return " AND ".join(terms)
+
+
+# One page of search results and whether another page follows.
+# An ISBN is an exact-match lookup; otherwise words are ranked with BM25.
+@cached("books")
+def search_books(conn, title="", author="", isbn="", page=0, page_size=SEARCH_PAGE_SIZE):
+    limit, offset = page_size + 1, page * page_size
+    isbn = normalize_isbn(isbn)
+    expression = match_expression(title, author)
+
+    if isbn:
+        rows = conn.execute(f"""
+            SELECT {BOOK_COLUMNS} FROM books b WHERE b.isbn = ?
+            ORDER BY b.id LIMIT ? OFFSET ?
+        """, (isbn, limit, offset)).fetchall()
+    elif expression:
+        rows = conn.execute(f"""
+            SELECT {BOOK_COLUMNS} FROM books_fts
+            JOIN books b ON b.id = books_fts.rowid
+            WHERE books_fts MATCH ?
+            ORDER BY bm25(books_fts) LIMIT ? OFFSET ?
+        """, (expression, limit, offset)).fetchall()
+    else:
+        rows = conn.execute(f"""
+            SELECT {BOOK_COLUMNS} FROM books b ORDER BY b.id LIMIT ? OFFSET ?
+        """, (limit, offset)).fetchall()
+
+    return rows[:page_size], len(rows) > page_size
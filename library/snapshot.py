@@ -0,0 +1,127 @@
+# Read-only snapshot of the database for reports and exports.
+#
+# refresh_snapshot() copies the database with the online backup API,
+# SNAPSHOT_PAGES pages per step with a short pause between steps, to
+# library-snapshot.db next to it.  The whole copy runs inside one read
+# transaction on the source.  Under WAL a reader never takes the write
+# lock, so borrows and returns commit all through it, and every step copies
+# the same version of the database; without the read transaction, each
+# write by another connection restarts the backup from the first page, and
+# under steady circulation it never finishes.  The copy is written beside
+# the snapshot and renamed over it, so readers see the old snapshot or the
+# new one, never half of each.
+#
+# The Reports, View Transactions and Export Data pages read the snapshot
+# (snapshot_connection()); the snapshot job refreshes it every
+# SNAPSHOT_INTERVAL seconds.  From a shell:
+#
+#   python -m library.snapshot [--db library.db]
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from library import db, metrics
+from library.cache import bump
+
+# Pages copied per backup step (4 MiB of 4 KiB pages) and seconds to pause
+# between steps
+SNAPSHOT_PAGES = 1000
+SNAPSHOT_PAUSE = 0.005
+
+# Seconds between refreshes by the snapshot job
+SNAPSHOT_INTERVAL = 15 * 60
+
+SNAPSHOT_INFO = "CREATE TABLE snapshot_info (taken_at TEXT NOT NULL, pages INTEGER NOT NULL, copy_ms REAL NOT NULL)"
+
+_refresh_lock = threading.Lock()
+
+
+# The snapshot file of a database: library.db -> library-snapshot.db
+def snapshot_path(path=None):
+    base, extension = os.path.splitext(os.path.abspath(path or db.DB_PATH))
+    return f"{base}-snapshot{extension or '.db'}"
+
+
+# Copy the database `conn` is open on to its snapshot; returns
+# (taken_at, pages, copy_ms).  conn must not be in a transaction.
+def refresh_snapshot(conn, pages=SNAPSHOT_PAGES, pause=SNAPSHOT_PAUSE):
+    source = conn.execute("PRAGMA database_list").fetchone()[2]
+    target = snapshot_path(source)
+    partial = f"{target}.{os.getpid()}.partial"
+    with _refresh_lock:
+        for leftover in (partial, f"{partial}-journal"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        copy = sqlite3.connect(partial)
+        try:
+            start = time.perf_counter()
+            # Pin one version of the database for every step of the copy
+            conn.execute("BEGIN")
+            conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+            taken_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            try:
+                conn.backup(copy, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+            finally:
+                conn.rollback()
+            copy_ms = (time.perf_counter() - start) * 1000
+            # A rollback journal, so read-only connections need no -wal or -shm file
+            copy.execute("PRAGMA journal_mode = DELETE")
+            copied = copy.execute("PRAGMA page_count").fetchone()[0]
+            copy.execute(SNAPSHOT_INFO)
+            copy.execute("INSERT INTO snapshot_info VALUES (?, ?, ?)", (taken_at, copied, copy_ms))
+            copy.commit()
+        finally:
+            copy.close()
+        os.replace(partial, target)
+    # Cache keys ignore the connection: cached reads of the snapshot must
+    # see the new copy (every one of them names one of these tables)
+    bump("transactions", "overdue_loans")
+    return taken_at, copied, copy_ms
+
+
+# Read-only connection to the snapshot of a database (taken first if there
+# is none yet), closed at the end of the with-block.  A new connection each
+# time, so it always opens the latest copy.
+@contextmanager
+def snapshot_connection(path=None):
+    target = snapshot_path(path)
+    if not os.path.exists(target):
+        with db.connection(path) as conn:
+            refresh_snapshot(conn)
+    conn = sqlite3.connect(f"file:{target}?mode=ro", uri=True, check_same_thread=False,
+                           factory=metrics.TimedConnection if metrics.ENABLED else sqlite3.Connection)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# (taken_at, pages, copy_ms) of the current snapshot, or None
+def snapshot_info(path=None):
+    if not os.path.exists(snapshot_path(path)):
+        return None
+    with snapshot_connection(path) as conn:
+        return conn.execute("SELECT taken_at, pages, copy_ms FROM snapshot_info").fetchone()
+
+
+# Seconds since the snapshot was taken
+def snapshot_age(taken_at):
+    return (datetime.now(timezone.utc) - datetime.fromisoformat(taken_at)).total_seconds()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the read-only report snapshot of library.db")
+    parser.add_argument("--db", help="database file (default: LIBRARY_DB or library.db)")
+    args = parser.parse_args()
+
+    with db.connection(args.db) as conn:
+        taken_at, pages, copy_ms = refresh_snapshot(conn)
+    print(f"{snapshot_path(args.db)}: {pages} pages as of {taken_at}, copied in {copy_ms / 1000:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Export Data downloads: the page's deferred callable returns data that
+# Streamlit can serve, read from the snapshot rather than the live
+# database, in memory bounded by the export itself
+import csv
+import io
+import tracemalloc
+
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+from benchmarks.common import seed
+from benchmarks.export_memory import fill_transactions
+from library import db
+from library.pages import export_data
+from library.snapshot import refresh_snapshot
+
+ROWS = 200_000
+
+
+@pytest.fixture
+def library_db(tmp_path, monkeypatch):
+    path = seed(str(tmp_path / "library.db"), books=1000, users=100)
+    fill_transactions(path, ROWS)
+    monkeypatch.setattr(db, "DB_PATH", path)
+    yield path
+    db.close_pools()
+
+
+# The data callable the page hands to st.download_button for table/format
+def page_callable(monkeypatch, table, file_format):
+    choices = iter([table, file_format])
+    captured = {}
+    monkeypatch.setattr(export_data, "snapshot_caption", lambda: None)
+    monkeypatch.setattr(export_data.st, "header", lambda *args, **kwargs: None)
+    monkeypatch.setattr(export_data.st, "selectbox", lambda *args, **kwargs: next(choices))
+    monkeypatch.setattr(export_data.st, "download_button", lambda *args, **kwargs: captured.update(kwargs))
+    export_data.render()
+    return captured["data"]
+
+
+# Run the callable the way Streamlit does when the button is clicked
+def download(data):
+    data_as_bytes, _ = convert_data_to_bytes_and_infer_mime(data(), unsupported_error=TypeError("unsupported"))
+    return data_as_bytes
+
+
+def test_download_is_servable_and_bounded(library_db, monkeypatch):
+    data = page_callable(monkeypatch, "transactions", "csv")
+    download(page_callable(monkeypatch, "users", "csv"))  # takes the snapshot, warms up imports
+
+    tracemalloc.start()
+    data_as_bytes = download(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rows = list(csv.reader(io.StringIO(data_as_bytes.decode())))
+    assert rows[0][:3] == ["id", "book_id", "user_id"]
+    assert len(rows) == ROWS + 1
+    # The bytes themselves plus a few batches, never the rows as objects
+    assert peak < len(data_as_bytes) + (8 << 20)
+
+
+@pytest.mark.parametrize("file_format", ["jsonl", "parquet"])
+def test_other_formats_are_servable(library_db, monkeypatch, file_format):
+    if file_format == "parquet":
+        pytest.importorskip("pyarrow")
+    data_as_bytes = download(page_callable(monkeypatch, "users", file_format))
+    assert data_as_bytes
+
+
+def test_download_reads_the_snapshot(library_db, monkeypatch):
+    data = page_callable(monkeypatch, "users", "csv")
+    before = download(data)
+    with db.connection() as conn:
+        conn.execute("INSERT INTO users (name, user_type) VALUES ('Added After The Snapshot', 'student')")
+        conn.commit()
+        assert b"Added After The Snapshot" not in download(data)
+        assert download(data) == before
+        refresh_snapshot(conn)
+    assert b"Added After The Snapshot" in download(data)
@@ -0,0 +1,73 @@
+# Queue positions stay equal to a count of the holds ahead as holds are
+# placed, served, cancelled from the middle and put back to waiting
+import random
+
+import pytest
+
+from benchmarks.common import seed
+from library import db
+from library.circulation import borrow_book, return_book
+from library.holds import cancel_hold, create_hold_tables, place_hold, queue_position
+from library.migrations import ensure_schema
+
+BOOK = 1
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = seed(str(tmp_path / "library.db"), books=2, users=200, quantity=1)
+    ensure_schema(path)
+    with db.connection(path) as conn:
+        yield conn
+    db.close_pools()
+
+
+# Every waiting hold's position, counted the slow way
+def counted_positions(conn):
+    queue = conn.execute("SELECT id FROM holds WHERE book_id = ? AND status = 'waiting' ORDER BY priority, id",
+                         (BOOK,)).fetchall()
+    return {hold_id: position for position, (hold_id,) in enumerate(queue, start=1)}
+
+
+def positions(conn):
+    return {hold_id: queue_position(conn, hold_id) for hold_id in counted_positions(conn)}
+
+
+def test_positions_follow_the_queue(conn):
+    rng = random.Random(3)
+    borrow_book(conn, BOOK, 1)
+    holder, waiting = 1, []
+    for user_id in range(2, 200):
+        waiting.append((place_hold(conn, BOOK, user_id), user_id))
+        if rng.random() < 0.2:
+            hold_id, _ = waiting.pop(rng.randrange(len(waiting)))
+            cancel_hold(conn, hold_id)
+        if rng.random() < 0.2:
+            return_book(conn, BOOK, holder)
+            holder = conn.execute("SELECT user_id FROM holds WHERE book_id = ? AND status = 'ready'",
+                                  (BOOK,)).fetchone()[0]
+            borrow_book(conn, BOOK, holder)
+            waiting = [(hold_id, user_id) for hold_id, user_id in waiting if user_id != holder]
+        assert positions(conn) == counted_positions(conn)
+
+    # A served hold back to waiting (an inventory repair) is at the head again
+    served = conn.execute("SELECT id FROM holds WHERE book_id = ? AND status = 'fulfilled' ORDER BY id LIMIT 1",
+                          (BOOK,)).fetchone()[0]
+    conn.execute("UPDATE holds SET status = 'waiting' WHERE id = ?", (served,))
+    conn.commit()
+    assert positions(conn) == counted_positions(conn)
+    assert queue_position(conn, served) <= 2
+
+
+def test_tickets_numbered_on_upgrade(conn):
+    borrow_book(conn, BOOK, 1)
+    holds = [place_hold(conn, BOOK, user_id) for user_id in range(2, 30)]
+    cancel_hold(conn, holds[5])
+    # Back to a database from before tickets
+    conn.execute("DROP INDEX idx_holds_left")
+    conn.execute("UPDATE holds SET ticket = NULL")
+    conn.execute("UPDATE hold_queues SET issued = 0, waiting = 0")
+    conn.commit()
+    create_hold_tables(conn)
+    assert positions(conn) == counted_positions(conn)
+    assert queue_position(conn, place_hold(conn, BOOK, 40)) == len(holds)
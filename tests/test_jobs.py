@@ -0,0 +1,67 @@
+# job_runs ownership: only runs whose owner has exited are interrupted, and
+# a job is never run by two processes at once
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from library import db
+from library.jobs import claim_run, interrupt_dead_runs, run_job, utc_now
+from library.migrations import ensure_schema
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / "library.db")
+    ensure_schema(path)
+    with db.connection(path) as conn:
+        yield conn
+    db.close_pools()
+
+
+def running(conn, owner):
+    return conn.execute("INSERT INTO job_runs (job, started_at, status, owner) VALUES ('fines', ?, 'running', ?)",
+                        (utc_now(), owner)).lastrowid
+
+
+def test_only_dead_owners_are_interrupted(conn):
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    host = socket.gethostname()
+    alive = running(conn, f"{host}:{os.getpid()}")
+    elsewhere = running(conn, "some-other-host:1")
+    dead = running(conn, f"{host}:{exited}")
+    legacy = running(conn, None)
+    conn.commit()
+
+    assert db.run_in_transaction(conn, interrupt_dead_runs) == 2
+    status = dict(conn.execute("SELECT id, status FROM job_runs"))
+    assert status == {alive: "running", elsewhere: "running", dead: "interrupted", legacy: "interrupted"}
+
+
+def test_a_running_job_is_not_claimed_again(conn):
+    first = claim_run(conn, "checkpoint")
+    assert first is not None
+    assert claim_run(conn, "checkpoint") is None
+    assert run_job(conn, "checkpoint") == "skipped"
+
+
+def test_a_due_job_runs_once_across_schedulers(conn):
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    statuses = []
+
+    def scheduler():
+        with db.connection(path) as own:
+            statuses.append(run_job(own, "checkpoint", scheduled=True))
+
+    threads = [threading.Thread(target=scheduler) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses) == ["ok", "skipped", "skipped", "skipped"]
+    # Asked for by name, a job runs again at once
+    assert run_job(conn, "checkpoint") == "ok"
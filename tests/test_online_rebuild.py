@@ -0,0 +1,69 @@
+# rebuild_table() under concurrent borrowers: no write is lost, the
+# database stays consistent and the indexes keep their names
+import random
+import sqlite3
+import threading
+
+from benchmarks.common import seed
+from benchmarks.online_migration import fill_transactions, schema_objects
+from library import cache, db
+from library.circulation import CirculationError, borrow_book, return_book
+from library.migrations import TABLES, ensure_schema, rebuild_table
+
+ROWS, BOOKS, USERS, QUANTITY = 20_000, 200, 20, 5
+
+
+def borrower(path, seed_value, stop, counts, failures):
+    rng = random.Random(seed_value)
+    loans = []
+    with db.connection(path) as conn:
+        while not stop.is_set():
+            try:
+                if loans and rng.random() < 0.5:
+                    return_book(conn, *loans.pop())
+                else:
+                    book_id, user_id = rng.randint(1, BOOKS), rng.randint(1, USERS)
+                    borrow_book(conn, book_id, user_id)
+                    loans.append((book_id, user_id))
+                    counts[seed_value] += 1
+            except CirculationError:
+                pass
+            except sqlite3.Error as error:
+                failures.append(repr(error))
+
+
+def test_rebuild_under_writers(tmp_path):
+    path = seed(str(tmp_path / "library.db"), books=BOOKS, users=USERS, quantity=QUANTITY)
+    fill_transactions(path, ROWS, BOOKS, USERS)
+    ensure_schema(path)
+    cache.clear()
+    try:
+        with db.connection(path) as conn:
+            before = schema_objects(conn)
+            stop, counts, failures = threading.Event(), [0, 0], []
+            threads = [threading.Thread(target=borrower, args=(path, seed_value, stop, counts, failures))
+                       for seed_value in range(2)]
+            for thread in threads:
+                thread.start()
+            try:
+                stats = rebuild_table(conn, "transactions", TABLES["transactions"], pause=0.001)
+            finally:
+                stop.set()
+                for thread in threads:
+                    thread.join()
+
+            assert not failures
+            assert stats["rows"] >= ROWS
+            assert sum(counts) > 0
+            total = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+            assert total == ROWS + sum(counts)
+            open_loans = conn.execute("SELECT COUNT(*) FROM transactions WHERE return_date IS NULL").fetchone()[0]
+            on_shelf = conn.execute("SELECT SUM(quantity) FROM books").fetchone()[0]
+            assert on_shelf + open_loans == BOOKS * QUANTITY
+            assert schema_objects(conn) == before
+            leftovers = conn.execute(
+                "SELECT name FROM sqlite_master WHERE name LIKE '%!_!_rebuild' ESCAPE '!' OR name LIKE '%!_!_retired' ESCAPE '!'")
+            assert not leftovers.fetchall()
+            assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    finally:
+        db.close_pools()
@@ -0,0 +1,21 @@
+# Every hot query (benchmarks.query_plans.HOT_QUERIES) is answered through
+# an index, on a small generated library
+import pytest
+
+from benchmarks.query_plans import HOT_QUERIES, build_library, scans
+
+ROWS = 20_000
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    conn = build_library(str(tmp_path_factory.mktemp("plans") / "plans.db"), ROWS)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_an_index(conn, name):
+    sql, params = HOT_QUERIES[name]
+    plan = "; ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+    assert not scans(conn, sql, params), f"{name} scans: {plan}"